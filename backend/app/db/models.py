@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Float, DateTime, ForeignKey, Text, func
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -12,6 +12,11 @@ class CreditPlan(Base):
     image_credits = Column(Integer, default=5)
     refresh_interval = Column(Integer, default=60)  # in minutes
     price = Column(Float, default=0.0)  # price per month or one-time
+    # Requests per RATE_LIMIT_WINDOW and burst size; NULL → env defaults
+    chat_rate_limit = Column(Integer, nullable=True)
+    chat_burst = Column(Integer, nullable=True)
+    image_rate_limit = Column(Integer, nullable=True)
+    image_burst = Column(Integer, nullable=True)
 
     users = relationship("User", back_populates="plan")
 
@@ -47,5 +52,76 @@ class Credit(Base):
     chat_credits = Column(Integer, default=10)
     image_credits = Column(Integer, default=5)
     last_reset = Column(DateTime(timezone=True), server_default=func.now())
+    # Start of the current hourly chat / daily image windows (NULL → last_reset)
+    chat_window_start = Column(DateTime(timezone=True), nullable=True)
+    image_window_start = Column(DateTime(timezone=True), nullable=True)
 
     user = relationship("User", back_populates="credits")
+
+
+class StripeEvent(Base):
+    """Received webhook events; the primary key makes Stripe retries no-ops."""
+    __tablename__ = "stripe_events"
+
+    id = Column(String(255), primary_key=True)  # Stripe event id (evt_...)
+    type = Column(String(100), nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default="pending", index=True)  # pending/processed/ignored/failed
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class UsageEvent(Base):
+    """
+    Append-only log of AI calls, written in batches. Deliberately unindexed
+    beyond the primary key: reads go to the rollup tables, and the rollup
+    walks this table by id.
+    """
+    __tablename__ = "usage_events"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    user_id = Column(Integer, nullable=False)
+    event_type = Column(String(20), nullable=False)  # chat, chat_stream, chat_batch, chat_session, image, image_job
+    provider = Column(String(50), nullable=False, default="")
+    status = Column(String(10), nullable=False, default="ok")  # ok, cached, error, cancelled
+    latency_ms = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)  # estimated, see chat_sessions.estimate_tokens
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class UsageRollupMixin:
+    """Additive per-bucket aggregates; the composite key serves per-user range reads."""
+    user_id = Column(Integer, primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    event_type = Column(String(20), primary_key=True)
+    provider = Column(String(50), primary_key=True)
+    events = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    cached = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(BigInteger, nullable=False, default=0)
+    completion_tokens = Column(BigInteger, nullable=False, default=0)
+    latency_ms_sum = Column(BigInteger, nullable=False, default=0)
+    latency_ms_max = Column(Integer, nullable=False, default=0)
+
+
+class UsageHourly(UsageRollupMixin, Base):
+    __tablename__ = "usage_hourly"
+
+
+class UsageDaily(UsageRollupMixin, Base):
+    __tablename__ = "usage_daily"
+
+
+class UsageRollupState(Base):
+    """Watermark of the rollup: events up to ``last_event_id`` are aggregated."""
+    __tablename__ = "usage_rollup_state"
+
+    name = Column(String(50), primary_key=True)
+    last_event_id = Column(BigInteger, nullable=False, default=0)
+    # Highest id seen by the previous run; rolled up on the next one, by which
+    # time any insert that drew a lower id has committed
+    pending_event_id = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
@@ -1,5 +1,6 @@
 import os
 import redis
+import redis.asyncio as aioredis
 import json
 from dotenv import load_dotenv
 
@@ -8,8 +9,9 @@ load_dotenv()
 # Get Redis URL or default to local
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 
-# Create Redis client
+# Create Redis clients (sync for scripts/sync routes, async for request handlers)
 redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+async_redis_client = aioredis.from_url(REDIS_URL, decode_responses=True)
 
 # ===== Basic Utility Functions =====
 
@@ -32,3 +34,26 @@ def set_cache(key: str, data, ttl: int = 3600):
 def clear_cache(key: str):
     """Delete a cache key."""
     redis_client.delete(key)
+
+
+# ===== Async Utility Functions =====
+
+async def aget_cache(key: str):
+    """Async variant of get_cache for use inside request handlers."""
+    value = await async_redis_client.get(key)
+    if value:
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return value
+    return None
+
+
+async def aset_cache(key: str, data, ttl: int = 3600):
+    """Async variant of set_cache."""
+    await async_redis_client.setex(key, ttl, json.dumps(data))
+
+
+async def aclear_cache(key: str):
+    """Async variant of clear_cache."""
+    await async_redis_client.delete(key)
@@ -1,33 +1,90 @@
-from fastapi import FastAPI
-from app.routes import chat, image
+from contextlib import asynccontextmanager
+import math
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.routes import chat, image, images
 from app.routes import users
 from app.routes import auth, credits  
-from app.services.ai_providers import AIProvider
+from app.services.provider_registry import ProviderRegistry
+from app.services.credit_ledger import credit_ledger
+from app.services.image_jobs import ImageJobQueue, build_job_store
+from app.services.image_variants import image_variants
+from app.services.stripe_events import stripe_event_processor
+from app.services.cache_service import cache_backend
+from app.services.chat_sessions import chat_sessions
+from app.services.usage_events import usage_recorder
 from app.db import models
-from app.db.database import engine
+from app.db.database import engine, async_engine
 from app.middleware.auth_middleware import AuthMiddleware
+from app.middleware.rate_limit_headers import RateLimitHeadersMiddleware
+from app.middleware.metrics_middleware import MetricsMiddleware
+from app.services.instrumentation import instrument_engine
 from app.routes import payments
+from app.routes import providers
+from app.routes import metrics
+from app.routes import usage
+from app.services.circuit_breaker import ProviderUnavailableError
 
-app = FastAPI(title="Synapse AI Hub", version="1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One shared AIProvider (and connection pool) for the whole process.
+    # Tests/benchmarks may preset app.state.upstream_transport to stub upstreams.
+    providers = ProviderRegistry(transport=getattr(app.state, "upstream_transport", None))
+    await providers.startup()
+    app.state.providers = providers
+    credit_ledger.start()
+    usage_recorder.start()
+    image_jobs = ImageJobQueue(build_job_store(), providers.ai_provider)
+    image_jobs.start()
+    app.state.image_jobs = image_jobs
+    stripe_event_processor.start()
+    try:
+        yield
+    finally:
+        await stripe_event_processor.stop()
+        await image_jobs.stop()
+        await chat_sessions.stop()
+        image_variants.shutdown()
+        await credit_ledger.stop()
+        await usage_recorder.stop()
+        await providers.shutdown()
+        await cache_backend.close()
+        await async_engine.dispose()
+
+
+app = FastAPI(title="Synapse AI Hub", version="1.0", lifespan=lifespan)
 app.add_middleware(AuthMiddleware)
+app.add_middleware(RateLimitHeadersMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# SQL timing for both the sync and the async engine
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+
+@app.exception_handler(ProviderUnavailableError)
+async def provider_unavailable_handler(request: Request, exc: ProviderUnavailableError):
+    # Fail fast: no upstream call was made, tell the client when to come back
+    return JSONResponse(
+        {"detail": str(exc), "provider": exc.provider},
+        status_code=503,
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
 
 
 # Create tables automatically
 models.Base.metadata.create_all(bind=engine)
 
 
-# Initialize your AI provider
-ai_provider = AIProvider()
-
 # Register all routers
 app.include_router(auth.router, tags=["Auth"])
 app.include_router(users.router, tags=["Users"])
 app.include_router(credits.router, prefix="/credits", tags=["Credits"])
 app.include_router(chat.router, prefix="/api", tags=["Chat"])
 app.include_router(image.router, prefix="/api", tags=["Image"])
+app.include_router(images.router, tags=["Image"])
 app.include_router(payments.router)
-
-# Handle shutdown events
-@app.on_event("shutdown")
-async def shutdown_event():
-    await ai_provider.close()
+app.include_router(providers.router, prefix="/api", tags=["Providers"])
+app.include_router(metrics.router, tags=["Metrics"])
+app.include_router(usage.router, prefix="/api", tags=["Usage"])
@@ -1,10 +1,8 @@
 # app/middleware/auth_middleware.py
-from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 from jose import jwt, JWTError
-from app.db.database import SessionLocal
-from app.db import models
+from app.services.principal_cache import get_principal
 import os
 from dotenv import load_dotenv
 
@@ -13,48 +11,65 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 
+PUBLIC_PREFIXES = ("/auth",)
+PROTECTED_PREFIXES = ("/api", "/users", "/credits", "/payments")
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        path = request.url.path
 
-        # ✅ Skip auth checks for login/signup routes
-        if path.startswith("/auth"):
-            return await call_next(request)
+def _bearer_token(scope: Scope):
+    """Extract the bearer token from raw ASGI headers without building a Request."""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme == "Bearer" and token:
+                return token
+            return None
+    return None
 
-        # ✅ Protect /api and /users routes
-        protected_routes = ("/api", "/users", "/credits", "/payments")
 
-        if path.startswith(protected_routes):
-            auth_header = request.headers.get("Authorization")
+class AuthMiddleware:
+    """
+    Pure ASGI auth middleware.
 
-            if not auth_header or not auth_header.startswith("Bearer "):
-                return JSONResponse(
-                    {"detail": "Missing authorization token"}, status_code=401
-                )
+    Unlike BaseHTTPMiddleware it doesn't wrap the downstream app in an extra
+    task and response stream, so streaming responses and background tasks
+    pass straight through and unprotected paths cost a prefix check only.
+    """
 
-            token = auth_header.split(" ")[1]
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
-            try:
-                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-                email: str = payload.get("sub")
-                if email is None:
-                    raise HTTPException(status_code=401, detail="Invalid token payload")
-            except JWTError:
-                return JSONResponse(
-                    {"detail": "Invalid or expired token"}, status_code=401
-                )
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
 
-            # Get user from DB
-            db = SessionLocal()
-            user = db.query(models.User).filter(models.User.email == email).first()
-            db.close()
+        path = scope["path"]
 
-            if not user:
-                return JSONResponse({"detail": "User not found"}, status_code=404)
+        # ✅ Skip auth checks for login/signup and any unprotected routes
+        if path.startswith(PUBLIC_PREFIXES) or not path.startswith(PROTECTED_PREFIXES):
+            return await self.app(scope, receive, send)
 
-            # Attach user to request
-            request.state.user = user
+        token = _bearer_token(scope)
+        if token is None:
+            response = JSONResponse({"detail": "Missing authorization token"}, status_code=401)
+            return await response(scope, receive, send)
 
-        response = await call_next(request)
-        return response
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            response = JSONResponse({"detail": "Invalid or expired token"}, status_code=401)
+            return await response(scope, receive, send)
+
+        email = payload.get("sub")
+        if email is None:
+            response = JSONResponse({"detail": "Invalid token payload"}, status_code=401)
+            return await response(scope, receive, send)
+
+        # Resolve the cached principal (falls back to the DB on a miss)
+        user = await get_principal(email)
+        if not user:
+            response = JSONResponse({"detail": "User not found"}, status_code=404)
+            return await response(scope, receive, send)
+
+        # Attach user to request.state (Starlette backs it with scope["state"])
+        scope.setdefault("state", {})["user"] = user
+        await self.app(scope, receive, send)
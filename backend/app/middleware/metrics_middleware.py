@@ -0,0 +1,120 @@
+# app/middleware/metrics_middleware.py
+import os
+import time
+import random
+import logging
+from time import perf_counter
+from dotenv import load_dotenv
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.services.instrumentation import (
+    DB_QUERIES_PER_REQUEST,
+    DB_SECONDS_PER_REQUEST,
+    HTTP_REQUEST_SECONDS,
+    begin_request_db_stats,
+    end_request_db_stats,
+)
+
+load_dotenv()
+
+logger = logging.getLogger("metrics")
+
+# Sampling profiler (optional 'pyinstrument' package). Off unless enabled:
+# then a request is profiled when it sends "X-Profile: 1" or is sampled.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_OUTPUT_DIR = os.getenv("PROFILING_OUTPUT_DIR", "./data/profiles")
+
+
+def _wants_profile(scope: Scope) -> bool:
+    if not PROFILING_ENABLED:
+        return False
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return value == b"1"
+    return PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE
+
+
+def _start_profiler():
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        logger.warning("⚠️ PROFILING_ENABLED is set but 'pyinstrument' is not installed.")
+        return None
+    profiler = Profiler(async_mode="enabled")
+    profiler.start()
+    return profiler
+
+
+def _save_profile(profiler, scope: Scope, route: str):
+    os.makedirs(PROFILING_OUTPUT_DIR, exist_ok=True)
+    name = f"{int(time.time() * 1000)}-{scope['method']}-{route.strip('/').replace('/', '_') or 'root'}.html"
+    path = os.path.join(PROFILING_OUTPUT_DIR, name)
+    with open(path, "w") as f:
+        f.write(profiler.output_html())
+    logger.info(f"Profile for {scope['method']} {scope['path']} written to {path}")
+
+
+def route_label(scope: Scope) -> str:
+    """
+    The matched route template with its full prefix, e.g. ``/api/chat``.
+
+    Newer FastAPI keeps included routers nested, so ``route.path`` may lack
+    the ``include_router``/mount prefix. That prefix is whatever precedes
+    the part of the request path the route's own pattern matches; with
+    flattened routes it's empty.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    path = scope["path"]
+    pattern = getattr(route, "path_regex", None)
+    if pattern is not None and not pattern.match(path):
+        for index, char in enumerate(path):
+            if char == "/" and index and pattern.match(path[index:]):
+                return path[:index] + template
+    return template
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI request timing plus per-request SQL accounting.
+
+    Latency is labelled by route template (not raw path) to keep series
+    bounded; the SQL count/time come from the engine hooks in
+    app.services.instrumentation via a context variable.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_with_status(message: Message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        profiler = _start_profiler() if _wants_profile(scope) else None
+        token = begin_request_db_stats()
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = perf_counter() - started
+            queries, db_seconds = end_request_db_stats(token)
+            route = route_label(scope)
+            HTTP_REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=route, status=str(status["code"]))
+            DB_QUERIES_PER_REQUEST.observe(queries, route=route)
+            DB_SECONDS_PER_REQUEST.observe(db_seconds, route=route)
+            if profiler is not None:
+                profiler.stop()
+                try:
+                    _save_profile(profiler, scope, route)
+                except Exception as e:
+                    logger.warning(f"Could not write profile: {e}")
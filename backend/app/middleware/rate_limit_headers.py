@@ -0,0 +1,32 @@
+# app/middleware/rate_limit_headers.py
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Copies the rate-limit decision a route left on ``request.state`` onto the
+    response, including StreamingResponses returned directly, which FastAPI's
+    injected ``Response`` headers never reach.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                decision = state.get("rate_limit")
+                if decision is not None:
+                    headers = MutableHeaders(scope=message)
+                    for name, value in decision.headers().items():
+                        headers.setdefault(name, value)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
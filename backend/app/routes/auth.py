@@ -1,53 +1,70 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db import models
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.schemas import UserCreate, UserLogin, Token, UserResponse
-from app.services.auth_service import hash_password, verify_password, create_access_token
-from app.services.credit_service import reset_credits_if_needed
-from datetime import datetime
+from app.services.auth_service import hash_password_async, verify_password_async, create_access_token
+from app.services.credit_service import CHAT_CREDITS_DEFAULT, IMAGE_CREDITS_DEFAULT
+from datetime import datetime, timezone
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalars().first()
+
+
 @router.post("/signup", response_model=UserResponse)
-def signup(user_data: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(models.User).filter(models.User.email == user_data.email).first()
+async def signup(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    existing_user = await get_user_by_email(db, user_data.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_pw = hash_password(user_data.password)
+    # bcrypt runs on the dedicated password pool, not the event loop
+    hashed_pw = await hash_password_async(user_data.password)
     new_user = models.User(
         username=user_data.username,
         email=user_data.email,
         password_hash=hashed_pw
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.flush()
 
     # Give default credits
+    now = datetime.now(timezone.utc)
     new_credit = models.Credit(
         user_id=new_user.id,
-        chat_credits=10,
-        image_credits=5,
-        last_reset=datetime.utcnow()
+        chat_credits=CHAT_CREDITS_DEFAULT,
+        image_credits=IMAGE_CREDITS_DEFAULT,
+        last_reset=now,
+        chat_window_start=now,
+        image_window_start=now
     )
     db.add(new_credit)
-    db.commit()
+    await db.commit()
+    await db.refresh(new_user)
 
     return new_user
 
 
 @router.post("/login", response_model=Token)
-def login(user_data: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == user_data.email).first()
-    if not user or not verify_password(user_data.password, user.password_hash):
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await get_user_by_email(db, user_data.email)
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    # Refresh credits
-    if user.credits:
-        reset_credits_if_needed(user.credits[0])
-        db.commit()
+    valid, new_hash = await verify_password_async(user_data.password, user.password_hash)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    # Transparently upgrade hashes made with a different BCRYPT_ROUNDS
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
+
+    # Credits refresh lazily on read/spend, so login no longer writes them
 
     access_token = create_access_token({"sub": user.email})
     return {"access_token": access_token}
@@ -1,13 +1,315 @@
-from fastapi import APIRouter
-from pydantic import BaseModel
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from app.services.ai_providers import AIProvider
+from app.services.chat_cache import chat_cache
+from app.services.chat_sessions import SessionState, chat_sessions
+from app.services.credit_ledger import CreditLedgerUnavailableError, credit_ledger
+from app.services.provider_registry import get_ai_provider
+from app.services.rate_limiter import RATE_LIMIT_ENABLED, enforce_rate_limit, rate_limit
+from app.services.usage_events import usage_recorder, usage_status
+from app.utils.sse import sse_event
 
 router = APIRouter()
-ai_provider = AIProvider()
+logger = logging.getLogger("chat")
+
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "500"))
+CHAT_BATCH_DEFAULT_CONCURRENCY = int(os.getenv("CHAT_BATCH_DEFAULT_CONCURRENCY", "8"))
+CHAT_BATCH_MAX_CONCURRENCY = int(os.getenv("CHAT_BATCH_MAX_CONCURRENCY", "32"))
+
 
 class ChatRequest(BaseModel):
     prompt: str
+    stream: bool = False
+    cache: bool = True  # set False to always hit the provider
+
+
+class ChatBatchRequest(BaseModel):
+    prompts: List[str] = Field(..., min_length=1, max_length=CHAT_BATCH_MAX_ITEMS)
+    concurrency: Optional[int] = Field(None, ge=1)
+    cache: bool = True
+
+
+async def chat_event_stream(request: Request, ai_provider: AIProvider, prompt: str):
+    """
+    Relay provider deltas as SSE frames.
+
+    Stops as soon as the client goes away; closing the provider generator
+    cancels the upstream request instead of letting it run to completion.
+    """
+    user = request.state.user
+    started = time.perf_counter()
+    provider, parts, status = None, [], "cancelled"
+    deltas = ai_provider.stream_chat_response(prompt)
+    try:
+        async for provider, delta in deltas:
+            if await request.is_disconnected():
+                logger.info("Client disconnected, cancelling upstream chat stream.")
+                break
+            parts.append(delta)
+            yield sse_event({"provider": provider, "delta": delta})
+        else:
+            status = "ok"
+            yield "data: [DONE]\n\n"
+    except Exception as e:
+        status = "error"
+        logger.error(f"Chat streaming error: {e}")
+        yield sse_event({"error": str(e)}, event="error")
+    finally:
+        await deltas.aclose()
+        usage_recorder.record(user.id, "chat_stream", started, provider, prompt, "".join(parts), status)
+
+
+@router.post("/chat", dependencies=[Depends(rate_limit("chat"))])
+async def chat(
+    chat_request: ChatRequest,
+    request: Request,
+    ai_provider: AIProvider = Depends(get_ai_provider),
+):
+    if chat_request.stream:
+        # Reject before committing to a 200 event stream if every circuit is open
+        ai_provider.router.check_available()
+        return StreamingResponse(
+            chat_event_stream(request, ai_provider, chat_request.prompt),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    # Honour both the body flag and a standard "Cache-Control: no-cache" opt-out
+    use_cache = chat_request.cache and "no-cache" not in request.headers.get("cache-control", "")
+    started = time.perf_counter()
+    result = await ai_provider.generate_chat_response(chat_request.prompt, use_cache=use_cache)
+    usage_recorder.record(
+        request.state.user.id, "chat", started, result.get("provider"),
+        chat_request.prompt, result.get("response", ""), usage_status(result),
+    )
+    return result
+
+
+async def chat_batch_stream(ai_provider: AIProvider, user, batch: ChatBatchRequest, concurrency: int):
+    """
+    Fan prompts out with at most ``concurrency`` in flight and emit one NDJSON
+    line per item as soon as it finishes, then a summary line. Credits were
+    charged for the whole batch up front; failed or unfinished items are
+    refunded in one operation at the end.
+    """
+    started = time.perf_counter()
+    charged = 0 if user.is_premium else len(batch.prompts)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(index: int, prompt: str):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await ai_provider.generate_chat_response(prompt, use_cache=batch.cache)
+            except Exception as e:
+                result = {"error": str(e)}
+            usage_recorder.record(
+                user.id, "chat_batch", started, result.get("provider"), prompt, result.get("response", ""), usage_status(result)
+            )
+        return index, result
+
+    tasks = [asyncio.create_task(run_one(i, p)) for i, p in enumerate(batch.prompts)]
+    succeeded = failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, result = await next_done
+            if "error" in result:
+                failed += 1
+                line = {"index": index, "status": "error", "error": result["error"], "credits_used": 0}
+            else:
+                succeeded += 1
+                line = {
+                    "index": index,
+                    "status": "ok",
+                    "provider": result.get("provider"),
+                    "response": result.get("response"),
+                    "cached": result.get("cached", False),
+                    "credits_used": 0 if user.is_premium else 1,
+                }
+            yield json.dumps(line) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Anything that didn't succeed (errors, or cut short by a disconnect) is given back
+        refunded = 0 if user.is_premium else len(batch.prompts) - succeeded
+        await asyncio.shield(credit_ledger.refund(user, "chat", refunded))
+
+    yield json.dumps({"summary": {
+        "total": len(batch.prompts),
+        "succeeded": succeeded,
+        "failed": failed,
+        "concurrency": concurrency,
+        "credits_charged": charged - refunded,
+        "credits_refunded": refunded,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }}) + "\n"
+
+
+@router.post("/chat/batch")
+async def chat_batch(
+    batch: ChatBatchRequest,
+    request: Request,
+    ai_provider: AIProvider = Depends(get_ai_provider),
+):
+    user = getattr(request.state, "user", None)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    # One request per prompt, capped at the burst size by the limiter, so a
+    # batch drains the bucket but is never impossible to send
+    if RATE_LIMIT_ENABLED:
+        await enforce_rate_limit(request, "chat", cost=len(batch.prompts))
+
+    # Charge the whole batch in one atomic ledger operation (all or nothing)
+    try:
+        await credit_ledger.deduct(user, "chat", amount=len(batch.prompts))
+    except CreditLedgerUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    concurrency = min(batch.concurrency or CHAT_BATCH_DEFAULT_CONCURRENCY, CHAT_BATCH_MAX_CONCURRENCY)
+    return StreamingResponse(
+        chat_batch_stream(ai_provider, user, batch, concurrency),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/chat/cache/stats")
+async def chat_cache_stats():
+    return chat_cache.snapshot()
+
+
+
+# --------------------------------------
+# CHAT SESSIONS
+# --------------------------------------
+class ChatSessionCreate(BaseModel):
+    system: Optional[str] = None  # optional system prompt sent with every turn
+
+
+class ChatSessionMessage(BaseModel):
+    prompt: str = Field(..., min_length=1)
+    stream: bool = False
+
+
+def session_view(session: SessionState) -> dict:
+    return {
+        "session_id": session.id,
+        "created_at": session.created_at,
+        "system": session.system or None,
+        "summary": session.summary or None,
+        "turn_count": session.turn_count,
+        "summarized_turns": session.summarized_upto,
+        "turns": [turn.as_message() for turn in session.turns],
+    }
+
+
+async def get_owned_session(request: Request, session_id: str) -> SessionState:
+    user = getattr(request.state, "user", None)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    session = await chat_sessions.get(session_id, user.id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session
+
+
+async def session_event_stream(request: Request, ai_provider: AIProvider, session: SessionState, prompt: str):
+    """
+    Like ``chat_event_stream`` over the session window. The exchange is only
+    stored once the reply is complete; a disconnect leaves the session as it was.
+    """
+    started = time.perf_counter()
+    messages, context = chat_sessions.build_messages(session, prompt)
+    provider, parts, status = None, [], "cancelled"
+    deltas = ai_provider.stream_messages(messages)
+    try:
+        async for provider, delta in deltas:
+            if await request.is_disconnected():
+                logger.info("Client disconnected, cancelling upstream session stream.")
+                break
+            parts.append(delta)
+            yield sse_event({"provider": provider, "delta": delta})
+        else:
+            status = "ok"
+            await chat_sessions.record_exchange(session, prompt, "".join(parts), ai_provider)
+            yield sse_event({"session_id": session.id, "context": context}, event="session")
+            yield "data: [DONE]\n\n"
+    except Exception as e:
+        status = "error"
+        logger.error(f"Session streaming error: {e}")
+        yield sse_event({"error": str(e)}, event="error")
+    finally:
+        await deltas.aclose()
+        # The whole window is what the provider was sent
+        usage_recorder.record(
+            session.user_id, "chat_session", started, provider,
+            "".join(m["content"] for m in messages), "".join(parts), status,
+        )
+
+
+@router.post("/chat/sessions", status_code=201)
+async def create_chat_session(body: ChatSessionCreate, request: Request):
+    user = getattr(request.state, "user", None)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    session = await chat_sessions.create(user.id, body.system)
+    return {
+        "session_id": session.id,
+        "created_at": session.created_at,
+        "messages_url": f"/api/chat/sessions/{session.id}/messages",
+    }
+
+
+@router.get("/chat/sessions/{session_id}")
+async def get_chat_session(session_id: str, request: Request):
+    return session_view(await get_owned_session(request, session_id))
+
+
+@router.post("/chat/sessions/{session_id}/messages", dependencies=[Depends(rate_limit("chat"))])
+async def send_chat_session_message(
+    session_id: str,
+    body: ChatSessionMessage,
+    request: Request,
+    ai_provider: AIProvider = Depends(get_ai_provider),
+):
+    session = await get_owned_session(request, session_id)
+
+    if body.stream:
+        ai_provider.router.check_available()
+        return StreamingResponse(
+            session_event_stream(request, ai_provider, session, body.prompt),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    started = time.perf_counter()
+    messages, context = chat_sessions.build_messages(session, body.prompt)
+    result = await ai_provider.complete_messages(messages)
+    usage_recorder.record(
+        session.user_id, "chat_session", started, result.get("provider"),
+        "".join(m["content"] for m in messages), result.get("response", ""), usage_status(result),
+    )
+    if "error" in result:
+        return result
+
+    await chat_sessions.record_exchange(session, body.prompt, result["response"], ai_provider)
+    return {"session_id": session.id, **result, "context": context}
+
 
-@router.post("/chat")
-async def chat(request: ChatRequest):
-    return await ai_provider.generate_chat_response(request.prompt)
+@router.delete("/chat/sessions/{session_id}", status_code=204)
+async def delete_chat_session(session_id: str, request: Request):
+    await get_owned_session(request, session_id)
+    await chat_sessions.delete(session_id)
+    return Response(status_code=204)
@@ -1,40 +1,41 @@
 # app/routes/credits.py
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db import models
-from app.db.database import get_db
-from app.services.credit_service import reset_credits_if_needed, deduct_credit
+from app.db.database import get_async_db
+from app.services.credit_ledger import CreditLedgerUnavailableError, credit_ledger
 
 router = APIRouter()
 
 
+async def get_user_or_404(db: AsyncSession, user_id: int) -> models.User:
+    result = await db.execute(select(models.User).where(models.User.id == user_id))
+    user = result.scalar_one_or_none()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
 # --------------------------------------
 # GET USER CREDIT STATUS
 # --------------------------------------
 @router.get("/{user_id}")
-def get_user_credits(user_id: int, db: Session = Depends(get_db)):
-
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    if not user.credits:
-        raise HTTPException(status_code=404, detail="Credits not initialized")
+async def get_user_credits(user_id: int, db: AsyncSession = Depends(get_async_db)):
 
-    credit = user.credits[0]
+    user = await get_user_or_404(db, user_id)
 
-    # Apply reset logic before returning
-    reset_credits_if_needed(credit)
-    db.commit()
-    db.refresh(credit)
+    # Live balance from the ledger; a due window reset is computed on read
+    # (and only persisted by the next spend)
+    balance = await credit_ledger.balance(user.id)
 
     return {
         "user_id": user.id,
         "username": user.username,
-        "chat_credits": credit.chat_credits,
-        "image_credits": credit.image_credits,
-        "last_reset": credit.last_reset,
+        "chat_credits": balance["chat_credits"],
+        "image_credits": balance["image_credits"],
+        "last_reset": balance["last_reset"],
         "is_premium": user.is_premium
     }
 
@@ -43,18 +44,18 @@ def get_user_credits(user_id: int, db: Session = Depends(get_db)):
 # DEDUCT CREDITS
 # --------------------------------------
 @router.post("/deduct/{user_id}/{credit_type}")
-def deduct_user_credit(user_id: int, credit_type: str, db: Session = Depends(get_db)):
+async def deduct_user_credit(user_id: int, credit_type: str, db: AsyncSession = Depends(get_async_db)):
     """
     Deduct one chat/image credit and return updated values.
     credit_type must be: 'chat' or 'image'
     """
 
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    user = await get_user_or_404(db, user_id)
 
     try:
-        updated_credits = deduct_credit(db, user, credit_type)
+        updated_credits = await credit_ledger.deduct(user, credit_type)
+    except CreditLedgerUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -1,18 +1,111 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+import time
+from typing import Literal, Optional
 from app.services.ai_providers import AIProvider
+from app.services.image_jobs import (
+    IMAGE_JOB_WAIT_TIMEOUT,
+    TERMINAL_STATES,
+    ImageJobQueue,
+    JobQueueFullError,
+    get_image_jobs,
+)
+from app.services.image_store import image_payload
+from app.services.provider_registry import get_ai_provider
+from app.services.rate_limiter import rate_limit
+from app.services.usage_events import usage_recorder
+from app.utils.sse import sse_event
 
 router = APIRouter()
-ai_provider = AIProvider()
 
 class ImageRequest(BaseModel):
     prompt: str
+    # None → IMAGE_RESPONSE_FORMAT; "base64" keeps the old inline data URI
+    response_format: Optional[Literal["url", "base64"]] = None
 
-@router.post("/image")
-async def image(request: ImageRequest):
+@router.post("/image", dependencies=[Depends(rate_limit("image"))])
+async def image(request: ImageRequest, http_request: Request, ai_provider: AIProvider = Depends(get_ai_provider)):
+    started = time.perf_counter()
     result = await ai_provider.generate_image(request.prompt)
+    usage_recorder.record(
+        http_request.state.user.id, "image", started, "ClipDrop", request.prompt,
+        status="ok" if result.get("success") else "error",
+    )
 
     if not result.get("success", False):
         raise HTTPException(status_code=400, detail=result.get("message", "Unknown error"))
 
-    return {"provider": "ClipDrop", "image_base64": result["resultImage"]}
+    payload = await image_payload(result["image"], result["content_type"], request.response_format)
+    return {"provider": "ClipDrop", **payload}
+
+
+# --------------------------------------
+# ASYNC IMAGE JOBS
+# --------------------------------------
+def job_view(job: dict) -> dict:
+    return {key: job[key] for key in ("id", "status", "created_at", "updated_at", "result", "error")}
+
+
+async def get_owned_job(request: Request, jobs: ImageJobQueue, job_id: str) -> dict:
+    user = getattr(request.state, "user", None)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    job = await jobs.get(job_id)
+    if not job or job["user_id"] != user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/image/jobs", status_code=202, dependencies=[Depends(rate_limit("image"))])
+async def submit_image_job(body: ImageRequest, request: Request, jobs: ImageJobQueue = Depends(get_image_jobs)):
+    user = getattr(request.state, "user", None)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if not body.prompt:
+        raise HTTPException(status_code=400, detail="Prompt is required")
+
+    try:
+        job = await jobs.submit(user.id, body.prompt, body.response_format)
+    except JobQueueFullError:
+        raise HTTPException(status_code=503, detail="Image queue is full", headers={"Retry-After": "5"})
+
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "poll_url": f"/api/image/jobs/{job['id']}",
+        "events_url": f"/api/image/jobs/{job['id']}/events",
+    }
+
+
+@router.get("/image/jobs/{job_id}")
+async def get_image_job(job_id: str, request: Request, jobs: ImageJobQueue = Depends(get_image_jobs)):
+    return job_view(await get_owned_job(request, jobs, job_id))
+
+
+@router.get("/image/jobs/{job_id}/events")
+async def image_job_events(job_id: str, request: Request, jobs: ImageJobQueue = Depends(get_image_jobs)):
+    """Push job status changes over SSE until the job finishes."""
+    job = await get_owned_job(request, jobs, job_id)
+
+    async def events():
+        current = job
+        last_status = None
+        while True:
+            if current is None:
+                yield sse_event({"id": job_id, "error": "Job expired"}, event="error")
+                return
+            if current["status"] != last_status:
+                last_status = current["status"]
+                yield sse_event(job_view(current), event="status")
+            if current["status"] in TERMINAL_STATES or await request.is_disconnected():
+                return
+            await jobs.store.wait_for_change(job_id, timeout=IMAGE_JOB_WAIT_TIMEOUT)
+            current = await jobs.get(job_id)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,132 @@
+from typing import Literal, Optional, Tuple
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from app.services.image_store import image_store, is_digest
+from app.services.image_variants import (
+    CONTENT_TYPES,
+    FORMAT_BY_CONTENT_TYPE,
+    image_variants,
+    negotiate_format,
+    snap_width,
+)
+
+router = APIRouter()
+
+# Content-addressed: the bytes behind a digest never change
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Single ``bytes=`` range as inclusive (start, end). None means "send the
+    whole object" (no/multi-range header); ValueError means unsatisfiable.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first == "":
+            length = int(last)
+            if length <= 0:
+                raise ValueError(header)
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        raise ValueError(header)
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def conditional_response(request: Request, etag: str, size: int, headers: dict):
+    """
+    Shared validator/range handling. Returns a finished Response (304/416)
+    or the (start, end, status_code) slice to send.
+    """
+    headers.update({"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL, "Accept-Ranges": "bytes"})
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    # If-Range with a stale validator → full body
+    if_range = request.headers.get("if-range")
+    if byte_range and if_range and if_range.strip() != etag:
+        byte_range = None
+
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        (start, end), status_code = byte_range, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return start, end, status_code
+
+
+@router.get("/images/{digest}")
+async def get_image(
+    digest: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, description="Target width; rounded up to a configured variant size"),
+    format: Optional[Literal["webp", "jpeg", "png", "original"]] = Query(None, description="Overrides Accept negotiation"),
+):
+    """
+    Serve a stored image. Without ``format`` the encoding is negotiated from
+    ``Accept`` (WebP, then JPEG), so responses carry ``Vary: Accept``.
+    """
+    if not is_digest(digest):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    meta = await image_store.head(digest)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    source_format = FORMAT_BY_CONTENT_TYPE.get(meta.content_type)
+    width = snap_width(w)
+    headers = {}
+    if format is None:
+        headers["Vary"] = "Accept"
+        target = negotiate_format(request.headers.get("accept"), source_format) if source_format else None
+    else:
+        target = source_format if format == "original" else format
+
+    # --- Original bytes, streamed straight from the store ---
+    if source_format is None or (target == source_format and width is None):
+        result = conditional_response(request, f'"{digest}"', meta.size, headers)
+        if isinstance(result, Response):
+            return result
+        start, end, status_code = result
+        return StreamingResponse(
+            image_store.iter_range(digest, start, end),
+            status_code=status_code,
+            media_type=meta.content_type,
+            headers=headers,
+        )
+
+    # --- Transcoded / resized variant ---
+    data = await image_variants.get(digest, target, width)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    result = conditional_response(request, f'"{digest}-{target}-{width or "full"}"', len(data), headers)
+    if isinstance(result, Response):
+        return result
+    start, end, status_code = result
+    return Response(
+        content=data[start:end + 1],
+        status_code=status_code,
+        media_type=CONTENT_TYPES[target],
+        headers=headers,
+    )
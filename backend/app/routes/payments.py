@@ -7,8 +7,10 @@ from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 
-from app.db.database import SessionLocal
+from app.db.database import AsyncSessionLocal
 from app.db import models
+from app.services.principal_cache import invalidate_principal
+from app.services.stripe_events import record_event, run_stripe, stripe_event_processor
 
 load_dotenv()
 
@@ -21,49 +23,47 @@ CANCEL_PATH = os.getenv("STRIPE_CANCEL_PATH", "/payments/cancel")
 router = APIRouter(prefix="/payments", tags=["Payments"])
 
 
-def mark_user_premium(user_id: int):
+async def mark_user_premium(user_id: int):
     """Helper to safely mark a user as premium."""
-    db = SessionLocal()
-    try:
-        user = db.query(models.User).get(user_id)
+    async with AsyncSessionLocal() as db:
+        user = await db.get(models.User, user_id)
         if not user:
             return None
         user.is_premium = True
         user.premium_expires_at = datetime.utcnow() + timedelta(days=30)
-        db.commit()
+        await db.commit()
+        await invalidate_principal(user.email)
         return user.username
-    finally:
-        db.close()
 
 
 @router.post("/create-checkout-session")
 async def create_checkout_session(request: Request):
     """Create a Stripe Checkout Session."""
-    user = getattr(request.state, "user", None)
-    if not user:
+    principal = getattr(request.state, "user", None)
+    if not principal:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    if user.is_premium:
+    if principal.is_premium:
         return JSONResponse({"detail": "Already premium"}, status_code=400)
 
-    customer_id = getattr(user, "stripe_customer_id", None)
-    if not customer_id:
-        # Create Stripe customer
-        customer = stripe.Customer.create(email=user.email, name=user.username)
-        customer_id = customer["id"]
+    async with AsyncSessionLocal() as db:
+        user = await db.get(models.User, principal.id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
 
-        # Persist customer_id
-        db = SessionLocal()
-        try:
-            db_user = db.query(models.User).get(user.id)
-            if db_user:
-                db_user.stripe_customer_id = customer_id
-                db.commit()
-        finally:
-            db.close()
+        customer_id = user.stripe_customer_id
+        if not customer_id:
+            # Create Stripe customer
+            customer = await run_stripe(stripe.Customer.create, email=user.email, name=user.username)
+            customer_id = customer["id"]
+
+            # Persist customer_id
+            user.stripe_customer_id = customer_id
+            await db.commit()
 
     try:
-        session = stripe.checkout.Session.create(
+        session = await run_stripe(
+            stripe.checkout.Session.create,
             customer=customer_id,
             payment_method_types=["card"],
             line_items=[
@@ -88,7 +88,7 @@ async def create_checkout_session(request: Request):
 
 @router.post("/webhook")
 async def stripe_webhook(request: Request):
-    """Stripe webhook handler."""
+    """Stripe webhook handler: verify, record idempotently, enqueue, ack."""
     payload = await request.body()
     sig_header = request.headers.get("stripe-signature")
 
@@ -104,34 +104,14 @@ async def stripe_webhook(request: Request):
                 status_code=400
             )
 
-    db = SessionLocal()
-    try:
-        # checkout.session.completed
-        if event["type"] == "checkout.session.completed":
-            session_data = event["data"]["object"]
-            customer_id = session_data.get("customer")
-            subscription_id = session_data.get("subscription")
-
-            user = db.query(models.User).filter(models.User.stripe_customer_id == customer_id).first()
-            if user:
-                user.is_premium = True
-                if subscription_id:
-                    user.premium_expires_at = datetime.utcnow() + timedelta(days=30)
-                db.commit()
-
-        # invoice.payment_succeeded (subscription renewal)
-        elif event["type"] == "invoice.payment_succeeded":
-            invoice = event["data"]["object"]
-            customer_id = invoice.get("customer")
-            user = db.query(models.User).filter(models.User.stripe_customer_id == customer_id).first()
-            if user:
-                user.is_premium = True
-                user.premium_expires_at = datetime.utcnow() + timedelta(days=30)
-                db.commit()
-    finally:
-        db.close()
-
-    return JSONResponse({"status": "success"})
+    # Record and acknowledge only; StripeEventProcessor applies it in the
+    # background. The event id primary key turns Stripe retries into no-ops.
+    is_new = await record_event(event["id"], event["type"], payload.decode("utf-8"))
+    if not is_new:
+        return JSONResponse({"status": "duplicate"})
+
+    stripe_event_processor.notify()
+    return JSONResponse({"status": "queued"})
 
 
 @router.post("/simulate-success/{user_id}")
@@ -139,7 +119,7 @@ async def simulate_payment_success(user_id: int):
     """
     Dev/testing only: simulate a Stripe payment success without Stripe CLI.
     """
-    username = mark_user_premium(user_id)
+    username = await mark_user_premium(user_id)
     if not username:
         return JSONResponse({"detail": "User not found"}, status_code=404)
 
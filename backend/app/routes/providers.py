@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+from app.services.ai_providers import AIProvider
+from app.services.circuit_breaker import breaker_snapshot
+from app.services.concurrency_limiter import limiter_snapshot
+from app.services.provider_registry import get_ai_provider
+
+router = APIRouter()
+
+
+@router.get("/providers/status")
+async def providers_status(ai_provider: AIProvider = Depends(get_ai_provider)):
+    """Routing stats, circuit-breaker and concurrency-limit state per upstream provider."""
+    return {
+        "chat_order": [backend.name for backend in ai_provider.router.ranked(explore_rate=0)],
+        "chat_backends": ai_provider.router.snapshot(),
+        "circuits": breaker_snapshot(),
+        "concurrency": limiter_snapshot(),
+    }
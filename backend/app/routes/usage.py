@@ -0,0 +1,46 @@
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from app.services.usage_events import default_window, usage_recorder
+
+router = APIRouter()
+
+USAGE_MAX_HOURLY_RANGE = timedelta(days=int(os.getenv("USAGE_MAX_HOURLY_RANGE_DAYS", "14")))
+USAGE_MAX_DAILY_RANGE = timedelta(days=int(os.getenv("USAGE_MAX_DAILY_RANGE_DAYS", "400")))
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+# --------------------------------------
+# PER-USER USAGE (served from the rollup tables)
+# --------------------------------------
+@router.get("/usage")
+async def get_usage(
+    request: Request,
+    granularity: Literal["hour", "day"] = "day",
+    since: Optional[datetime] = Query(None, description="inclusive bucket start, ISO 8601 (UTC if no offset)"),
+    until: Optional[datetime] = Query(None, description="exclusive bucket start"),
+):
+    """
+    The caller's chat/image usage per hour or day, broken down by event type
+    and provider. Rollups run every USAGE_ROLLUP_INTERVAL; ``as_of`` says how
+    fresh they are. Token counts are estimates.
+    """
+    user = getattr(request.state, "user", None)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    default_since, default_until = default_window(granularity)
+    until = _as_utc(until) if until else default_until
+    since = _as_utc(since) if since else until - (default_until - default_since)
+    if since >= until:
+        raise HTTPException(status_code=400, detail="'since' must be before 'until'")
+
+    max_range = USAGE_MAX_HOURLY_RANGE if granularity == "hour" else USAGE_MAX_DAILY_RANGE
+    if until - since > max_range:
+        raise HTTPException(status_code=400, detail=f"Range too large for {'hourly' if granularity == 'hour' else 'daily'} usage (max {max_range.days} days)")
+
+    return await usage_recorder.usage(user.id, granularity, since, until)
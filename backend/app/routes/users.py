@@ -1,10 +1,29 @@
-from fastapi import APIRouter, Depends, Request, HTTPException
-from sqlalchemy.orm import Session
+import os
+import json
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Query, Request, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db import models
-from app.db.database import get_db
+from app.db.database import AsyncSessionLocal, get_async_db
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
+USERS_PAGE_SIZE_DEFAULT = int(os.getenv("USERS_PAGE_SIZE_DEFAULT", "50"))
+USERS_PAGE_SIZE_MAX = int(os.getenv("USERS_PAGE_SIZE_MAX", "200"))
+USERS_EXPORT_BATCH_SIZE = int(os.getenv("USERS_EXPORT_BATCH_SIZE", "1000"))
+
+# Columns exposed by the listing endpoints
+USER_COLUMNS = (
+    models.User.id,
+    models.User.username,
+    models.User.email,
+    models.User.is_premium,
+    models.User.created_at,
+    models.User.plan_id,
+)
+
 
 # Helper to get current user from middleware
 def get_current_user_from_request(request: Request):
@@ -16,8 +35,12 @@ def get_current_user_from_request(request: Request):
 
 # ✅ GET current logged-in user
 @router.get("/me")
-def get_current_user_profile(request: Request):
-    user = get_current_user_from_request(request)
+async def get_current_user_profile(request: Request, db: AsyncSession = Depends(get_async_db)):
+    principal = get_current_user_from_request(request)
+    # The cached principal is deliberately compact; load the profile fields here
+    user = await db.get(models.User, principal.id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
     return {
         "id": user.id,
         "username": user.username,
@@ -29,19 +52,55 @@ def get_current_user_profile(request: Request):
 
 
 # ✅ GET all users (optional admin restriction)
+# Keyset pagination on id: each page is an index range scan, however deep
 @router.get("/")
-def get_all_users(db: Session = Depends(get_db), request: Request = None):
+async def get_all_users(
+    request: Request,
+    after: Optional[int] = Query(None, ge=0, description="Cursor: return users with id greater than this"),
+    limit: int = Query(USERS_PAGE_SIZE_DEFAULT, ge=1),
+    format: Literal["json", "ndjson"] = Query("json", description="ndjson streams every user after the cursor"),
+    db: AsyncSession = Depends(get_async_db),
+):
     current_user = get_current_user_from_request(request)
     # TODO: Add admin check if needed
-    users = db.query(models.User).all()
-    return [
-        {
-            "id": u.id,
-            "username": u.username,
-            "email": u.email,
-            "is_premium": u.is_premium,
-            "created_at": u.created_at,
-            "plan_id": u.plan_id,
-        }
-        for u in users
-    ]
+    if format == "ndjson":
+        return StreamingResponse(
+            export_users_ndjson(after or 0),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": 'attachment; filename="users.ndjson"'},
+        )
+
+    limit = min(limit, USERS_PAGE_SIZE_MAX)
+    rows = await fetch_user_page(db, after or 0, limit + 1)
+    has_more = len(rows) > limit
+    items = [dict(row._mapping) for row in rows[:limit]]
+    return {
+        "items": items,
+        "next_cursor": items[-1]["id"] if has_more else None,
+    }
+
+
+async def fetch_user_page(db: AsyncSession, after: int, limit: int):
+    """Only the public columns; never hydrates User entities (or password hashes)."""
+    result = await db.execute(
+        select(*USER_COLUMNS)
+        .where(models.User.id > after)
+        .order_by(models.User.id)
+        .limit(limit)
+    )
+    return result.all()
+
+
+async def export_users_ndjson(after: int):
+    """
+    Walk the table in keyset-paginated batches, one short query each, so an
+    admin dump holds neither a long transaction nor the whole table in memory.
+    """
+    async with AsyncSessionLocal() as db:
+        while True:
+            rows = await fetch_user_page(db, after, USERS_EXPORT_BATCH_SIZE)
+            if not rows:
+                return
+            yield "".join(json.dumps(dict(row._mapping), default=str) + "\n" for row in rows)
+            after = rows[-1].id
+            await db.rollback()  # end the read transaction between batches
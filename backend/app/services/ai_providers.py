@@ -1,9 +1,18 @@
 import os
-import base64
+import asyncio
+import hashlib
 import logging
 import httpx
 from dotenv import load_dotenv
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+from app.config import settings
+from app.services.chat_cache import chat_cache, completion_cache_key
+from app.services.chat_backends import ChatBackend, GroqBackend, OpenAICompatibleBackend, GeminiBackend, OPENAI_BASE_URL, OPENAI_CHAT_MODEL
+from app.services.provider_router import ProviderRouter
+from app.services.circuit_breaker import ProviderUnavailableError, get_breaker
+from app.services.concurrency_limiter import get_limiter
+from app.services.single_flight import SingleFlight
+from app.services.instrumentation import upstream_event_hooks
 
 load_dotenv()
 
@@ -16,71 +25,226 @@ if not GROQ_API_KEY or not CLIPDROP_API_KEY:
 logger = logging.getLogger("ai_providers")
 logging.basicConfig(level=logging.INFO, format="[%(asctime)s] [%(levelname)s] %(message)s")
 
-GROQ_DEFAULT_MODEL = "llama-3.1-8b-instant"
+CLIPDROP_IMAGE_URL = "https://clipdrop-api.co/text-to-image/v1"
+CLIPDROP_WARMUP_URL = "https://clipdrop-api.co/"
+
+# Connection pool tuning (shared by every upstream client)
+AI_HTTP_MAX_CONNECTIONS = int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "100"))
+AI_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("AI_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+AI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("AI_HTTP_KEEPALIVE_EXPIRY", "30.0"))
+AI_HTTP2 = os.getenv("AI_HTTP2", "false").lower() == "true"
+AI_HTTP_WARMUP_TIMEOUT = float(os.getenv("AI_HTTP_WARMUP_TIMEOUT", "5.0"))
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def build_http_client(
+    headers: Dict[str, str],
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+    provider: str = "upstream",
+) -> httpx.AsyncClient:
+    """Create an upstream client with the configured pool limits, keep-alive expiry and metrics hooks."""
+    http2 = AI_HTTP2
+    if http2 and not _http2_available():
+        logger.warning("⚠️ AI_HTTP2 is enabled but the 'h2' package is missing; falling back to HTTP/1.1.")
+        http2 = False
+
+    return httpx.AsyncClient(
+        headers=headers,
+        timeout=httpx.Timeout(30.0, read=60.0),
+        limits=httpx.Limits(
+            max_connections=AI_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=AI_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=AI_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        http2=http2,
+        transport=transport,
+        event_hooks=upstream_event_hooks(provider),
+    )
+
+
+def build_chat_backends(transport: Optional[httpx.AsyncBaseTransport] = None) -> List[ChatBackend]:
+    """Groq is always configured; OpenAI and Gemini join when their keys are set."""
+    backends: List[ChatBackend] = [
+        GroqBackend(build_http_client(
+            headers={
+                "Authorization": f"Bearer {GROQ_API_KEY}",
+                "Content-Type": "application/json"
+            },
+            transport=transport,
+            provider="groq",
+        ))
+    ]
+
+    if settings.OPENAI_API_KEY:
+        backends.append(OpenAICompatibleBackend(
+            build_http_client(
+                headers={
+                    "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
+                    "Content-Type": "application/json"
+                },
+                transport=transport,
+                provider="openai",
+            ),
+            model=OPENAI_CHAT_MODEL,
+            base_url=OPENAI_BASE_URL,
+        ))
+
+    if settings.GEMINI_API_KEY:
+        backends.append(GeminiBackend(build_http_client(
+            headers={"x-goog-api-key": settings.GEMINI_API_KEY},
+            transport=transport,
+            provider="gemini",
+        )))
+
+    return backends
 
 
 class AIProvider:
     """
-    Secure, async, high-performance integration with Groq and ClipDrop APIs.
+    Secure, async, high-performance integration with the chat backends
+    (Groq, OpenAI-compatible, Gemini) and ClipDrop.
     """
 
-    def __init__(self):
-        self.groq_api_key = GROQ_API_KEY
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
         self.clipdrop_api_key = CLIPDROP_API_KEY
-        self.groq_model = GROQ_DEFAULT_MODEL
 
-        self._groq_client = httpx.AsyncClient(
-            headers={
-                "Authorization": f"Bearer {self.groq_api_key}",
-                "Content-Type": "application/json"
-            },
-            timeout=httpx.Timeout(30.0, read=60.0)
-        )
-        self._clipdrop_client = httpx.AsyncClient(
+        # Latency-aware routing across every configured chat backend
+        self.router = ProviderRouter(build_chat_backends(transport))
+        self.chat_model_key = ",".join(f"{b.name}:{b.model}" for b in self.router.backends)
+
+        self._clipdrop_client = build_http_client(
             headers={"x-api-key": self.clipdrop_api_key},
-            timeout=httpx.Timeout(30.0, read=60.0)
+            transport=transport,
+            provider="clipdrop",
         )
+        self.clipdrop_breaker = get_breaker("clipdrop")
+        self.clipdrop_limiter = get_limiter("clipdrop")
+
+        # Identical concurrent requests share one upstream call
+        self._flights = SingleFlight()
 
         logger.info("✅ AIProvider initialized successfully.")
 
+    async def warm_up(self):
+        """
+        Open pooled connections to every backend and ClipDrop ahead of the first request
+        so user traffic doesn't pay for the DNS + TLS handshake. Best effort.
+        """
+        async def _touch(client: httpx.AsyncClient, method: str, url: str):
+            try:
+                await client.request(method, url, timeout=AI_HTTP_WARMUP_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"Warm-up of {url} failed: {e}")
+
+        await asyncio.gather(
+            _touch(self._clipdrop_client, "HEAD", CLIPDROP_WARMUP_URL),
+            *(backend.warm_up(AI_HTTP_WARMUP_TIMEOUT) for backend in self.router.backends),
+        )
+        logger.info("🔥 AIProvider connections warmed up.")
+
     async def close(self):
-        await self._groq_client.aclose()
+        for backend in self.router.backends:
+            await backend.close()
         await self._clipdrop_client.aclose()
         logger.info("🧹 AIProvider clients closed cleanly.")
 
-    async def generate_chat_response(self, prompt: str) -> Dict[str, Any]:
+    async def generate_chat_response(self, prompt: str, use_cache: bool = True) -> Dict[str, Any]:
         if not prompt:
             return {"error": "Prompt is required"}
 
-        url = "https://api.groq.com/openai/v1/chat/completions"
-        payload = {"model": self.groq_model, "messages": [{"role": "user", "content": prompt}]}
+        messages = [{"role": "user", "content": prompt}]
+
+        cache_key = completion_cache_key(self.chat_model_key, messages)
+        use_cache = use_cache and chat_cache.enabled
+        if use_cache:
+            cached = await chat_cache.get(cache_key)
+            if cached is not None:
+                return {**cached, "cached": True}
 
+        async def call_upstream():
+            result = await self.complete_messages(messages)
+            if "error" in result:
+                return result
+
+            # Only the leader of a coalesced flight writes the cache
+            if use_cache:
+                await chat_cache.set(cache_key, result)
+            return result
+
+        result = await self._flights.do(("chat", cache_key, use_cache), call_upstream)
+        return dict(result)
+
+    async def complete_messages(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """One uncached completion over a prepared message list (e.g. a chat session window)."""
         try:
-            response = await self._groq_client.post(url, json=payload)
-            response.raise_for_status()
-            data = response.json()
-            content = data["choices"][0]["message"]["content"]
-            return {"provider": "Groq", "response": content}
+            backend, content = await self.router.complete(messages)
+        except ProviderUnavailableError:
+            raise  # fast-fail → 503 with Retry-After
         except Exception as e:
-            logger.error(f"Groq API error: {e}")
+            logger.error(f"Chat API error: {e}")
             return {"error": str(e)}
+        return {"provider": backend.display_name, "response": content}
+
+    async def stream_chat_response(self, prompt: str) -> AsyncIterator[Tuple[str, str]]:
+        """
+        Yield ``(provider, delta)`` pairs as the chosen backend streams them.
+
+        Closing the generator (e.g. when the client disconnects) closes the
+        backend's ``client.stream`` context, which closes the upstream connection.
+        """
+        if not prompt:
+            raise ValueError("Prompt is required")
+
+        deltas = self.stream_messages([{"role": "user", "content": prompt}])
+        try:
+            async for provider, delta in deltas:
+                yield provider, delta
+        finally:
+            await deltas.aclose()
+
+    async def stream_messages(self, messages: List[Dict[str, str]]) -> AsyncIterator[Tuple[str, str]]:
+        """``stream_chat_response`` over a prepared message list."""
+        deltas = self.router.stream(messages)
+        try:
+            async for backend, delta in deltas:
+                yield backend.display_name, delta
+        finally:
+            await deltas.aclose()
 
     async def generate_image(self, prompt: str) -> Dict[str, Any]:
         if not prompt:
             return {"success": False, "message": "Prompt is required"}
 
-        url = "https://clipdrop-api.co/text-to-image/v1"
         files = {"prompt": (None, prompt, "text/plain")}
 
-        try:
-            response = await self._clipdrop_client.post(url, files=files)
-            response.raise_for_status()
-            base64_image = base64.b64encode(response.content).decode("utf-8")
-            return {
-                "success": True,
-                "message": "Image generated successfully",
-                "resultImage": f"data:image/png;base64,{base64_image}"
-            }
-        except Exception as e:
-            logger.error(f"ClipDrop API error: {e}")
-            return {"success": False, "message": str(e)}
+        async def call_upstream():
+            try:
+                async with self.clipdrop_breaker.guard():
+                    response = await self.clipdrop_limiter.send(
+                        lambda: self._clipdrop_client.post(CLIPDROP_IMAGE_URL, files=files)
+                    )
+                    response.raise_for_status()
+                # Raw bytes: the caller decides between the image store URL
+                # and the legacy base64 data URI
+                return {
+                    "success": True,
+                    "message": "Image generated successfully",
+                    "image": response.content,
+                    "content_type": response.headers.get("content-type", "image/png"),
+                }
+            except ProviderUnavailableError:
+                raise
+            except Exception as e:
+                logger.error(f"ClipDrop API error: {e}")
+                return {"success": False, "message": str(e)}
+
+        flight_key = ("clipdrop", hashlib.sha256(prompt.strip().encode("utf-8")).hexdigest())
+        result = await self._flights.do(flight_key, call_upstream)
+        return dict(result)
@@ -3,32 +3,79 @@
 from passlib.context import CryptContext
 from jose import jwt
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
 from fastapi import HTTPException
+import asyncio
 import os
 
 SECRET_KEY = os.getenv("SECRET_KEY", "secret")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
 
+# bcrypt cost factor; hashes made with a different cost are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Dedicated pool so password work can't starve the shared threadpool
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
 pwd_context = CryptContext(
     schemes=["bcrypt"],
     deprecated="auto",
-    bcrypt__ident="2b"   # force modern bcrypt ident (fixes backend issues)
+    bcrypt__ident="2b",   # force modern bcrypt ident (fixes backend issues)
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,  # min == max → any other cost needs_update
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
 )
 
+_password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash",
+)
+_pending_password_jobs = 0
+
+
+def _truncate(password: str) -> str:
+    # bcrypt max = 72 bytes → must truncate **bytes**, not characters
+    return str(password).encode("utf-8")[:72].decode("utf-8", errors="ignore")
+
+
+async def run_password_work(fn, *args):
+    """
+    Run CPU-heavy password work on the dedicated pool.
+
+    Rejects with 503 as soon as the backlog (running + queued) reaches
+    PASSWORD_HASH_MAX_PENDING instead of letting login latency grow unbounded.
+    """
+    global _pending_password_jobs
+    if _pending_password_jobs >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=503,
+            detail="Authentication service is busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+
+    loop = asyncio.get_running_loop()
+    future = _password_executor.submit(fn, *args)
+    _pending_password_jobs += 1
+    # Count down when the work itself ends, not when the caller stops
+    # waiting: a disconnected client's bcrypt run still occupies a worker
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(_password_job_done))
+    return await asyncio.wrap_future(future)
+
+
+def _password_job_done():
+    global _pending_password_jobs
+    _pending_password_jobs -= 1
+
 
 def hash_password(password: str) -> str:
     if password is None:
         raise HTTPException(status_code=400, detail="Password is required")
 
-    # Ensure string
-    password = str(password)
-
-    # bcrypt max = 72 bytes → musttruncate **bytes**, not characters
-    safe_pw = password.encode("utf-8")[:72].decode("utf-8", errors="ignore")
-
     try:
-        return pwd_context.hash(safe_pw)
+        return pwd_context.hash(_truncate(password))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Password hashing failed: {e}")
 
@@ -37,12 +84,23 @@ def verify_password(password: str, hashed_password: str) -> bool:
     if password is None:
         return False
 
-    password = str(password)
+    return pwd_context.verify(_truncate(password), hashed_password)
 
-    # same truncation for check
-    safe_pw = password.encode("utf-8")[:72].decode("utf-8", errors="ignore")
 
-    return pwd_context.verify(safe_pw, hashed_password)
+async def hash_password_async(password: str) -> str:
+    if password is None:
+        raise HTTPException(status_code=400, detail="Password is required")
+    return await run_password_work(hash_password, password)
+
+
+async def verify_password_async(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify off the event loop. Returns (valid, new_hash); new_hash is set when
+    the stored hash used a different cost and should be replaced.
+    """
+    if password is None:
+        return False, None
+    return await run_password_work(pwd_context.verify_and_update, _truncate(password), hashed_password)
 
 
 def create_access_token(data: dict):
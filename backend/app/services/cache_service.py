@@ -0,0 +1,276 @@
+# app/services/cache_service.py
+
+import os
+import json
+import time
+import zlib
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("cache_service")
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "redis")  # "redis" or "memory"
+CACHE_SERIALIZER = os.getenv("CACHE_SERIALIZER", "auto")  # auto, orjson, msgpack, json
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024"))
+CACHE_COMPRESS_LEVEL = int(os.getenv("CACHE_COMPRESS_LEVEL", "6"))
+CACHE_VERSION_TTL = float(os.getenv("CACHE_VERSION_TTL", "5"))  # seconds a namespace version is memoised locally
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2.0"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "2.0"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+
+# One-byte frame header in front of every stored value
+RAW = b"\x00"
+ZLIB = b"\x01"
+
+
+# --------------------------------------
+# SERIALIZERS
+# --------------------------------------
+class JsonSerializer:
+    name = "json"
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonSerializer:
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def dumps(self, value: Any) -> bytes:
+        return self._orjson.dumps(value, default=str)
+
+    def loads(self, data: bytes) -> Any:
+        return self._orjson.loads(data)
+
+
+class MsgpackSerializer:
+    name = "msgpack"
+
+    def __init__(self):
+        import msgpack
+        self._msgpack = msgpack
+
+    def dumps(self, value: Any) -> bytes:
+        return self._msgpack.packb(value, use_bin_type=True, default=str)
+
+    def loads(self, data: bytes) -> Any:
+        return self._msgpack.unpackb(data, raw=False)
+
+
+def build_serializer(name: str = CACHE_SERIALIZER):
+    """The configured serializer; "auto" prefers orjson, then msgpack, then json."""
+    candidates = {"orjson": OrjsonSerializer, "msgpack": MsgpackSerializer, "json": JsonSerializer}
+    order = ["orjson", "msgpack", "json"] if name == "auto" else [name, "json"]
+    for candidate in order:
+        try:
+            return candidates[candidate]()
+        except ImportError:
+            if name != "auto":
+                logger.warning(f"⚠️ CACHE_SERIALIZER={name} but the package is missing; falling back to json.")
+    return JsonSerializer()
+
+
+class Codec:
+    """Serializer plus zlib for values over ``compress_min_bytes``."""
+
+    def __init__(self, serializer=None, compress_min_bytes: int = CACHE_COMPRESS_MIN_BYTES):
+        self.serializer = serializer or build_serializer()
+        self.compress_min_bytes = compress_min_bytes
+
+    def encode(self, value: Any) -> bytes:
+        data = self.serializer.dumps(value)
+        if len(data) >= self.compress_min_bytes:
+            compressed = zlib.compress(data, CACHE_COMPRESS_LEVEL)
+            if len(compressed) < len(data):
+                return ZLIB + compressed
+        return RAW + data
+
+    def decode(self, data: Optional[bytes]) -> Any:
+        if not data:
+            return None
+        header, body = data[:1], data[1:]
+        if header == ZLIB:
+            body = zlib.decompress(body)
+        elif header != RAW:
+            return None  # written by something else (or an older format): treat as a miss
+        return self.serializer.loads(body)
+
+
+# --------------------------------------
+# BACKENDS (raw bytes)
+# --------------------------------------
+class RedisCacheBackend:
+    """Async Redis on an explicit, bounded connection pool; bulk ops are one round trip."""
+
+    def __init__(self, url: str = REDIS_URL, max_connections: int = REDIS_MAX_CONNECTIONS):
+        self.pool = aioredis.ConnectionPool.from_url(
+            url,
+            max_connections=max_connections,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        )
+        self.client = aioredis.Redis(connection_pool=self.pool)
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        if not keys:
+            return []
+        return await self.client.mget(keys)
+
+    async def set_many(self, items: Dict[str, bytes], ttl: Optional[int] = None):
+        if not items:
+            return
+        if ttl is None:
+            await self.client.mset(items)
+            return
+        # MSET can't carry a TTL: pipeline SET EX instead, still one round trip
+        pipe = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.set(key, value, ex=ttl)
+        await pipe.execute()
+
+    async def delete_many(self, keys: Sequence[str]):
+        if keys:
+            await self.client.unlink(*keys)
+
+    async def get_int(self, key: str) -> int:
+        value = await self.client.get(key)
+        return int(value) if value else 0
+
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(key)
+
+    async def close(self):
+        await self.client.aclose()
+        await self.pool.disconnect()
+
+
+class MemoryCacheBackend:
+    """Process-local stand-in with the same interface; for tests and Redis-less dev."""
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}  # key → (expires_at or None, value)
+
+    def _get(self, key: str, now: float):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= now:
+            del self._data[key]
+            return None
+        return value
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        now = time.monotonic()
+        return [self._get(key, now) for key in keys]
+
+    async def set_many(self, items: Dict[str, bytes], ttl: Optional[int] = None):
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        for key, value in items.items():
+            self._data[key] = (expires_at, value)
+
+    async def delete_many(self, keys: Sequence[str]):
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def get_int(self, key: str) -> int:
+        value = self._get(key, time.monotonic())
+        return int(value) if value else 0
+
+    async def incr(self, key: str) -> int:
+        value = await self.get_int(key) + 1
+        self._data[key] = (None, str(value).encode())
+        return value
+
+    async def close(self):
+        self._data.clear()
+
+
+def build_cache_backend():
+    if CACHE_BACKEND == "memory":
+        return MemoryCacheBackend()
+    return RedisCacheBackend()
+
+
+cache_backend = build_cache_backend()
+
+
+# --------------------------------------
+# NAMESPACES
+# --------------------------------------
+class CacheNamespace:
+    """
+    Typed cache over a key prefix ``<name>:v<version>:``.
+
+    ``invalidate_all()`` bumps the version instead of scanning keys: old
+    entries become unreachable at once and age out through their TTL.
+    Other processes pick the new version up within ``CACHE_VERSION_TTL``.
+    """
+
+    def __init__(self, name: str, ttl: Optional[int] = None, backend=None, codec: Optional[Codec] = None):
+        self.name = name
+        self.ttl = ttl
+        self.backend = backend or cache_backend
+        self.codec = codec or Codec()
+        self._version: Optional[int] = None
+        self._version_checked = 0.0
+
+    @property
+    def version_key(self) -> str:
+        return f"{self.name}:__version__"
+
+    async def _prefix(self) -> str:
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked >= CACHE_VERSION_TTL:
+            self._version = await self.backend.get_int(self.version_key)
+            self._version_checked = now
+        return f"{self.name}:v{self._version}:"
+
+    async def get(self, key: str) -> Any:
+        return (await self.get_many([key]))[0]
+
+    async def get_many(self, keys: Iterable[str]) -> List[Any]:
+        keys = list(keys)
+        prefix = await self._prefix()
+        raw = await self.backend.get_many([prefix + key for key in keys])
+        values = []
+        for data in raw:
+            try:
+                values.append(self.codec.decode(data))
+            except Exception as e:
+                logger.warning(f"Undecodable cache entry in {self.name}: {e}")
+                values.append(None)
+        return values
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        await self.set_many({key: value}, ttl=ttl)
+
+    async def set_many(self, items: Dict[str, Any], ttl: Optional[int] = None):
+        prefix = await self._prefix()
+        encoded = {prefix + key: self.codec.encode(value) for key, value in items.items()}
+        await self.backend.set_many(encoded, ttl=ttl if ttl is not None else self.ttl)
+
+    async def delete(self, *keys: str):
+        prefix = await self._prefix()
+        await self.backend.delete_many([prefix + key for key in keys])
+
+    async def invalidate_all(self) -> int:
+        self._version = await self.backend.incr(self.version_key)
+        self._version_checked = time.monotonic()
+        logger.info(f"Cache namespace {self.name} invalidated (now v{self._version}).")
+        return self._version
@@ -0,0 +1,183 @@
+# app/services/chat_backends.py
+
+import os
+import json
+import logging
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List
+
+import httpx
+from dotenv import load_dotenv
+
+from app.services.concurrency_limiter import RateLimitedError, get_limiter, new_deadline, parse_retry_after
+
+load_dotenv()
+
+logger = logging.getLogger("chat_backends")
+
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+GROQ_DEFAULT_MODEL = "llama-3.1-8b-instant"
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+OPENAI_CHAT_MODEL = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
+
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+GEMINI_CHAT_MODEL = os.getenv("GEMINI_CHAT_MODEL", "gemini-1.5-flash")
+
+Messages = List[Dict[str, str]]
+
+
+class ChatBackend(ABC):
+    """
+    One upstream chat provider. Subclasses translate the OpenAI-style
+    ``messages`` list into their wire format.
+    """
+
+    name = "backend"
+    display_name = "Backend"
+
+    def __init__(self, client: httpx.AsyncClient, model: str):
+        self.client = client
+        self.model = model
+        self.limiter = get_limiter(self.name)
+
+    async def _post(self, url: str, **kwargs) -> httpx.Response:
+        """POST through the provider's adaptive limiter (429-aware retries)."""
+        response = await self.limiter.send(lambda: self.client.post(url, **kwargs))
+        response.raise_for_status()
+        return response
+
+    @asynccontextmanager
+    async def _open_stream(self, url: str, **kwargs):
+        """
+        Open a streaming POST holding a limiter slot for its whole lifetime.
+        A 429 isn't retried here: the router fails over to another backend.
+        """
+        async with self.limiter.slot(new_deadline()):
+            async with self.client.stream("POST", url, **kwargs) as response:
+                if response.status_code == 429:
+                    self.limiter.on_throttled()
+                    retry_after = parse_retry_after(response.headers) or 1.0
+                    raise RateLimitedError(self.name, retry_after, f"{self.name} rate limit exceeded")
+                response.raise_for_status()
+                yield response
+
+    @abstractmethod
+    async def complete(self, messages: Messages) -> str:
+        """The full reply text."""
+
+    @abstractmethod
+    def stream(self, messages: Messages) -> AsyncIterator[str]:
+        """Reply text deltas as they arrive (an async generator)."""
+
+    async def warm_up(self, timeout: float):
+        """Open a pooled connection ahead of the first request. Best effort."""
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class OpenAICompatibleBackend(ChatBackend):
+    """Any ``/chat/completions`` API (OpenAI, Groq, vLLM, ...)."""
+
+    name = "openai"
+    display_name = "OpenAI"
+
+    def __init__(self, client: httpx.AsyncClient, model: str, base_url: str):
+        super().__init__(client, model)
+        self.base_url = base_url.rstrip("/")
+
+    @property
+    def chat_url(self) -> str:
+        return f"{self.base_url}/chat/completions"
+
+    async def complete(self, messages: Messages) -> str:
+        payload = {"model": self.model, "messages": messages}
+        response = await self._post(self.chat_url, json=payload)
+        data = response.json()
+        return data["choices"][0]["message"]["content"]
+
+    async def stream(self, messages: Messages) -> AsyncIterator[str]:
+        payload = {"model": self.model, "messages": messages, "stream": True}
+        async with self._open_stream(self.chat_url, json=payload) as response:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
+    async def warm_up(self, timeout: float):
+        try:
+            await self.client.get(f"{self.base_url}/models", timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Warm-up of {self.name} failed: {e}")
+
+
+class GroqBackend(OpenAICompatibleBackend):
+    name = "groq"
+    display_name = "Groq"
+
+    def __init__(self, client: httpx.AsyncClient, model: str = GROQ_DEFAULT_MODEL):
+        super().__init__(client, model, GROQ_BASE_URL)
+
+
+class GeminiBackend(ChatBackend):
+    """Google Gemini ``generateContent`` / ``streamGenerateContent``."""
+
+    name = "gemini"
+    display_name = "Gemini"
+
+    def __init__(self, client: httpx.AsyncClient, model: str = GEMINI_CHAT_MODEL):
+        super().__init__(client, model)
+
+    def _payload(self, messages: Messages) -> dict:
+        contents, system = [], []
+        for message in messages:
+            if message["role"] == "system":
+                system.append({"text": message["content"]})
+                continue
+            role = "model" if message["role"] == "assistant" else "user"
+            contents.append({"role": role, "parts": [{"text": message["content"]}]})
+
+        payload = {"contents": contents}
+        if system:
+            payload["systemInstruction"] = {"parts": system}
+        return payload
+
+    @staticmethod
+    def _text(data: dict) -> str:
+        candidates = data.get("candidates") or []
+        if not candidates:
+            return ""
+        parts = candidates[0].get("content", {}).get("parts") or []
+        return "".join(part.get("text", "") for part in parts)
+
+    async def complete(self, messages: Messages) -> str:
+        url = f"{GEMINI_BASE_URL}/models/{self.model}:generateContent"
+        response = await self._post(url, json=self._payload(messages))
+        return self._text(response.json())
+
+    async def stream(self, messages: Messages) -> AsyncIterator[str]:
+        url = f"{GEMINI_BASE_URL}/models/{self.model}:streamGenerateContent"
+        async with self._open_stream(url, params={"alt": "sse"}, json=self._payload(messages)) as response:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                delta = self._text(json.loads(line[len("data:"):].strip()))
+                if delta:
+                    yield delta
+
+    async def warm_up(self, timeout: float):
+        try:
+            await self.client.get(f"{GEMINI_BASE_URL}/models/{self.model}", timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Warm-up of {self.name} failed: {e}")
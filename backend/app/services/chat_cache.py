@@ -0,0 +1,104 @@
+# app/services/chat_cache.py
+
+import os
+import json
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from app.services.cache_service import CacheNamespace
+from app.utils.lru import TTLLRUCache
+
+load_dotenv()
+
+logger = logging.getLogger("chat_cache")
+
+CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "true").lower() == "true"
+CHAT_CACHE_TTL = int(os.getenv("CHAT_CACHE_TTL", "3600"))  # Redis tier, seconds
+CHAT_CACHE_LOCAL_TTL = int(os.getenv("CHAT_CACHE_LOCAL_TTL", "300"))  # in-process tier, seconds
+CHAT_CACHE_LOCAL_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_LOCAL_MAX_ENTRIES", "1024"))
+CHAT_CACHE_MAX_RESPONSE_BYTES = int(os.getenv("CHAT_CACHE_MAX_RESPONSE_BYTES", "65536"))
+
+KEY_PREFIX = "completion:"  # within the versioned "chat" namespace
+
+
+def completion_cache_key(model: str, messages: List[Dict[str, str]], params: Optional[Dict[str, Any]] = None) -> str:
+    """Stable hash of (model, messages, params); insensitive to key order and edge whitespace."""
+    normalized = {
+        "model": model,
+        "messages": [
+            {"role": m.get("role", "user"), "content": (m.get("content") or "").strip()}
+            for m in messages
+        ],
+        "params": params or {},
+    }
+    canonical = json.dumps(normalized, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return KEY_PREFIX + hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ChatCompletionCache:
+    """
+    Two-tier completion cache: a bounded in-process LRU in front of Redis.
+
+    Redis failures are logged and treated as misses so a cache outage never
+    fails a chat request.
+    """
+
+    def __init__(self):
+        self.enabled = CHAT_CACHE_ENABLED
+        self._local = TTLLRUCache(max_entries=CHAT_CACHE_LOCAL_MAX_ENTRIES, ttl=CHAT_CACHE_LOCAL_TTL)
+        self._shared = CacheNamespace("chat", ttl=CHAT_CACHE_TTL)
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._local.get(key)
+        if value is not None:
+            self.stats["local_hits"] += 1
+            return value
+
+        try:
+            value = await self._shared.get(key)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Chat cache read failed: {e}")
+            value = None
+
+        if isinstance(value, dict):
+            self.stats["redis_hits"] += 1
+            self._local.set(key, value)
+            return value
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        if len(json.dumps(value)) > CHAT_CACHE_MAX_RESPONSE_BYTES:
+            return
+
+        self._local.set(key, value)
+        self.stats["stores"] += 1
+        try:
+            await self._shared.set(key, value)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Chat cache write failed: {e}")
+
+    async def invalidate_all(self):
+        """Drop every cached completion (e.g. after a model or prompt change)."""
+        self._local.clear()
+        await self._shared.invalidate_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        hits = self.stats["local_hits"] + self.stats["redis_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "local_entries": len(self._local),
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+chat_cache = ChatCompletionCache()
@@ -0,0 +1,349 @@
+# app/services/chat_sessions.py
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.db.redis_cache import async_redis_client
+
+load_dotenv()
+
+logger = logging.getLogger("chat_sessions")
+
+CHAT_SESSION_BACKEND = os.getenv("CHAT_SESSION_BACKEND", "redis")  # "redis" or "memory"
+CHAT_SESSION_TTL = int(os.getenv("CHAT_SESSION_TTL", "86400"))  # idle seconds before a session expires
+CHAT_SESSION_MAX_TURNS = int(os.getenv("CHAT_SESSION_MAX_TURNS", "200"))  # stored turns; older ones survive in the summary
+CHAT_SESSION_LOAD_TURNS = int(os.getenv("CHAT_SESSION_LOAD_TURNS", "64"))  # newest turns read to build a request
+CHAT_SESSION_CONTEXT_TOKENS = int(os.getenv("CHAT_SESSION_CONTEXT_TOKENS", "3000"))  # system + summary + turns + prompt
+CHAT_SESSION_SUMMARIZE_AT = float(os.getenv("CHAT_SESSION_SUMMARIZE_AT", "0.75"))  # budget share unsummarized turns may fill
+CHAT_SESSION_KEEP_RECENT_TURNS = int(os.getenv("CHAT_SESSION_KEEP_RECENT_TURNS", "4"))  # never folded into the summary
+CHAT_SESSION_SUMMARY_WORDS = int(os.getenv("CHAT_SESSION_SUMMARY_WORDS", "200"))
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role and framing per chat-completions message
+ROLE_CODES = {"user": "u", "assistant": "a"}
+CODE_ROLES = {code: role for role, code in ROLE_CODES.items()}
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Merge the new turns into the existing summary. Keep facts, names, decisions, open questions "
+    "and the user's preferences; drop pleasantries. Reply with the updated summary only, "
+    "in at most {words} words."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """~4 characters per token: close enough for budgeting across backends without their tokenizers."""
+    return MESSAGE_OVERHEAD_TOKENS + (len(text) + 3) // 4
+
+
+@dataclass(frozen=True)
+class Turn:
+    role: str
+    content: str
+    tokens: int
+
+    @classmethod
+    def new(cls, role: str, content: str) -> "Turn":
+        return cls(role, content, estimate_tokens(content))
+
+    def encode(self) -> str:
+        # Compact list form with the token estimate precomputed, so building a
+        # window never re-measures stored text
+        return json.dumps([ROLE_CODES[self.role], self.content, self.tokens], ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def decode(cls, data: str) -> "Turn":
+        code, content, tokens = json.loads(data)
+        return cls(CODE_ROLES[code], content, tokens)
+
+    def as_message(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+
+@dataclass
+class SessionState:
+    id: str
+    user_id: int
+    created_at: float
+    system: str = ""
+    summary: str = ""
+    summarized_upto: int = 0  # turns before this absolute index are covered by the summary
+    turn_count: int = 0
+    turns: List[Turn] = field(default_factory=list)  # the newest stored turns, oldest first
+
+    @property
+    def first_index(self) -> int:
+        """Absolute index of ``turns[0]``."""
+        return self.turn_count - len(self.turns)
+
+    @classmethod
+    def from_stored(cls, session_id: str, meta: Dict[str, Any], turns: List[str]) -> "SessionState":
+        return cls(
+            id=session_id,
+            user_id=int(meta["user_id"]),
+            created_at=float(meta["created_at"]),
+            system=meta.get("system") or "",
+            summary=meta.get("summary") or "",
+            summarized_upto=int(meta.get("summarized_upto") or 0),
+            turn_count=int(meta.get("turn_count") or 0),
+            turns=[Turn.decode(t) for t in turns],
+        )
+
+
+# --------------------------------------
+# STORES
+# --------------------------------------
+class InMemorySessionStore:
+    """Process-local sessions; for tests and single-worker dev."""
+
+    def __init__(self):
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+
+    def _live(self, session_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._sessions.get(session_id)
+        if entry is not None and entry["expires"] <= time.monotonic():
+            del self._sessions[session_id]
+            return None
+        return entry
+
+    async def create(self, session_id: str, meta: Dict[str, Any]):
+        self._sessions[session_id] = {"meta": dict(meta), "turns": [], "expires": time.monotonic() + CHAT_SESSION_TTL}
+
+    async def load(self, session_id: str, last_turns: int = 0) -> Optional[Tuple[Dict[str, Any], List[str]]]:
+        entry = self._live(session_id)
+        if entry is None:
+            return None
+        turns = entry["turns"][-last_turns:] if last_turns else list(entry["turns"])
+        return dict(entry["meta"]), turns
+
+    async def append(self, session_id: str, turns: List[str]):
+        entry = self._live(session_id)
+        if entry is None:
+            return
+        entry["turns"].extend(turns)
+        del entry["turns"][:-CHAT_SESSION_MAX_TURNS]
+        entry["meta"]["turn_count"] = int(entry["meta"].get("turn_count") or 0) + len(turns)
+        entry["expires"] = time.monotonic() + CHAT_SESSION_TTL
+
+    async def save_summary(self, session_id: str, summary: str, upto: int, expected_upto: int) -> bool:
+        entry = self._live(session_id)
+        if entry is None or int(entry["meta"].get("summarized_upto") or 0) != expected_upto:
+            return False
+        entry["meta"].update(summary=summary, summarized_upto=upto)
+        return True
+
+    async def delete(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+
+# Only replace the summary if nobody else advanced it since it was read
+SAVE_SUMMARY_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'summarized_upto') ~= ARGV[3] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'summary', ARGV[1], 'summarized_upto', ARGV[2])
+return 1
+"""
+
+
+class RedisSessionStore:
+    """
+    Session metadata in a hash and turns in a list of compact JSON arrays,
+    both sliding on CHAT_SESSION_TTL. The list is capped with LTRIM; by the
+    time turns fall off its front the summary has normally absorbed them.
+    """
+
+    META_KEY = "chat_session:{}"
+    TURNS_KEY = "chat_session:{}:turns"
+
+    def __init__(self, redis=async_redis_client):
+        self.redis = redis
+        self._save_summary = redis.register_script(SAVE_SUMMARY_SCRIPT)
+
+    async def create(self, session_id: str, meta: Dict[str, Any]):
+        key = self.META_KEY.format(session_id)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(key, mapping=meta)
+        pipe.expire(key, CHAT_SESSION_TTL)
+        await pipe.execute()
+
+    async def load(self, session_id: str, last_turns: int = 0) -> Optional[Tuple[Dict[str, Any], List[str]]]:
+        # MULTI so turn_count and the list agree: first_index depends on both
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hgetall(self.META_KEY.format(session_id))
+        pipe.lrange(self.TURNS_KEY.format(session_id), -last_turns if last_turns else 0, -1)
+        meta, turns = await pipe.execute()
+        if not meta or "user_id" not in meta:
+            return None
+        return meta, turns
+
+    async def append(self, session_id: str, turns: List[str]):
+        meta_key, turns_key = self.META_KEY.format(session_id), self.TURNS_KEY.format(session_id)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.rpush(turns_key, *turns)
+        pipe.ltrim(turns_key, -CHAT_SESSION_MAX_TURNS, -1)
+        pipe.hincrby(meta_key, "turn_count", len(turns))
+        pipe.expire(meta_key, CHAT_SESSION_TTL)
+        pipe.expire(turns_key, CHAT_SESSION_TTL)
+        await pipe.execute()
+
+    async def save_summary(self, session_id: str, summary: str, upto: int, expected_upto: int) -> bool:
+        saved = await self._save_summary(keys=[self.META_KEY.format(session_id)], args=[summary, upto, expected_upto])
+        return bool(saved)
+
+    async def delete(self, session_id: str):
+        await self.redis.unlink(self.META_KEY.format(session_id), self.TURNS_KEY.format(session_id))
+
+
+def build_session_store():
+    if CHAT_SESSION_BACKEND == "memory":
+        return InMemorySessionStore()
+    return RedisSessionStore()
+
+
+# --------------------------------------
+# SESSIONS
+# --------------------------------------
+class ChatSessions:
+    """
+    Server-side conversations. Each upstream request carries the system
+    prompt, a rolling summary of older turns and as many of the newest turns
+    as fit in CHAT_SESSION_CONTEXT_TOKENS. Once unsummarized turns fill
+    CHAT_SESSION_SUMMARIZE_AT of the budget, the oldest of them are folded
+    into the summary in the background, off the request path.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._summaries: Dict[str, asyncio.Task] = {}
+        self.stats = {"created": 0, "exchanges": 0, "summaries": 0, "summary_errors": 0}
+
+    async def create(self, user_id: int, system: Optional[str] = None) -> SessionState:
+        session = SessionState(id=uuid.uuid4().hex, user_id=user_id, created_at=time.time(), system=system or "")
+        await self.store.create(session.id, {
+            "user_id": session.user_id,
+            "created_at": session.created_at,
+            "system": session.system,
+            "summary": "",
+            "summarized_upto": 0,
+            "turn_count": 0,
+        })
+        self.stats["created"] += 1
+        return session
+
+    async def get(self, session_id: str, user_id: int, last_turns: int = CHAT_SESSION_LOAD_TURNS) -> Optional[SessionState]:
+        """The session with its newest ``last_turns`` turns, or None if it's missing or someone else's."""
+        stored = await self.store.load(session_id, last_turns)
+        if stored is None:
+            return None
+        session = SessionState.from_stored(session_id, *stored)
+        return session if session.user_id == user_id else None
+
+    async def delete(self, session_id: str):
+        await self.store.delete(session_id)
+
+    def build_messages(self, session: SessionState, prompt: str) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+        """The upstream message list for ``prompt`` plus a description of the window used."""
+        head: List[Dict[str, str]] = []
+        used = estimate_tokens(prompt)
+        if session.system:
+            head.append({"role": "system", "content": session.system})
+            used += estimate_tokens(session.system)
+        if session.summary:
+            summary = f"Summary of the earlier conversation:\n{session.summary}"
+            head.append({"role": "system", "content": summary})
+            used += estimate_tokens(summary)
+
+        window: List[Turn] = []
+        for index in range(len(session.turns) - 1, -1, -1):
+            if session.first_index + index < session.summarized_upto:
+                break  # already represented by the summary
+            turn = session.turns[index]
+            if used + turn.tokens > CHAT_SESSION_CONTEXT_TOKENS:
+                break
+            used += turn.tokens
+            window.append(turn)
+        window.reverse()
+        # Start on a user turn: some backends reject a leading assistant message
+        while window and window[0].role != "user":
+            used -= window.pop(0).tokens
+
+        messages = head + [turn.as_message() for turn in window] + [{"role": "user", "content": prompt}]
+        return messages, {"turns": len(window), "estimated_tokens": used, "summarized_turns": session.summarized_upto}
+
+    async def record_exchange(self, session: SessionState, prompt: str, reply: str, ai_provider):
+        """Store a completed prompt/reply pair and start a summary refresh if the window is filling up."""
+        exchange = [Turn.new("user", prompt), Turn.new("assistant", reply)]
+        await self.store.append(session.id, [turn.encode() for turn in exchange])
+        self.stats["exchanges"] += 1
+
+        session.turns.extend(exchange)
+        session.turn_count += len(exchange)
+        unsummarized = sum(
+            turn.tokens for index, turn in enumerate(session.turns)
+            if session.first_index + index >= session.summarized_upto
+        )
+        if unsummarized > CHAT_SESSION_CONTEXT_TOKENS * CHAT_SESSION_SUMMARIZE_AT:
+            self._schedule_summary(session.id, ai_provider)
+
+    def _schedule_summary(self, session_id: str, ai_provider):
+        if session_id in self._summaries:
+            return  # one refresh per session at a time in this process
+        task = asyncio.create_task(self._summarize(session_id, ai_provider))
+        self._summaries[session_id] = task
+        task.add_done_callback(lambda _: self._summaries.pop(session_id, None))
+
+    async def _summarize(self, session_id: str, ai_provider):
+        try:
+            stored = await self.store.load(session_id)
+            if stored is None:
+                return
+            session = SessionState.from_stored(session_id, *stored)
+
+            # Fold the oldest unsummarized turns until the rest fit in half the
+            # trigger threshold, keeping the newest few verbatim
+            start = max(session.summarized_upto - session.first_index, 0)
+            keep_from = len(session.turns) - CHAT_SESSION_KEEP_RECENT_TURNS
+            remaining = sum(turn.tokens for turn in session.turns[start:])
+            target = CHAT_SESSION_CONTEXT_TOKENS * CHAT_SESSION_SUMMARIZE_AT / 2
+            cut = start
+            while cut < keep_from and remaining > target:
+                remaining -= session.turns[cut].tokens
+                cut += 1
+            while cut < keep_from and session.turns[cut].role != "user":
+                cut += 1  # the kept window should open on a user turn
+            if cut <= start:
+                return
+
+            transcript = "\n".join(f"{turn.role.title()}: {turn.content}" for turn in session.turns[start:cut])
+            result = await ai_provider.complete_messages([
+                {"role": "system", "content": SUMMARY_INSTRUCTIONS.format(words=CHAT_SESSION_SUMMARY_WORDS)},
+                {"role": "user", "content": f"Summary so far:\n{session.summary or '(none)'}\n\nNew turns:\n{transcript}"},
+            ])
+            if "error" in result:
+                raise Exception(result["error"])
+
+            upto = session.first_index + cut
+            if await self.store.save_summary(session_id, result["response"].strip(), upto, session.summarized_upto):
+                self.stats["summaries"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats["summary_errors"] += 1
+            logger.warning(f"Summary refresh for chat session {session_id} failed: {e}")
+
+    async def stop(self):
+        tasks = list(self._summaries.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+chat_sessions = ChatSessions(build_session_store())
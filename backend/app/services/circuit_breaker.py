@@ -0,0 +1,164 @@
+# app/services/circuit_breaker.py
+
+import os
+import time
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("circuit_breaker")
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))  # consecutive failures
+CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv("CIRCUIT_RECOVERY_TIMEOUT", "30.0"))  # seconds open
+CIRCUIT_HALF_OPEN_MAX_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_MAX_CALLS", "1"))  # concurrent probes
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderUnavailableError(Exception):
+    """An upstream provider can't take requests right now; retry later."""
+
+    def __init__(self, provider: str, retry_after: float, message: str = None):
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(message or f"{provider} is temporarily unavailable")
+
+
+class CircuitOpenError(ProviderUnavailableError):
+    """Raised without touching the network while a circuit is open."""
+
+
+def is_provider_failure(exc: BaseException) -> bool:
+    """
+    Server-side trouble trips the breaker; caller mistakes (4xx) and
+    throttling/load-shedding (handled by the concurrency limiter) don't.
+    """
+    if isinstance(exc, ProviderUnavailableError):
+        return False
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return True
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker for one provider.
+
+    closed → open after ``failure_threshold`` consecutive failures; open →
+    half-open once ``recovery_timeout`` has passed, letting up to
+    ``half_open_max_calls`` probes through; a successful probe closes it,
+    a failed one re-opens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        recovery_timeout: float = CIRCUIT_RECOVERY_TIMEOUT,
+        half_open_max_calls: int = CIRCUIT_HALF_OPEN_MAX_CALLS,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.rejected = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN and time.monotonic() < self.opened_at + self.recovery_timeout
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.recovery_timeout - time.monotonic())
+
+    def allow(self):
+        """Admit a call or raise CircuitOpenError immediately."""
+        if self.state == OPEN:
+            if time.monotonic() < self.opened_at + self.recovery_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.retry_after())
+            self.state = HALF_OPEN
+            self.probes = 0
+            logger.info(f"Circuit {self.name} half-open, probing.")
+
+        if self.state == HALF_OPEN:
+            if self.probes >= self.half_open_max_calls:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, 1.0)
+            self.probes += 1
+
+    def record_success(self):
+        if self.state == HALF_OPEN:
+            logger.info(f"Circuit {self.name} closed.")
+        self.state = CLOSED
+        self.failures = 0
+        self.probes = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning(f"Circuit {self.name} opened after {self.failures} failure(s).")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.probes = 0
+
+    def release(self):
+        """Outcome says nothing about provider health (cancelled, 4xx)."""
+        if self.state == HALF_OPEN and self.probes > 0:
+            self.probes -= 1
+
+    @asynccontextmanager
+    async def guard(self):
+        self.allow()
+        try:
+            yield
+        except Exception as e:
+            if is_provider_failure(e):
+                self.record_failure()
+            else:
+                self.release()
+            raise
+        except BaseException:
+            # Cancellation / generator close: free the probe slot, no verdict
+            self.release()
+            raise
+        else:
+            self.record_success()
+
+    def snapshot(self) -> dict:
+        state = self.state
+        if state == OPEN and not self.is_open:
+            state = HALF_OPEN  # will probe on the next call
+        return {
+            "state": state,
+            "consecutive_failures": self.failures,
+            "retry_after_s": round(self.retry_after(), 3) if state == OPEN else 0.0,
+            "rejected": self.rejected,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Process-wide breaker per provider name."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+
+def breaker_snapshot() -> Dict[str, dict]:
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
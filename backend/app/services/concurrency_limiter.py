@@ -0,0 +1,205 @@
+# app/services/concurrency_limiter.py
+
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from app.services.circuit_breaker import ProviderUnavailableError
+
+load_dotenv()
+
+logger = logging.getLogger("concurrency_limiter")
+
+LIMITER_INITIAL = float(os.getenv("LIMITER_INITIAL", "16"))
+LIMITER_MIN = float(os.getenv("LIMITER_MIN", "1"))
+LIMITER_MAX = float(os.getenv("LIMITER_MAX", "128"))
+LIMITER_MAX_QUEUE = int(os.getenv("LIMITER_MAX_QUEUE", "256"))
+LIMITER_LATENCY_TARGET = float(os.getenv("LIMITER_LATENCY_TARGET", "10.0"))  # seconds
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+UPSTREAM_DEADLINE = float(os.getenv("UPSTREAM_DEADLINE", "60.0"))  # seconds per request
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))  # seconds
+
+
+class OverloadedError(ProviderUnavailableError):
+    """Local admission refused: queue full or deadline can't be met."""
+
+
+class RateLimitedError(ProviderUnavailableError):
+    """The provider kept answering 429 until retries/deadline ran out."""
+
+
+def parse_retry_after(headers: httpx.Headers) -> Optional[float]:
+    """Retry-After as seconds (delta-seconds or HTTP-date), if present."""
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def new_deadline(seconds: float = UPSTREAM_DEADLINE) -> float:
+    return time.monotonic() + seconds
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for one provider.
+
+    The limit grows by ~1 per window of successful fast calls, shrinks 10%
+    when latency exceeds the target and halves on a 429. Callers beyond the
+    limit wait in a bounded FIFO queue; when it is full, or their deadline
+    passes, they get OverloadedError instead of piling on.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: float = LIMITER_INITIAL,
+        min_limit: float = LIMITER_MIN,
+        max_limit: float = LIMITER_MAX,
+        max_queue: int = LIMITER_MAX_QUEUE,
+        latency_target: float = LIMITER_LATENCY_TARGET,
+    ):
+        self.name = name
+        self.limit = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.latency_target = latency_target
+
+        self.in_flight = 0
+        self._waiters: "deque[asyncio.Future]" = deque()
+        self.stats = {"admitted": 0, "queued": 0, "shed": 0, "throttled": 0}
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def acquire(self, deadline: Optional[float] = None):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+            return
+
+        timeout = None if deadline is None else deadline - time.monotonic()
+        if len(self._waiters) >= self.max_queue or (timeout is not None and timeout <= 0):
+            self.stats["shed"] += 1
+            raise OverloadedError(self.name, 1.0, f"{self.name} is overloaded, request shed")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # slot was handed over just as we gave up
+            else:
+                waiter.cancel()
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats["shed"] += 1
+                raise OverloadedError(self.name, 1.0, f"{self.name} queue wait exceeded deadline")
+            raise
+        self.stats["admitted"] += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def on_success(self, latency: float):
+        if latency > self.latency_target:
+            self.limit = max(self.min_limit, self.limit * 0.9)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._wake()
+
+    def on_throttled(self):
+        self.stats["throttled"] += 1
+        self.limit = max(self.min_limit, self.limit * 0.5)
+
+    @asynccontextmanager
+    async def slot(self, deadline: Optional[float] = None):
+        await self.acquire(deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def send(
+        self,
+        send: Callable[[], Awaitable[httpx.Response]],
+        deadline: Optional[float] = None,
+        max_retries: int = UPSTREAM_MAX_RETRIES,
+    ) -> httpx.Response:
+        """
+        Issue a request under the limiter, retrying 429s after the provider's
+        Retry-After (or exponential backoff) plus jitter, within the deadline.
+        """
+        deadline = deadline or new_deadline()
+        for attempt in range(max_retries + 1):
+            async with self.slot(deadline):
+                started = time.monotonic()
+                response = await send()
+                if response.status_code == 429:
+                    self.on_throttled()
+                else:
+                    self.on_success(time.monotonic() - started)
+
+            if response.status_code != 429:
+                return response
+
+            wait = parse_retry_after(response.headers)
+            if wait is None:
+                wait = UPSTREAM_BACKOFF_BASE * (2 ** attempt)
+            wait += random.uniform(0, UPSTREAM_BACKOFF_BASE)
+
+            if attempt == max_retries or time.monotonic() + wait >= deadline:
+                raise RateLimitedError(self.name, wait, f"{self.name} rate limit exceeded")
+
+            logger.info(f"{self.name} returned 429, retrying in {wait:.2f}s")
+            await asyncio.sleep(wait)
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            **self.stats,
+        }
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+
+def get_limiter(name: str) -> AdaptiveLimiter:
+    """Process-wide limiter per provider name."""
+    limiter = _limiters.get(name)
+    if limiter is None:
+        limiter = _limiters[name] = AdaptiveLimiter(name)
+    return limiter
+
+
+def limiter_snapshot() -> Dict[str, dict]:
+    return {name: limiter.snapshot() for name, limiter in _limiters.items()}
@@ -0,0 +1,386 @@
+# app/services/credit_ledger.py
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import update, bindparam
+from redis.exceptions import RedisError
+
+from app.db import models
+from app.db.database import AsyncSessionLocal
+from app.db.redis_cache import async_redis_client
+from app.services.instrumentation import CREDIT_CHECK_SECONDS
+from app.services.credit_service import (
+    CHAT_CREDITS_DEFAULT,
+    IMAGE_CREDITS_DEFAULT,
+    chat_window_expired,
+    effective_credits,
+    get_user_credit,
+    image_window_expired,
+    refund_credit,
+)
+
+load_dotenv()
+
+logger = logging.getLogger("credit_ledger")
+
+CREDIT_FLUSH_INTERVAL = float(os.getenv("CREDIT_FLUSH_INTERVAL", "2.0"))  # seconds
+CREDIT_FLUSH_BATCH_SIZE = int(os.getenv("CREDIT_FLUSH_BATCH_SIZE", "500"))
+CREDIT_BALANCE_TTL = int(os.getenv("CREDIT_BALANCE_TTL", str(7 * 24 * 3600)))  # idle balances expire
+
+BALANCE_KEY = "credits:balance:{}"
+DIRTY_KEY = "credits:dirty"
+
+# Roll-over-check-and-decrement in one server-side step, so concurrent
+# requests for the same user can never interleave between read and write.
+# Window starts only move when a window actually rolls over.
+#
+# KEYS[1] balance hash, KEYS[2] dirty set
+# ARGV: now, hour_ago, day_start, year_start, credit_type, amount,
+#       chat_default, image_default, user_id, ttl
+# Returns {status, chat, image, chat_start, image_start}; status 1 ok,
+# 0 insufficient, -1 invalid type, -2 balance not loaded (caller seeds it).
+DEDUCT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return {-2, 0, 0, '0', '0'}
+end
+
+local chat = tonumber(redis.call('HGET', KEYS[1], 'chat'))
+local image = tonumber(redis.call('HGET', KEYS[1], 'image'))
+local chat_start = redis.call('HGET', KEYS[1], 'chat_start')
+local image_start = redis.call('HGET', KEYS[1], 'image_start')
+local credit_type = ARGV[5]
+local amount = tonumber(ARGV[6])
+
+if tonumber(chat_start) <= tonumber(ARGV[2]) or tonumber(chat_start) < tonumber(ARGV[4]) then
+    chat = tonumber(ARGV[7])
+    chat_start = ARGV[1]
+end
+if tonumber(image_start) < tonumber(ARGV[3]) then
+    image = tonumber(ARGV[8])
+    image_start = ARGV[1]
+end
+
+if credit_type == 'chat' then
+    if chat < amount then return {0, chat, image, chat_start, image_start} end
+    chat = chat - amount
+elseif credit_type == 'image' then
+    if image < amount then return {0, chat, image, chat_start, image_start} end
+    image = image - amount
+else
+    return {-1, chat, image, chat_start, image_start}
+end
+
+redis.call('HSET', KEYS[1], 'chat', chat, 'image', image, 'chat_start', chat_start, 'image_start', image_start)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[10]))
+redis.call('SADD', KEYS[2], ARGV[9])
+return {1, chat, image, chat_start, image_start}
+"""
+
+# Return unused credits, capped at the window default.
+# KEYS[1] balance hash, KEYS[2] dirty set; ARGV: field, amount, cap, user_id
+REFUND_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -2
+end
+local value = tonumber(redis.call('HGET', KEYS[1], ARGV[1])) + tonumber(ARGV[2])
+value = math.min(value, tonumber(ARGV[3]))
+redis.call('HSET', KEYS[1], ARGV[1], value)
+redis.call('SADD', KEYS[2], ARGV[4])
+return value
+"""
+
+# Seed a balance only if no live one exists (another worker may have won the race)
+SEED_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], 'chat', ARGV[1], 'image', ARGV[2], 'chat_start', ARGV[3], 'image_start', ARGV[4])
+    redis.call('EXPIRE', KEYS[1], tonumber(ARGV[5]))
+end
+return 1
+"""
+
+
+class CreditLedgerUnavailableError(Exception):
+    """Redis is down, so a spend can't be checked safely; retry later."""
+
+
+def _window_bounds(now: float):
+    """(hour_ago, utc_day_start, utc_year_start) as epoch seconds."""
+    now_dt = datetime.fromtimestamp(now, tz=timezone.utc)
+    day_start = now_dt.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    year_start = now_dt.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0).timestamp()
+    return now - 3600, day_start, year_start
+
+
+def _to_datetime(epoch) -> datetime:
+    return datetime.fromtimestamp(float(epoch), tz=timezone.utc)
+
+
+def _epoch(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _balance_dict(chat, image, chat_start, image_start) -> Dict[str, Any]:
+    return {
+        "chat_credits": int(chat),
+        "image_credits": int(image),
+        "last_reset": _to_datetime(max(float(chat_start), float(image_start))),
+    }
+
+
+def _default_balance() -> Dict[str, Any]:
+    # No credits row yet: full windows, and the first spend creates the row
+    return {"chat_credits": CHAT_CREDITS_DEFAULT, "image_credits": IMAGE_CREDITS_DEFAULT, "last_reset": None}
+
+
+class CreditLedger:
+    """
+    Live credit balances in Redis with write-behind to the ``credits`` table.
+
+    Every deduction runs as one Lua script; touched users are added to a dirty
+    set that a background task drains into batched UPDATEs. A missing Redis
+    balance (cold start, eviction) is rebuilt lazily from Postgres.
+    """
+
+    def __init__(self, redis=async_redis_client):
+        self.redis = redis
+        self._deduct = redis.register_script(DEDUCT_SCRIPT)
+        self._seed = redis.register_script(SEED_SCRIPT)
+        self._refund = redis.register_script(REFUND_SCRIPT)
+        self._flush_task: Optional[asyncio.Task] = None
+
+    # ----------------------------------
+    # Balances
+    # ----------------------------------
+    async def _seed_from_db(self, user_id: int, create: bool = False) -> bool:
+        """
+        Load the ``credits`` row into Redis. Without a row this only creates
+        one when ``create`` is set (the first spend); reads never write.
+        Returns False if there was nothing to seed.
+        """
+        async with AsyncSessionLocal() as db:
+            credit = await get_user_credit(db, user_id)
+            if credit is None:
+                if not create:
+                    return False
+                now = datetime.now(timezone.utc)
+                credit = models.Credit(
+                    user_id=user_id,
+                    chat_credits=CHAT_CREDITS_DEFAULT,
+                    image_credits=IMAGE_CREDITS_DEFAULT,
+                    last_reset=now,
+                    chat_window_start=now,
+                    image_window_start=now,
+                )
+                db.add(credit)
+                await db.commit()
+
+            chat_start = _epoch(credit.chat_window_start or credit.last_reset)
+            image_start = _epoch(credit.image_window_start or credit.last_reset)
+
+        await self._seed(
+            keys=[BALANCE_KEY.format(user_id)],
+            args=[credit.chat_credits, credit.image_credits, chat_start, image_start, CREDIT_BALANCE_TTL],
+        )
+        return True
+
+    async def _apply(self, user_id: int, credit_type: str, amount: int):
+        key = BALANCE_KEY.format(user_id)
+        for _ in range(2):
+            now = time.time()
+            hour_ago, day_start, year_start = _window_bounds(now)
+            status, chat, image, chat_start, image_start = await self._deduct(
+                keys=[key, DIRTY_KEY],
+                args=[
+                    now, hour_ago, day_start, year_start, credit_type, amount,
+                    CHAT_CREDITS_DEFAULT, IMAGE_CREDITS_DEFAULT, user_id, CREDIT_BALANCE_TTL,
+                ],
+            )
+            if status != -2:
+                break
+            await self._seed_from_db(user_id, create=True)
+
+        if status == -2:
+            raise RuntimeError("Credit balance could not be loaded.")
+        if status == -1:
+            raise Exception("Invalid credit type. Use 'chat' or 'image'.")
+        if status == 0:
+            raise Exception(f"No {credit_type} credits left.")
+
+        return _balance_dict(chat, image, chat_start, image_start)
+
+    async def deduct(self, user, credit_type: str, amount: int = 1) -> Dict[str, Any]:
+        """
+        Atomically refresh and deduct. Fails closed if Redis is down: a spend
+        against the ``credits`` row would be overwritten by the next flush of
+        the still-live Redis balance once it recovers.
+        """
+        if user.is_premium:
+            return {
+                "chat_credits": "unlimited",
+                "image_credits": "unlimited",
+                "last_reset": None
+            }
+
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            return await self._apply(user.id, credit_type, amount)
+        except RedisError as e:
+            logger.warning(f"Credit ledger unavailable, rejecting spend: {e}")
+            outcome = "unavailable"
+            raise CreditLedgerUnavailableError("Credits are temporarily unavailable") from e
+        except Exception:
+            outcome = "rejected"
+            raise
+        finally:
+            CREDIT_CHECK_SECONDS.observe(time.perf_counter() - started, backend="redis", outcome=outcome)
+
+    async def refund(self, user, credit_type: str, amount: int):
+        """Give back credits charged up front for work that didn't happen."""
+        if user.is_premium or amount <= 0:
+            return
+
+        field, cap = ("chat", CHAT_CREDITS_DEFAULT) if credit_type == "chat" else ("image", IMAGE_CREDITS_DEFAULT)
+        try:
+            status = await self._refund(
+                keys=[BALANCE_KEY.format(user.id), DIRTY_KEY],
+                args=[field, amount, cap, user.id],
+            )
+            if status != -2:
+                return
+        except RedisError as e:
+            logger.warning(f"Credit ledger unavailable, refunding in database: {e}")
+
+        async with AsyncSessionLocal() as db:
+            await refund_credit(db, user.id, credit_type, amount)
+
+    async def balance(self, user_id: int) -> Dict[str, Any]:
+        """
+        Effective balance, computed on read: a due roll-over is reported but
+        not written; it is persisted by the next spend. Falls back to the
+        ``credits`` row if Redis is down.
+        """
+        try:
+            return await self._redis_balance(user_id)
+        except RedisError as e:
+            logger.warning(f"Credit ledger unavailable, reading balance from database: {e}")
+            return await self._db_balance(user_id)
+
+    async def _db_balance(self, user_id: int) -> Dict[str, Any]:
+        async with AsyncSessionLocal() as db:
+            credit = await get_user_credit(db, user_id)
+        if credit is None:
+            return _default_balance()
+
+        effective = effective_credits(credit)
+        return {
+            "chat_credits": effective.chat_credits,
+            "image_credits": effective.image_credits,
+            "last_reset": effective.last_reset,
+        }
+
+    async def _redis_balance(self, user_id: int) -> Dict[str, Any]:
+        key = BALANCE_KEY.format(user_id)
+        fields = await self.redis.hmget(key, "chat", "image", "chat_start", "image_start")
+        if fields[0] is None:
+            if not await self._seed_from_db(user_id):
+                return _default_balance()
+            fields = await self.redis.hmget(key, "chat", "image", "chat_start", "image_start")
+
+        chat, image, chat_start, image_start = fields
+        now = datetime.now(timezone.utc)
+        if chat_window_expired(_to_datetime(chat_start), now):
+            chat, chat_start = CHAT_CREDITS_DEFAULT, now.timestamp()
+        if image_window_expired(_to_datetime(image_start), now):
+            image, image_start = IMAGE_CREDITS_DEFAULT, now.timestamp()
+
+        return _balance_dict(chat, image, chat_start, image_start)
+
+    # ----------------------------------
+    # Write-behind
+    # ----------------------------------
+    async def flush(self) -> int:
+        """Write dirty balances to Postgres in batches; returns rows flushed."""
+        flushed = 0
+        while True:
+            user_ids = await self.redis.spop(DIRTY_KEY, CREDIT_FLUSH_BATCH_SIZE)
+            if not user_ids:
+                return flushed
+
+            pipe = self.redis.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.hgetall(BALANCE_KEY.format(user_id))
+            balances = await pipe.execute()
+
+            rows = [
+                {
+                    "b_user_id": int(user_id),
+                    "b_chat": int(balance["chat"]),
+                    "b_image": int(balance["image"]),
+                    "b_chat_start": _to_datetime(balance["chat_start"]),
+                    "b_image_start": _to_datetime(balance["image_start"]),
+                    "b_last_reset": _to_datetime(max(float(balance["chat_start"]), float(balance["image_start"]))),
+                }
+                for user_id, balance in zip(user_ids, balances)
+                if balance
+            ]
+            if not rows:
+                continue
+
+            credits = models.Credit.__table__
+            stmt = (
+                update(credits)
+                .where(credits.c.user_id == bindparam("b_user_id"))
+                .values(
+                    chat_credits=bindparam("b_chat"),
+                    image_credits=bindparam("b_image"),
+                    chat_window_start=bindparam("b_chat_start"),
+                    image_window_start=bindparam("b_image_start"),
+                    last_reset=bindparam("b_last_reset"),
+                )
+            )
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(stmt, rows)
+                    await db.commit()
+            except Exception:
+                # Put them back so the next cycle retries
+                await self.redis.sadd(DIRTY_KEY, *user_ids)
+                raise
+            flushed += len(rows)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(CREDIT_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Credit flush failed: {e}")
+
+    def start(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Final credit flush failed: {e}")
+
+
+credit_ledger = CreditLedger()
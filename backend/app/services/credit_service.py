@@ -1,38 +1,94 @@
 # app/services/credit_service.py
 
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db import models
 
+CHAT_CREDITS_DEFAULT = 10
+IMAGE_CREDITS_DEFAULT = 5
 
-def reset_credits_if_needed(credit: models.Credit):
-    """Handles automatic credit refresh based on time rules."""
 
-    now = datetime.now(timezone.utc)
-    last_reset = credit.last_reset
+@dataclass(frozen=True)
+class EffectiveCredits:
+    """Balances as they stand right now, derived from stored window starts."""
 
+    chat_credits: int
+    image_credits: int
+    chat_window_start: datetime
+    image_window_start: datetime
+    rolled_over: bool
+
+    @property
+    def last_reset(self) -> datetime:
+        return max(self.chat_window_start, self.image_window_start)
+
+
+def _aware(value: datetime) -> datetime:
     # Ensure timezone-aware datetime
-    if last_reset.tzinfo is None:
-        last_reset = last_reset.replace(tzinfo=timezone.utc)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def chat_window_expired(window_start: datetime, now: datetime) -> bool:
+    # Hourly chat reset (and a yearly reset of everything)
+    return now - window_start >= timedelta(hours=1) or now.year != window_start.year
+
+
+def image_window_expired(window_start: datetime, now: datetime) -> bool:
+    # Daily image reset (a new year is always a new day)
+    return now.date() != window_start.date()
+
+
+def effective_credits(credit: models.Credit, now: datetime = None) -> EffectiveCredits:
+    """
+    Compute the refreshed balances without touching the row.
+
+    Windows are anchored on when they started, not on when they were last
+    read, so a busy user's hourly window still rolls over on time.
+    """
+    now = now or datetime.now(timezone.utc)
+    chat_start = _aware(credit.chat_window_start or credit.last_reset)
+    image_start = _aware(credit.image_window_start or credit.last_reset)
+    chat, image = credit.chat_credits, credit.image_credits
+    rolled = False
 
-    # Hourly chat reset
-    if now - last_reset >= timedelta(hours=1):
-        credit.chat_credits = 10
+    if chat_window_expired(chat_start, now):
+        chat, chat_start, rolled = CHAT_CREDITS_DEFAULT, now, True
 
-    # Daily image reset
-    if now.date() != last_reset.date():
-        credit.image_credits = 5
+    if image_window_expired(image_start, now):
+        image, image_start, rolled = IMAGE_CREDITS_DEFAULT, now, True
 
-    # Yearly reset
-    if now.year != last_reset.year:
-        credit.chat_credits = 10
-        credit.image_credits = 5
+    return EffectiveCredits(chat, image, chat_start, image_start, rolled)
 
-    credit.last_reset = now
 
+def reset_credits_if_needed(credit: models.Credit) -> bool:
+    """
+    Apply a due window roll-over to the row. Returns True only when something
+    changed, so callers can skip the commit on the (common) no-op path.
+    """
+    effective = effective_credits(credit)
+    if not effective.rolled_over:
+        return False
 
-def deduct_credit(db: Session, user: models.User, credit_type: str):
-    """Deducts credits and returns updated values"""
+    credit.chat_credits = effective.chat_credits
+    credit.image_credits = effective.image_credits
+    credit.chat_window_start = effective.chat_window_start
+    credit.image_window_start = effective.image_window_start
+    credit.last_reset = effective.last_reset
+    return True
+
+
+async def get_user_credit(db: AsyncSession, user_id: int):
+    """Load the user's credit row (relationships can't lazy-load on async sessions)."""
+    result = await db.execute(select(models.Credit).where(models.Credit.user_id == user_id))
+    return result.scalars().first()
+
+
+async def deduct_credit(db: AsyncSession, user: models.User, credit_type: str, amount: int = 1):
+    """Deducts credits (all ``amount`` or nothing) and returns updated values"""
 
     if user.is_premium:
         return {
@@ -42,37 +98,54 @@ def deduct_credit(db: Session, user: models.User, credit_type: str):
         }
 
     # Ensure user has a credit row
-    if not user.credits:
-        credit = models.Credit(user_id=user.id)
+    credit = await get_user_credit(db, user.id)
+    if credit is None:
+        now = datetime.now(timezone.utc)
+        credit = models.Credit(
+            user_id=user.id,
+            chat_credits=CHAT_CREDITS_DEFAULT,
+            image_credits=IMAGE_CREDITS_DEFAULT,
+            last_reset=now,
+            chat_window_start=now,
+            image_window_start=now
+        )
         db.add(credit)
-        db.commit()
-        db.refresh(credit)
-    else:
-        credit = user.credits[0]
 
-    # Reset if needed before deduction
+    # Roll windows over if due; the spend below persists it in the same commit
     reset_credits_if_needed(credit)
 
     # Deduct credit
     if credit_type == "chat":
-        if credit.chat_credits <= 0:
+        if credit.chat_credits < amount:
             raise Exception("No chat credits left.")
-        credit.chat_credits -= 1
+        credit.chat_credits -= amount
 
     elif credit_type == "image":
-        if credit.image_credits <= 0:
+        if credit.image_credits < amount:
             raise Exception("No image credits left.")
-        credit.image_credits -= 1
+        credit.image_credits -= amount
 
     else:
         raise Exception("Invalid credit type. Use 'chat' or 'image'.")
 
     db.add(credit)
-    db.commit()
-    db.refresh(credit)
+    await db.commit()
 
     return {
         "chat_credits": credit.chat_credits,
         "image_credits": credit.image_credits,
         "last_reset": credit.last_reset
     }
+
+
+async def refund_credit(db: AsyncSession, user_id: int, credit_type: str, amount: int):
+    """Give back credits charged for work that failed (never above the window default)."""
+    credit = await get_user_credit(db, user_id)
+    if credit is None or amount <= 0:
+        return
+
+    if credit_type == "chat":
+        credit.chat_credits = min(CHAT_CREDITS_DEFAULT, credit.chat_credits + amount)
+    elif credit_type == "image":
+        credit.image_credits = min(IMAGE_CREDITS_DEFAULT, credit.image_credits + amount)
+    await db.commit()
@@ -0,0 +1,261 @@
+# app/services/image_jobs.py
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastapi import Request
+
+from app.db.redis_cache import async_redis_client
+from app.services.image_store import image_payload
+from app.services.usage_events import usage_recorder
+
+load_dotenv()
+
+logger = logging.getLogger("image_jobs")
+
+IMAGE_JOB_BACKEND = os.getenv("IMAGE_JOB_BACKEND", "redis")  # "redis" or "memory"
+IMAGE_JOB_WORKERS = int(os.getenv("IMAGE_JOB_WORKERS", "4"))
+IMAGE_JOB_MAX_QUEUED = int(os.getenv("IMAGE_JOB_MAX_QUEUED", "200"))
+IMAGE_JOB_TTL = int(os.getenv("IMAGE_JOB_TTL", "3600"))  # seconds a finished job is kept
+IMAGE_JOB_WAIT_TIMEOUT = float(os.getenv("IMAGE_JOB_WAIT_TIMEOUT", "15"))  # max gap between SSE status checks
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TERMINAL_STATES = (SUCCEEDED, FAILED)
+
+
+class JobQueueFullError(Exception):
+    """Too many jobs are waiting; the client should retry later."""
+
+
+class InMemoryJobStore:
+    """Process-local job state and queue; for tests and single-worker dev."""
+
+    durable = False  # the queue dies with the process
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._expires: Dict[str, float] = {}
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._changed: Dict[str, asyncio.Event] = {}
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for job_id in [j for j, exp in self._expires.items() if exp <= now]:
+            self._jobs.pop(job_id, None)
+            self._expires.pop(job_id, None)
+            self._changed.pop(job_id, None)
+
+    async def save(self, job: Dict[str, Any]):
+        self._evict_expired()
+        self._jobs[job["id"]] = dict(job)
+        self._expires[job["id"]] = time.monotonic() + IMAGE_JOB_TTL
+        event = self._changed.pop(job["id"], None)
+        if event is not None:
+            event.set()
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        self._evict_expired()
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def delete(self, job_id: str):
+        self._jobs.pop(job_id, None)
+        self._expires.pop(job_id, None)
+        self._changed.pop(job_id, None)
+
+    async def enqueue(self, job_id: str):
+        if self._queue.qsize() >= IMAGE_JOB_MAX_QUEUED:
+            raise JobQueueFullError()
+        self._queue.put_nowait(job_id)
+
+    async def dequeue(self, timeout: float) -> Optional[str]:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def wait_for_change(self, job_id: str, timeout: float):
+        event = self._changed.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class RedisJobStore:
+    """
+    Job state as JSON strings with a TTL and a Redis list as the work queue,
+    so any API worker can accept, run or report on any job.
+    """
+
+    KEY = "image_jobs:job:{}"
+    QUEUE_KEY = "image_jobs:queue"
+    CHANNEL = "image_jobs:events:{}"
+    durable = True
+
+    def __init__(self, redis=async_redis_client):
+        self.redis = redis
+
+    async def save(self, job: Dict[str, Any]):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.setex(self.KEY.format(job["id"]), IMAGE_JOB_TTL, json.dumps(job))
+        pipe.publish(self.CHANNEL.format(job["id"]), job["status"])
+        await pipe.execute()
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        value = await self.redis.get(self.KEY.format(job_id))
+        return json.loads(value) if value else None
+
+    async def delete(self, job_id: str):
+        await self.redis.delete(self.KEY.format(job_id))
+
+    async def enqueue(self, job_id: str):
+        if await self.redis.llen(self.QUEUE_KEY) >= IMAGE_JOB_MAX_QUEUED:
+            raise JobQueueFullError()
+        await self.redis.lpush(self.QUEUE_KEY, job_id)
+
+    async def dequeue(self, timeout: float) -> Optional[str]:
+        item = await self.redis.brpop(self.QUEUE_KEY, timeout=max(1, int(timeout)))
+        return item[1] if item else None
+
+    async def wait_for_change(self, job_id: str, timeout: float):
+        pubsub = self.redis.pubsub()
+        try:
+            await pubsub.subscribe(self.CHANNEL.format(job_id))
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=deadline - time.monotonic())
+                if message is not None:
+                    return
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+
+
+def build_job_store():
+    if IMAGE_JOB_BACKEND == "memory":
+        return InMemoryJobStore()
+    return RedisJobStore()
+
+
+class ImageJobQueue:
+    """
+    Accepts image jobs and runs them on a fixed pool of worker tasks, so at
+    most ``workers`` ClipDrop calls per process are in flight regardless of
+    how many clients are waiting.
+    """
+
+    def __init__(self, store, ai_provider, workers: int = IMAGE_JOB_WORKERS):
+        self.store = store
+        self.ai_provider = ai_provider
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+
+    async def submit(self, user_id: int, prompt: str, response_format: Optional[str] = None) -> Dict[str, Any]:
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "prompt": prompt,
+            "response_format": response_format,
+            "status": QUEUED,
+            "created_at": now,
+            "updated_at": now,
+            "result": None,
+            "error": None,
+        }
+        # Saved first so a worker that dequeues it straight away finds it;
+        # dropped again if the queue refuses it, or nothing would ever run it
+        await self.store.save(job)
+        try:
+            await self.store.enqueue(job["id"])
+        except Exception:
+            await self.store.delete(job["id"])
+            raise
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.store.get(job_id)
+
+    async def _update(self, job: Dict[str, Any], **fields):
+        job.update(fields, updated_at=time.time())
+        await self.store.save(job)
+
+    async def _run(self, job_id: str):
+        job = await self.store.get(job_id)
+        if job is None or job["status"] != QUEUED:
+            return  # expired or already handled
+
+        await self._update(job, status=RUNNING)
+        started = time.perf_counter()
+        try:
+            result = await self.ai_provider.generate_image(job["prompt"])
+            usage_recorder.record(
+                job["user_id"], "image_job", started, "ClipDrop", job["prompt"],
+                status="ok" if result.get("success") else "error",
+            )
+            if result.get("success"):
+                payload = await image_payload(result["image"], result["content_type"], job.get("response_format"))
+        except asyncio.CancelledError:
+            await self._requeue(job)
+            raise
+        except Exception as e:
+            await self._update(job, status=FAILED, error=str(e))
+            return
+
+        if result.get("success"):
+            await self._update(job, status=SUCCEEDED, result={"provider": "ClipDrop", **payload})
+        else:
+            await self._update(job, status=FAILED, error=result.get("message", "Unknown error"))
+
+    async def _requeue(self, job: Dict[str, Any]):
+        """
+        Hand a job interrupted by shutdown back to a durable queue (another
+        worker or the next start picks it up); otherwise fail it, so it
+        doesn't sit in RUNNING and SSE watchers hear about it.
+        """
+        if self.store.durable:
+            try:
+                await self._update(job, status=QUEUED)
+                await self.store.enqueue(job["id"])
+                logger.info(f"Image job {job['id']} interrupted, requeued.")
+                return
+            except Exception as e:
+                logger.warning(f"Could not requeue interrupted image job {job['id']}: {e}")
+        await self._update(job, status=FAILED, error="Interrupted by server shutdown")
+
+    async def _worker(self):
+        while True:
+            try:
+                job_id = await self.store.dequeue(timeout=5)
+                if job_id:
+                    await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Image job worker error: {e}")
+                await asyncio.sleep(1)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+def get_image_jobs(request: Request) -> ImageJobQueue:
+    """FastAPI dependency returning the process's image job queue."""
+    return request.app.state.image_jobs
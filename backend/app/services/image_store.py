@@ -0,0 +1,213 @@
+# app/services/image_store.py
+
+import os
+import base64
+import asyncio
+import hashlib
+import logging
+import tempfile
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("image_store")
+
+IMAGE_STORE_BACKEND = os.getenv("IMAGE_STORE_BACKEND", "local")  # "local" or "s3"
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", "./data/images")
+IMAGE_STORE_S3_BUCKET = os.getenv("IMAGE_STORE_S3_BUCKET")
+IMAGE_STORE_S3_ENDPOINT = os.getenv("IMAGE_STORE_S3_ENDPOINT")  # MinIO, R2, ... (None → AWS)
+IMAGE_STORE_S3_PREFIX = os.getenv("IMAGE_STORE_S3_PREFIX", "images/")
+IMAGE_PUBLIC_BASE_URL = os.getenv("IMAGE_PUBLIC_BASE_URL", "")  # e.g. a CDN origin; "" → same host
+IMAGE_RESPONSE_FORMAT = os.getenv("IMAGE_RESPONSE_FORMAT", "url")  # "url" or legacy "base64"
+
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass(frozen=True)
+class ImageMeta:
+    digest: str
+    size: int
+    content_type: str
+
+
+def sniff_content_type(head: bytes) -> str:
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def is_digest(value: str) -> bool:
+    return len(value) == 64 and all(c in "0123456789abcdef" for c in value)
+
+
+def image_url(digest: str) -> str:
+    return f"{IMAGE_PUBLIC_BASE_URL}/images/{digest}"
+
+
+class LocalImageStore:
+    """
+    Content-addressed images on the local filesystem.
+
+    Objects live at ``<root>/<d[:2]>/<d[2:4]>/<digest>``; writing the same
+    bytes twice is a no-op, and a temp file + rename keeps readers from ever
+    seeing a partial object. Blocking file IO runs in worker threads.
+    """
+
+    def __init__(self, root: str = IMAGE_STORE_DIR):
+        self.root = root
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def _write(self, digest: str, data: bytes):
+        path = self._path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    async def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        await asyncio.to_thread(self._write, digest, data)
+        return digest
+
+    def _head(self, digest: str) -> Optional[ImageMeta]:
+        path = self._path(digest)
+        try:
+            size = os.path.getsize(path)
+            with open(path, "rb") as f:
+                head = f.read(16)
+        except FileNotFoundError:
+            return None
+        return ImageMeta(digest, size, sniff_content_type(head))
+
+    async def head(self, digest: str) -> Optional[ImageMeta]:
+        return await asyncio.to_thread(self._head, digest)
+
+    async def get(self, digest: str) -> Optional[bytes]:
+        def _read():
+            try:
+                with open(self._path(digest), "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                return None
+        return await asyncio.to_thread(_read)
+
+    async def iter_range(self, digest: str, start: int, end: int) -> AsyncIterator[bytes]:
+        """Yield bytes ``start..end`` inclusive without loading the whole file."""
+        f = await asyncio.to_thread(open, self._path(digest), "rb")
+        try:
+            await asyncio.to_thread(f.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(f.close)
+
+
+class S3ImageStore:
+    """
+    Same interface backed by any S3-compatible bucket (optional ``boto3``).
+    The SDK is synchronous, so calls run in worker threads.
+    """
+
+    def __init__(self, bucket: str = IMAGE_STORE_S3_BUCKET, endpoint_url: str = IMAGE_STORE_S3_ENDPOINT, prefix: str = IMAGE_STORE_S3_PREFIX):
+        try:
+            import boto3
+        except ImportError as e:
+            raise RuntimeError("IMAGE_STORE_BACKEND=s3 requires the 'boto3' package") from e
+        if not bucket:
+            raise RuntimeError("IMAGE_STORE_BACKEND=s3 requires IMAGE_STORE_S3_BUCKET")
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, digest: str) -> str:
+        return f"{self.prefix}{digest}"
+
+    def _head_raw(self, digest: str):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(digest))
+        except self.client.exceptions.ClientError:
+            return None
+
+    async def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        if await asyncio.to_thread(self._head_raw, digest) is None:
+            await asyncio.to_thread(
+                self.client.put_object,
+                Bucket=self.bucket,
+                Key=self._key(digest),
+                Body=data,
+                ContentType=sniff_content_type(data[:16]),
+                CacheControl="public, max-age=31536000, immutable",
+            )
+        return digest
+
+    async def head(self, digest: str) -> Optional[ImageMeta]:
+        raw = await asyncio.to_thread(self._head_raw, digest)
+        if raw is None:
+            return None
+        return ImageMeta(digest, raw["ContentLength"], raw.get("ContentType", "application/octet-stream"))
+
+    async def get(self, digest: str) -> Optional[bytes]:
+        try:
+            obj = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=self._key(digest))
+        except self.client.exceptions.ClientError:
+            return None
+        return await asyncio.to_thread(obj["Body"].read)
+
+    async def iter_range(self, digest: str, start: int, end: int) -> AsyncIterator[bytes]:
+        obj = await asyncio.to_thread(
+            self.client.get_object, Bucket=self.bucket, Key=self._key(digest), Range=f"bytes={start}-{end}"
+        )
+        body = obj["Body"]
+        try:
+            while True:
+                chunk = await asyncio.to_thread(body.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+
+def build_image_store():
+    if IMAGE_STORE_BACKEND == "s3":
+        return S3ImageStore()
+    return LocalImageStore()
+
+
+image_store = build_image_store()
+
+
+async def image_payload(data: bytes, content_type: str = "image/png", response_format: Optional[str] = None) -> dict:
+    """
+    API representation of a generated image: a cacheable URL into the
+    store, or the legacy inline data URI when ``base64`` is requested.
+    """
+    if (response_format or IMAGE_RESPONSE_FORMAT) == "base64":
+        encoded = base64.b64encode(data).decode("utf-8")
+        return {"image_base64": f"data:{content_type};base64,{encoded}"}
+
+    digest = await image_store.put(data)
+    return {"image_id": digest, "image_url": image_url(digest)}
@@ -0,0 +1,279 @@
+# app/services/image_variants.py
+
+import io
+import os
+import asyncio
+import logging
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.services.image_store import image_store
+from app.services.single_flight import SingleFlight
+
+load_dotenv()
+
+logger = logging.getLogger("image_variants")
+
+IMAGE_VARIANT_DIR = os.getenv("IMAGE_VARIANT_DIR", "./data/variants")
+IMAGE_VARIANT_CACHE_MAX_BYTES = int(os.getenv("IMAGE_VARIANT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", str(min(4, os.cpu_count() or 1))))
+IMAGE_VARIANT_WIDTHS = sorted(int(w) for w in os.getenv("IMAGE_VARIANT_WIDTHS", "160,320,640,1024").split(","))
+IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "82"))
+
+CONTENT_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+FORMAT_BY_CONTENT_TYPE = {ct: fmt for fmt, ct in CONTENT_TYPES.items()}
+# Smallest-first tie-break when the client accepts several formats equally
+FORMAT_PREFERENCE = ("webp", "jpeg", "png")
+
+
+# --------------------------------------
+# NEGOTIATION
+# --------------------------------------
+def parse_accept(header: Optional[str]) -> Dict[str, float]:
+    """``Accept`` as {media range: q}; a missing header accepts anything."""
+    if not header:
+        return {"*/*": 1.0}
+    ranges = {}
+    for part in header.split(","):
+        media, *params = [p.strip() for p in part.split(";")]
+        if not media:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        ranges[media.lower()] = q
+    return ranges
+
+
+def accept_quality(ranges: Dict[str, float], content_type: str) -> float:
+    major = content_type.split("/")[0]
+    for media in (content_type, f"{major}/*", "*/*"):
+        if media in ranges:
+            return ranges[media]
+    return 0.0
+
+
+def negotiate_format(accept: Optional[str], source_format: str) -> str:
+    """
+    The stored format unless the client explicitly names another one it
+    prefers. Wildcards (and a missing header or ``*/*``, i.e. curl, links,
+    most API clients) get the original, which costs no transcode. A named
+    type beats the source at a higher q, or at equal q when the source only
+    matched through a wildcard (browsers: ``image/webp,...,*/*``).
+    """
+    ranges = parse_accept(accept)
+    source_type = CONTENT_TYPES[source_format]
+    source_q = accept_quality(ranges, source_type)
+    source_named = source_type in ranges
+
+    best, best_q = source_format, source_q
+    for fmt in FORMAT_PREFERENCE:
+        q = ranges.get(CONTENT_TYPES[fmt], 0.0)  # explicit mentions only
+        if fmt == source_format or q <= 0.0:
+            continue
+        if q > best_q or (best == source_format and q == best_q and not source_named):
+            best, best_q = fmt, q
+    return best
+
+
+def snap_width(requested: Optional[int]) -> Optional[int]:
+    """
+    Round a requested width up to the nearest configured size so arbitrary
+    ``?w=`` values can't fill the cache with one-off variants.
+    """
+    if not requested:
+        return None
+    for width in IMAGE_VARIANT_WIDTHS:
+        if width >= requested:
+            return width
+    return None  # larger than every variant → full size
+
+
+# --------------------------------------
+# TRANSCODING (runs in worker processes)
+# --------------------------------------
+def render_variant(data: bytes, fmt: str, width: Optional[int]) -> bytes:
+    """Resize (never upscale) and re-encode. Must stay a top-level function."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        img.load()
+        if width and img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.LANCZOS)
+
+        out = io.BytesIO()
+        if fmt == "jpeg":
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                background.paste(img, mask=img.getchannel("A"))
+                img = background
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+            img.save(out, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+        elif fmt == "webp":
+            img.save(out, "WEBP", quality=IMAGE_WEBP_QUALITY, method=4)
+        else:
+            img.save(out, "PNG", optimize=True)
+        return out.getvalue()
+
+
+# --------------------------------------
+# ON-DISK LRU
+# --------------------------------------
+VariantKey = Tuple[str, str, Optional[int]]
+
+
+class VariantCache:
+    """
+    Rendered variants on disk, bounded by total bytes.
+
+    Recency is tracked in memory (seeded from file mtimes on first use) and
+    the least recently used files are deleted once ``max_bytes`` is
+    exceeded. Each worker process keeps its own index; a file evicted by a
+    sibling simply reads as a miss.
+    """
+
+    def __init__(self, root: str = IMAGE_VARIANT_DIR, max_bytes: int = IMAGE_VARIANT_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # path → size
+        self._total = 0
+        self._loaded = False
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _path(self, key: VariantKey) -> str:
+        digest, fmt, width = key
+        return os.path.join(self.root, digest[:2], f"{digest}_{width or 'full'}.{fmt}")
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, path, st.st_size))
+        return sorted(entries)
+
+    async def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        # Oldest first, ahead of anything cached while the scan ran
+        for _, path, size in reversed(await asyncio.to_thread(self._scan)):
+            if path not in self._index:
+                self._index[path] = size
+                self._index.move_to_end(path, last=False)
+                self._total += size
+
+    def _read(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # keep recency across restarts
+            return data
+        except FileNotFoundError:
+            return None
+
+    def _write(self, path: str, data: bytes, evicted: List[str]):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        for old_path in evicted:
+            try:
+                os.unlink(old_path)
+            except FileNotFoundError:
+                pass
+
+    async def get(self, key: VariantKey) -> Optional[bytes]:
+        await self._ensure_loaded()
+        path = self._path(key)
+        data = await asyncio.to_thread(self._read, path)
+        if data is None:
+            if path in self._index:
+                self._total -= self._index.pop(path)
+            self.stats["misses"] += 1
+            return None
+        self._total += len(data) - self._index.pop(path, 0)
+        self._index[path] = len(data)
+        self.stats["hits"] += 1
+        return data
+
+    async def put(self, key: VariantKey, data: bytes):
+        await self._ensure_loaded()
+        path = self._path(key)
+        self._total += len(data) - self._index.pop(path, 0)
+        self._index[path] = len(data)
+
+        # Index bookkeeping stays on the event loop; the thread only touches files
+        evicted = []
+        while self._total > self.max_bytes and len(self._index) > 1:
+            old_path, size = self._index.popitem(last=False)
+            self._total -= size
+            evicted.append(old_path)
+        self.stats["evictions"] += len(evicted)
+        await asyncio.to_thread(self._write, path, data, evicted)
+
+
+class ImageVariants:
+    """
+    Produces (digest, format, width) variants of stored images: cached on
+    disk, rendered by a process pool so Pillow never blocks the event loop,
+    with concurrent requests for the same variant sharing one render.
+    """
+
+    def __init__(self, cache: Optional[VariantCache] = None, workers: int = IMAGE_VARIANT_WORKERS):
+        self.cache = cache or VariantCache()
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._flights = SingleFlight()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def get(self, digest: str, fmt: str, width: Optional[int]) -> Optional[bytes]:
+        key = (digest, fmt, width)
+        data = await self.cache.get(key)
+        if data is not None:
+            return data
+
+        async def render():
+            original = await image_store.get(digest)
+            if original is None:
+                return None
+            loop = asyncio.get_running_loop()
+            rendered = await loop.run_in_executor(self._executor(), render_variant, original, fmt, width)
+            await self.cache.put(key, rendered)
+            return rendered
+
+        return await self._flights.do(("variant",) + key, render)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+image_variants = ImageVariants()
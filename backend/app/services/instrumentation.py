@@ -0,0 +1,179 @@
+# app/services/instrumentation.py
+
+import contextvars
+from time import perf_counter
+from typing import Dict, List, Optional
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.utils.metrics import registry
+
+# --------------------------------------
+# METRICS
+# --------------------------------------
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "Time to handle an API request (full body for streams).", ("method", "route", "status")
+)
+UPSTREAM_SECONDS = registry.histogram(
+    "upstream_request_duration_seconds", "Time until an upstream provider's response headers.", ("provider", "status")
+)
+UPSTREAM_ERRORS = registry.counter(
+    "upstream_request_errors_total", "Upstream requests that failed without a response.", ("provider", "error")
+)
+UPSTREAM_POOL_WAIT_SECONDS = registry.histogram(
+    "upstream_pool_wait_seconds", "Time an upstream request waited for a pooled connection.", ("provider",)
+)
+DB_QUERY_SECONDS = registry.histogram(
+    "db_query_duration_seconds", "Duration of individual SQL statements.", ("operation",)
+)
+DB_QUERIES_PER_REQUEST = registry.histogram(
+    "db_queries_per_request", "SQL statements issued while handling one API request.", ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+DB_SECONDS_PER_REQUEST = registry.histogram(
+    "db_time_per_request_seconds", "Total SQL time while handling one API request.", ("route",)
+)
+CREDIT_CHECK_SECONDS = registry.histogram(
+    "credit_check_duration_seconds", "Latency of a credit deduction.", ("backend", "outcome")
+)
+
+
+# --------------------------------------
+# PER-REQUEST DB ACCOUNTING
+# --------------------------------------
+# [query count, seconds] for the request being handled; a mutable list so
+# updates from SQLAlchemy's greenlet/thread hooks land in the same object
+_request_db: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar("request_db", default=None)
+
+
+def begin_request_db_stats() -> contextvars.Token:
+    return _request_db.set([0, 0.0])
+
+
+def end_request_db_stats(token: contextvars.Token) -> List[float]:
+    stats = _request_db.get() or [0, 0.0]
+    _request_db.reset(token)
+    return stats
+
+
+def _operation(statement: str) -> str:
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return keyword if keyword in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+
+def instrument_engine(engine: Engine):
+    """Time every statement on ``engine`` (pass ``async_engine.sync_engine`` for async)."""
+    if getattr(engine, "_metrics_instrumented", False):
+        return
+    engine._metrics_instrumented = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = perf_counter() - conn.info["query_started"].pop()
+        DB_QUERY_SECONDS.observe(elapsed, operation=_operation(statement))
+        stats = _request_db.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+
+
+# --------------------------------------
+# UPSTREAM HTTP
+# --------------------------------------
+# First trace events after a connection is available: a new TCP connect or
+# request headers going out on a reused (keep-alive / HTTP/2) connection
+_CONNECTION_READY_EVENTS = ("connect_tcp.started", "send_request_headers.started")
+
+
+def upstream_event_hooks(provider: str) -> Dict[str, list]:
+    """
+    httpx event hooks recording latency per provider/status and, through
+    httpcore's ``trace`` extension, how long each request queued for a
+    connection in the pool.
+    """
+
+    async def on_request(request: httpx.Request):
+        started = perf_counter()
+        request.extensions["metrics_started"] = started
+        waited = []
+        previous_trace = request.extensions.get("trace")
+
+        async def trace(name: str, info: dict):
+            if not waited and name.endswith(_CONNECTION_READY_EVENTS):
+                waited.append(True)
+                UPSTREAM_POOL_WAIT_SECONDS.observe(perf_counter() - started, provider=provider)
+            if name.endswith(".failed") and "exception" in info:
+                UPSTREAM_ERRORS.inc(provider=provider, error=type(info["exception"]).__name__)
+            if previous_trace is not None:
+                result = previous_trace(name, info)
+                if hasattr(result, "__await__"):
+                    await result
+
+        request.extensions["trace"] = trace
+
+    async def on_response(response: httpx.Response):
+        started = response.request.extensions.get("metrics_started")
+        if started is not None:
+            UPSTREAM_SECONDS.observe(perf_counter() - started, provider=provider, status=str(response.status_code))
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+# --------------------------------------
+# SCRAPE-TIME COLLECTORS
+# --------------------------------------
+def _cache_lookups():
+    from app.services.chat_cache import chat_cache
+    from app.services.principal_cache import principal_stats
+
+    for cache, stats in (("chat", chat_cache.stats), ("principal", principal_stats)):
+        yield (cache, "local_hit"), stats["local_hits"]
+        yield (cache, "redis_hit"), stats["redis_hits"]
+        yield (cache, "miss"), stats["misses"]
+
+
+def _cache_hit_ratio():
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), count in _cache_lookups():
+        hits_lookups = totals.setdefault(cache, [0, 0])
+        hits_lookups[1] += count
+        if result != "miss":
+            hits_lookups[0] += count
+    for cache, (hits, lookups) in totals.items():
+        yield (cache,), hits / lookups if lookups else 0.0
+
+
+def _limiter_samples(field: str):
+    from app.services.concurrency_limiter import limiter_snapshot
+
+    for name, snapshot in limiter_snapshot().items():
+        yield (name,), snapshot[field]
+
+
+def _circuit_open():
+    from app.services.circuit_breaker import breaker_snapshot
+
+    for name, snapshot in breaker_snapshot().items():
+        yield (name,), 1 if snapshot["state"] == "open" else 0
+
+
+def _usage_events():
+    from app.services.usage_events import usage_recorder
+
+    for result in ("recorded", "written", "dropped", "rolled_up"):
+        yield (result,), usage_recorder.stats[result]
+
+
+registry.callback("cache_lookups_total", "Cache lookups by tier outcome.", ("cache", "result"), _cache_lookups, kind="counter")
+registry.callback("cache_hit_ratio", "Hits over lookups since process start.", ("cache",), _cache_hit_ratio)
+registry.callback("upstream_concurrency_limit", "Current adaptive concurrency limit.", ("provider",), lambda: _limiter_samples("limit"))
+registry.callback("upstream_in_flight", "Upstream requests currently in flight.", ("provider",), lambda: _limiter_samples("in_flight"))
+registry.callback("upstream_queued", "Requests waiting for a limiter slot.", ("provider",), lambda: _limiter_samples("queued"))
+registry.callback("circuit_open", "1 while a provider's circuit breaker is open.", ("provider",), _circuit_open)
+registry.callback("usage_events_total", "Usage events by pipeline stage.", ("stage",), _usage_events, kind="counter")
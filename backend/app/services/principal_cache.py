@@ -0,0 +1,117 @@
+# app/services/principal_cache.py
+
+import os
+import logging
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+from app.db import models
+from app.db.database import AsyncSessionLocal
+from app.services.cache_service import CacheNamespace
+from app.utils.lru import TTLLRUCache
+
+load_dotenv()
+
+logger = logging.getLogger("principal_cache")
+
+# Local tier is short-lived: other workers only see invalidations through Redis
+PRINCIPAL_CACHE_LOCAL_TTL = int(os.getenv("PRINCIPAL_CACHE_LOCAL_TTL", "30"))
+PRINCIPAL_CACHE_LOCAL_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_LOCAL_MAX_ENTRIES", "4096"))
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "300"))
+
+
+principal_stats = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Compact, immutable snapshot of the authenticated user."""
+
+    id: int
+    email: str
+    is_premium: bool
+    plan_id: Optional[int]
+    premium_expires_at: Optional[datetime]
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            is_premium=bool(user.is_premium),
+            plan_id=user.plan_id,
+            premium_expires_at=user.premium_expires_at,
+        )
+
+    def to_cache(self) -> dict:
+        data = asdict(self)
+        if self.premium_expires_at is not None:
+            data["premium_expires_at"] = self.premium_expires_at.isoformat()
+        return data
+
+    @classmethod
+    def from_cache(cls, data: dict) -> "Principal":
+        expires = data.get("premium_expires_at")
+        return cls(
+            id=data["id"],
+            email=data["email"],
+            is_premium=data["is_premium"],
+            plan_id=data.get("plan_id"),
+            premium_expires_at=datetime.fromisoformat(expires) if expires else None,
+        )
+
+
+_local = TTLLRUCache(max_entries=PRINCIPAL_CACHE_LOCAL_MAX_ENTRIES, ttl=PRINCIPAL_CACHE_LOCAL_TTL)
+_shared = CacheNamespace("principal", ttl=PRINCIPAL_CACHE_TTL)
+
+
+async def _load_from_db(email: str) -> Optional[Principal]:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(models.User).where(models.User.email == email))
+        user = result.scalar_one_or_none()
+    return Principal.from_user(user) if user else None
+
+
+async def get_principal(email: str) -> Optional[Principal]:
+    """Resolve a token subject to a Principal: local LRU → Redis → database."""
+    principal = _local.get(email)
+    if principal is not None:
+        principal_stats["local_hits"] += 1
+        return principal
+
+    try:
+        cached = await _shared.get(email)
+    except Exception as e:
+        logger.warning(f"Principal cache read failed: {e}")
+        cached = None
+
+    if isinstance(cached, dict):
+        principal_stats["redis_hits"] += 1
+        principal = Principal.from_cache(cached)
+        _local.set(email, principal)
+        return principal
+
+    principal_stats["misses"] += 1
+    principal = await _load_from_db(email)
+    if principal is None:
+        return None
+
+    _local.set(email, principal)
+    try:
+        await _shared.set(email, principal.to_cache())
+    except Exception as e:
+        logger.warning(f"Principal cache write failed: {e}")
+    return principal
+
+
+async def invalidate_principal(email: str):
+    """Drop a cached principal after the user's premium/plan state changes."""
+    _local.delete(email)
+    try:
+        await _shared.delete(email)
+    except Exception as e:
+        logger.warning(f"Principal cache invalidation failed: {e}")
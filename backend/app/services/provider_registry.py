@@ -0,0 +1,48 @@
+# app/services/provider_registry.py
+
+import os
+import logging
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+from fastapi import Request
+
+from app.services.ai_providers import AIProvider
+
+load_dotenv()
+
+logger = logging.getLogger("provider_registry")
+
+AI_HTTP_WARMUP = os.getenv("AI_HTTP_WARMUP", "true").lower() == "true"
+
+
+class ProviderRegistry:
+    """
+    Owns the process-wide upstream providers.
+
+    Created once by the app lifespan handler so every route shares the same
+    connection pools, and closed on shutdown so no sockets leak.
+    """
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._transport = transport
+        self.ai_provider: Optional[AIProvider] = None
+
+    async def startup(self):
+        self.ai_provider = AIProvider(transport=self._transport)
+        if AI_HTTP_WARMUP:
+            await self.ai_provider.warm_up()
+
+    async def shutdown(self):
+        if self.ai_provider is not None:
+            await self.ai_provider.close()
+            self.ai_provider = None
+
+
+def get_ai_provider(request: Request) -> AIProvider:
+    """FastAPI dependency returning the shared AIProvider."""
+    registry: ProviderRegistry = request.app.state.providers
+    if registry.ai_provider is None:
+        raise RuntimeError("AIProvider is not initialized (lifespan not started).")
+    return registry.ai_provider
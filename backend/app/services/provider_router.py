@@ -0,0 +1,258 @@
+# app/services/provider_router.py
+
+import os
+import time
+import random
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.services.chat_backends import ChatBackend, Messages
+from app.services.circuit_breaker import CircuitOpenError, ProviderUnavailableError, get_breaker
+
+load_dotenv()
+
+logger = logging.getLogger("provider_router")
+
+CHAT_ROUTER_EWMA_ALPHA = float(os.getenv("CHAT_ROUTER_EWMA_ALPHA", "0.2"))
+CHAT_ROUTER_INITIAL_LATENCY = float(os.getenv("CHAT_ROUTER_INITIAL_LATENCY", "1.0"))  # seconds
+CHAT_ROUTER_MAX_ERROR_RATE = float(os.getenv("CHAT_ROUTER_MAX_ERROR_RATE", "0.5"))
+CHAT_ROUTER_STATS_HALF_LIFE = float(os.getenv("CHAT_ROUTER_STATS_HALF_LIFE", "60"))  # seconds; idle error rates and latencies fade
+CHAT_ROUTER_EXPLORE_RATE = float(os.getenv("CHAT_ROUTER_EXPLORE_RATE", "0.05"))  # share of requests sent to a non-primary backend
+CHAT_HEDGE_ENABLED = os.getenv("CHAT_HEDGE_ENABLED", "false").lower() == "true"
+CHAT_HEDGE_MIN_DELAY = float(os.getenv("CHAT_HEDGE_MIN_DELAY", "0.5"))  # seconds
+CHAT_HEDGE_MIN_SAMPLES = int(os.getenv("CHAT_HEDGE_MIN_SAMPLES", "10"))
+
+
+class AllBackendsFailed(Exception):
+    """Every candidate backend failed for this request."""
+
+
+class BackendStats:
+    """
+    EWMA latency/deviation and error rate for one backend.
+
+    Both also decay with time since the last sample (half-life
+    CHAT_ROUTER_STATS_HALF_LIFE): the error rate towards 0 and the latency
+    towards CHAT_ROUTER_INITIAL_LATENCY, so a backend that stopped getting
+    traffic after a bad spell is eventually ranked on its prior again.
+    """
+
+    def __init__(self, alpha: float = CHAT_ROUTER_EWMA_ALPHA, half_life: float = CHAT_ROUTER_STATS_HALF_LIFE):
+        self.alpha = alpha
+        self.half_life = half_life
+        self._latency = CHAT_ROUTER_INITIAL_LATENCY
+        self.deviation = 0.0
+        self._error_rate = 0.0
+        self.samples = 0
+        self._updated = time.monotonic()
+
+    def _weight(self) -> float:
+        """How much of the recorded state still counts (1 right after a sample)."""
+        if self.half_life <= 0:
+            return 1.0
+        return 0.5 ** ((time.monotonic() - self._updated) / self.half_life)
+
+    @property
+    def latency(self) -> float:
+        weight = self._weight()
+        return CHAT_ROUTER_INITIAL_LATENCY + (self._latency - CHAT_ROUTER_INITIAL_LATENCY) * weight
+
+    @property
+    def error_rate(self) -> float:
+        return self._error_rate * self._weight()
+
+    def _settle(self):
+        # Fold the decay in before applying a new sample
+        self._latency, self._error_rate = self.latency, self.error_rate
+        self._updated = time.monotonic()
+
+    def record_success(self, latency: Optional[float] = None):
+        """A successful call; ``latency`` is None when it isn't comparable (streams)."""
+        self._settle()
+        if latency is not None:
+            if self.samples == 0:
+                self._latency = latency
+            else:
+                self.deviation += self.alpha * (abs(latency - self._latency) - self.deviation)
+                self._latency += self.alpha * (latency - self._latency)
+            self.samples += 1
+        self._error_rate -= self.alpha * self._error_rate
+
+    def record_failure(self):
+        self._settle()
+        self._error_rate += self.alpha * (1.0 - self._error_rate)
+
+    @property
+    def p95(self) -> float:
+        # Mean + 2 mean-absolute-deviations ≈ p95 for roughly normal latencies
+        return self.latency + 2 * self.deviation
+
+    def as_dict(self) -> dict:
+        return {
+            "ewma_latency_ms": round(self.latency * 1000, 1),
+            "p95_estimate_ms": round(self.p95 * 1000, 1),
+            "error_rate": round(self.error_rate, 4),
+            "samples": self.samples,
+        }
+
+
+class ProviderRouter:
+    """
+    Send each chat request to the fastest healthy backend, failing over to
+    the next one on error. With hedging on, a second backend is started when
+    the first hasn't answered by its estimated p95; the first answer wins.
+    """
+
+    def __init__(self, backends: List[ChatBackend], hedge_enabled: bool = CHAT_HEDGE_ENABLED):
+        if not backends:
+            raise ValueError("ProviderRouter needs at least one backend")
+        self.backends = backends
+        self.hedge_enabled = hedge_enabled
+        self.stats: Dict[str, BackendStats] = {b.name: BackendStats() for b in backends}
+        self.breakers = {b.name: get_breaker(b.name) for b in backends}
+
+    def ranked(self, explore_rate: float = CHAT_ROUTER_EXPLORE_RATE) -> List[ChatBackend]:
+        """
+        Healthy backends by EWMA latency, then unhealthy ones (still worth a
+        try), then open circuits (which fail fast without a network call).
+
+        With probability ``explore_rate`` another backend whose circuit is
+        closed goes first, so the stats of backends that lost the ranking
+        keep getting fresh samples.
+        """
+        order = {b.name: i for i, b in enumerate(self.backends)}
+
+        def sort_key(backend: ChatBackend):
+            stats = self.stats[backend.name]
+            unhealthy = stats.error_rate >= CHAT_ROUTER_MAX_ERROR_RATE
+            return (self.breakers[backend.name].is_open, unhealthy, stats.latency, order[backend.name])
+
+        ranked = sorted(self.backends, key=sort_key)
+        others = [b for b in ranked[1:] if not self.breakers[b.name].is_open]
+        if others and random.random() < explore_rate:
+            probe = random.choice(others)
+            ranked.remove(probe)
+            ranked.insert(0, probe)
+        return ranked
+
+    def _hedge_delay(self, backend: ChatBackend):
+        stats = self.stats[backend.name]
+        if not self.hedge_enabled or stats.samples < CHAT_HEDGE_MIN_SAMPLES:
+            return None
+        return max(CHAT_HEDGE_MIN_DELAY, stats.p95)
+
+    async def _timed_complete(self, backend: ChatBackend, messages: Messages) -> str:
+        started = time.perf_counter()
+        try:
+            async with self.breakers[backend.name].guard():
+                content = await backend.complete(messages)
+        except (asyncio.CancelledError, ProviderUnavailableError):
+            raise  # lost a hedge race / shed / throttled; not a latency sample
+        except Exception:
+            self.stats[backend.name].record_failure()
+            raise
+        self.stats[backend.name].record_success(time.perf_counter() - started)
+        return content
+
+    async def complete(self, messages: Messages) -> Tuple[ChatBackend, str]:
+        candidates = self.ranked()
+        pending: Dict[asyncio.Task, ChatBackend] = {}
+        errors, unavailable = [], []
+        hedged = False
+
+        def launch():
+            backend = candidates.pop(0)
+            pending[asyncio.create_task(self._timed_complete(backend, messages))] = backend
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if not hedged and candidates and len(pending) == 1:
+                    timeout = self._hedge_delay(next(iter(pending.values())))
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    logger.info("Primary backend past its p95, sending hedged request.")
+                    launch()
+                    continue
+
+                winner = None
+                for task in done:
+                    backend = pending.pop(task)
+                    if task.exception() is None:
+                        winner = winner or (backend, task.result())
+                    elif isinstance(task.exception(), ProviderUnavailableError):
+                        unavailable.append(task.exception())
+                        logger.warning(f"Chat backend {backend.name} unavailable: {task.exception()}")
+                    else:
+                        errors.append(f"{backend.name}: {task.exception()}")
+                        logger.warning(f"Chat backend {backend.name} failed: {task.exception()}")
+                if winner:
+                    return winner
+
+                # Fail over when nothing else is still running
+                if not pending and candidates:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        self._raise_all_failed(errors, unavailable)
+
+    @staticmethod
+    def _raise_all_failed(errors: List[str], unavailable: List[ProviderUnavailableError]):
+        # Every backend was short-circuited, shed or throttled: a retryable 503
+        if unavailable and not errors:
+            raise ProviderUnavailableError("chat", min(e.retry_after for e in unavailable))
+        raise AllBackendsFailed("; ".join(errors))
+
+    async def stream(self, messages: Messages) -> AsyncIterator[Tuple[ChatBackend, str]]:
+        """
+        Stream from the best backend. Fails over only before the first delta;
+        once text has reached the client, switching providers would garble it.
+        """
+        errors, unavailable = [], []
+        for backend in self.ranked():
+            first = True
+            deltas = backend.stream(messages)
+            try:
+                async with self.breakers[backend.name].guard():
+                    async for delta in deltas:
+                        first = False
+                        yield backend, delta
+                # Generation length dominates a stream's duration; keep it
+                # out of the latency EWMA that ranks completions
+                self.stats[backend.name].record_success()
+                return
+            except ProviderUnavailableError as e:
+                if not first:
+                    raise
+                unavailable.append(e)
+                logger.warning(f"Chat backend {backend.name} unavailable: {e}")
+            except Exception as e:
+                self.stats[backend.name].record_failure()
+                if not first:
+                    raise
+                errors.append(f"{backend.name}: {e}")
+                logger.warning(f"Chat backend {backend.name} failed to stream: {e}")
+            finally:
+                await deltas.aclose()
+
+        self._raise_all_failed(errors, unavailable)
+
+    def check_available(self):
+        """Raise CircuitOpenError up front if no backend would accept a call."""
+        breakers = self.breakers.values()
+        if all(breaker.is_open for breaker in breakers):
+            raise CircuitOpenError("chat", min(breaker.retry_after() for breaker in breakers))
+
+    def snapshot(self) -> dict:
+        return {
+            name: {**stats.as_dict(), "circuit": self.breakers[name].snapshot()}
+            for name, stats in self.stats.items()
+        }
@@ -0,0 +1,259 @@
+# app/services/rate_limiter.py
+
+import os
+import math
+import time
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request
+from redis.exceptions import RedisError
+
+from app.db import models
+from app.db.database import AsyncSessionLocal
+from app.db.redis_cache import async_redis_client
+from app.utils.lru import TTLLRUCache
+
+load_dotenv()
+
+logger = logging.getLogger("rate_limiter")
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW", "60"))  # seconds the rate is expressed over
+# Defaults per scope when the user's CreditPlan leaves the columns NULL
+RATE_LIMIT_DEFAULTS = {
+    "chat": (int(os.getenv("RATE_LIMIT_CHAT", "20")), int(os.getenv("RATE_LIMIT_CHAT_BURST", "10"))),
+    "image": (int(os.getenv("RATE_LIMIT_IMAGE", "5")), int(os.getenv("RATE_LIMIT_IMAGE_BURST", "3"))),
+}
+RATE_LIMIT_PREMIUM_DEFAULTS = {
+    "chat": (int(os.getenv("RATE_LIMIT_PREMIUM_CHAT", "120")), int(os.getenv("RATE_LIMIT_PREMIUM_CHAT_BURST", "30"))),
+    "image": (int(os.getenv("RATE_LIMIT_PREMIUM_IMAGE", "30")), int(os.getenv("RATE_LIMIT_PREMIUM_IMAGE_BURST", "10"))),
+}
+RATE_LIMIT_LEASE_MAX = int(os.getenv("RATE_LIMIT_LEASE_MAX", "8"))  # extra tokens a process may hold
+RATE_LIMIT_LEASE_TTL = float(os.getenv("RATE_LIMIT_LEASE_TTL", "1.0"))  # seconds leased tokens stay usable
+RATE_LIMIT_PLAN_CACHE_TTL = float(os.getenv("RATE_LIMIT_PLAN_CACHE_TTL", "60"))
+
+KEY = "ratelimit:{}:{}"
+
+# GCRA with leasing: grant between ARGV[3] (need) and ARGV[4] (want) tokens
+# in one step, or none. Uses the Redis clock so every API process agrees.
+#
+# KEYS[1] theoretical arrival time (ms)
+# ARGV: emission interval ms, burst, need, want
+# Returns {granted, remaining, retry_after_ms, reset_ms}
+GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local interval = tonumber(ARGV[1])
+local tau = interval * tonumber(ARGV[2])
+local need = tonumber(ARGV[3])
+local want = tonumber(ARGV[4])
+
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then tat = now end
+
+local available = math.floor((now + tau - tat) / interval)
+if available < need then
+    return {0, math.max(available, 0), tat - tau + need * interval - now, tat - now}
+end
+
+local granted = math.min(want, available)
+tat = tat + granted * interval
+redis.call('SET', KEYS[1], tat, 'PX', tat - now)
+return {granted, available - granted, 0, tat - now}
+"""
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    rate: int  # requests per RATE_LIMIT_WINDOW
+    burst: int
+
+    @property
+    def interval_ms(self) -> int:
+        return max(1, math.ceil(RATE_LIMIT_WINDOW * 1000 / self.rate))
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    limit: RateLimit
+    remaining: int
+    reset: float  # seconds until the bucket is full again
+    retry_after: float = 0.0
+
+    def headers(self) -> Dict[str, str]:
+        """IETF RateLimit header fields (draft-ietf-httpapi-ratelimit-headers)."""
+        headers = {
+            "RateLimit-Limit": str(self.limit.burst),
+            "RateLimit-Remaining": str(max(0, self.remaining)),
+            "RateLimit-Reset": str(max(0, math.ceil(self.reset))),
+            "RateLimit-Policy": f"{self.limit.rate};w={RATE_LIMIT_WINDOW};burst={self.limit.burst}",
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def gcra(tat: float, now: float, limit: RateLimit, need: int, want: int) -> Tuple[int, int, float, float, float]:
+    """In-process mirror of GCRA_SCRIPT (ms): (granted, remaining, retry_after, reset, new_tat)."""
+    interval = limit.interval_ms
+    tau = interval * limit.burst
+    tat = max(tat, now)
+    available = math.floor((now + tau - tat) / interval)
+    if available < need:
+        return 0, max(available, 0), tat - tau + need * interval - now, tat - now, tat
+    granted = min(want, available)
+    tat += granted * interval
+    return granted, available - granted, 0.0, tat - now, tat
+
+
+class _Lease:
+    __slots__ = ("tokens", "expires_at", "remaining", "reset_at", "extra")
+
+    def __init__(self):
+        self.tokens = 0
+        self.expires_at = 0.0
+        self.remaining = 0
+        self.reset_at = 0.0
+        self.extra = 0  # how many spare tokens to ask for next time
+
+
+class RateLimiter:
+    """
+    Per-user GCRA limits shared through Redis, with a local lease fast path.
+
+    When a user is sending steadily, a process asks Redis for a few spare
+    tokens along with the one it needs and spends them locally for up to
+    ``RATE_LIMIT_LEASE_TTL``, so most checks never leave the process. The
+    lease size doubles while leases get used up and drops back to zero when
+    they expire unused, so idle users never hold tokens another process
+    could have spent. If Redis is unreachable, limits are enforced per
+    process instead.
+    """
+
+    def __init__(self, redis=async_redis_client):
+        self.redis = redis
+        self._script = redis.register_script(GCRA_SCRIPT)
+        self._leases = TTLLRUCache(max_entries=10000, ttl=RATE_LIMIT_WINDOW)
+        self._fallback = TTLLRUCache(max_entries=10000, ttl=RATE_LIMIT_WINDOW)
+        self._plans = TTLLRUCache(max_entries=64, ttl=RATE_LIMIT_PLAN_CACHE_TTL)
+        self.stats = {"local": 0, "remote": 0, "fallback": 0, "limited": 0}
+
+    # ----------------------------------
+    # Plan limits
+    # ----------------------------------
+    async def _plan(self, plan_id: Optional[int]) -> Optional[dict]:
+        if plan_id is None:
+            return None
+        plan = self._plans.get(plan_id)
+        if plan is not None:
+            return plan
+        try:
+            async with AsyncSessionLocal() as db:
+                row = await db.get(models.CreditPlan, plan_id)
+        except Exception as e:
+            logger.warning(f"Plan lookup failed, using default limits: {e}")
+            return None
+        plan = {} if row is None else {
+            "chat": (row.chat_rate_limit, row.chat_burst),
+            "image": (row.image_rate_limit, row.image_burst),
+        }
+        self._plans.set(plan_id, plan)
+        return plan
+
+    async def limit_for(self, user, scope: str) -> RateLimit:
+        defaults = RATE_LIMIT_PREMIUM_DEFAULTS if user.is_premium else RATE_LIMIT_DEFAULTS
+        rate, burst = defaults[scope]
+        plan = await self._plan(user.plan_id)
+        if plan and scope in plan:
+            plan_rate, plan_burst = plan[scope]
+            rate = plan_rate or rate
+            burst = plan_burst or burst
+        return RateLimit(rate=rate, burst=max(1, burst))
+
+    # ----------------------------------
+    # Checks
+    # ----------------------------------
+    def _local_check(self, lease: _Lease, limit: RateLimit, cost: int, now: float) -> Optional[Decision]:
+        if lease.expires_at <= now:
+            if lease.tokens > 0:
+                lease.extra = 0  # leased tokens went unused: stop leasing
+            lease.tokens = 0
+            return None
+        if lease.tokens < cost:
+            return None
+        lease.tokens -= cost
+        self.stats["local"] += 1
+        return Decision(True, limit, lease.remaining + lease.tokens, lease.reset_at - now)
+
+    async def check(self, user, scope: str, cost: int = 1) -> Decision:
+        limit = await self.limit_for(user, scope)
+        cost = min(cost, limit.burst)
+        key = KEY.format(scope, user.id)
+        now = time.monotonic()
+
+        lease = self._leases.get(key)
+        if lease is None:
+            lease = _Lease()
+            self._leases.set(key, lease)
+        decision = self._local_check(lease, limit, cost, now)
+        if decision is not None:
+            return decision
+
+        # A lease spent before it expired means the user is hot: ask for more
+        if lease.expires_at > now:
+            lease.extra = min(max(1, lease.extra * 2), RATE_LIMIT_LEASE_MAX, limit.burst // 4)
+        need = cost - lease.tokens
+        want = need + lease.extra
+
+        try:
+            granted, remaining, retry_ms, reset_ms = await self._script(
+                keys=[key], args=[limit.interval_ms, limit.burst, need, want]
+            )
+            self.stats["remote"] += 1
+        except RedisError as e:
+            logger.warning(f"Rate limiter Redis unavailable, enforcing per process: {e}")
+            tat = self._fallback.get(key) or 0.0
+            granted, remaining, retry_ms, reset_ms, tat = gcra(tat, now * 1000, limit, need, need)
+            self._fallback.set(key, tat)
+            self.stats["fallback"] += 1
+
+        if not granted:
+            self.stats["limited"] += 1
+            return Decision(False, limit, remaining, reset_ms / 1000, retry_ms / 1000)
+
+        lease.tokens += granted - cost
+        lease.expires_at = now + RATE_LIMIT_LEASE_TTL
+        lease.remaining = remaining
+        lease.reset_at = now + reset_ms / 1000
+        return Decision(True, limit, remaining + lease.tokens, reset_ms / 1000)
+
+
+rate_limiter = RateLimiter()
+
+
+async def enforce_rate_limit(request: Request, scope: str, cost: int = 1) -> Decision:
+    """
+    Charge ``cost`` requests against the caller's ``scope`` limit. The
+    decision is left on request.state for RateLimitHeadersMiddleware.
+    """
+    user = getattr(request.state, "user", None)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    decision = await rate_limiter.check(user, scope, cost)
+    request.state.rate_limit = decision
+    if not decision.allowed:
+        raise HTTPException(status_code=429, detail=f"Rate limit exceeded for {scope}", headers=decision.headers())
+    return decision
+
+
+def rate_limit(scope: str):
+    """FastAPI dependency factory: ``Depends(rate_limit("chat"))``."""
+    async def dependency(request: Request):
+        if RATE_LIMIT_ENABLED:
+            await enforce_rate_limit(request, scope)
+    return dependency
@@ -0,0 +1,54 @@
+# app/services/single_flight.py
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one in-flight task.
+
+    Every caller awaits the shared task through ``asyncio.shield``, so one
+    caller being cancelled (e.g. its client disconnected) doesn't cancel the
+    work for the others. The shared task is only cancelled once the last
+    waiter has gone away.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self.stats = {"leaders": 0, "followers": 0}
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task, key=key, call=call: self._forget(key, call))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["followers"] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Nobody is waiting any more — stop the upstream work
+                call.task.cancel()
+                self._forget(key, call)
+
+    def in_flight(self) -> int:
+        return len(self._calls)
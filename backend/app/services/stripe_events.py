@@ -0,0 +1,220 @@
+# app/services/stripe_events.py
+
+import os
+import json
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.db import models
+from app.db.database import AsyncSessionLocal
+from app.services.principal_cache import invalidate_principal
+
+load_dotenv()
+
+logger = logging.getLogger("stripe_events")
+
+STRIPE_SDK_WORKERS = int(os.getenv("STRIPE_SDK_WORKERS", "4"))
+STRIPE_EVENT_BATCH_SIZE = int(os.getenv("STRIPE_EVENT_BATCH_SIZE", "100"))
+STRIPE_EVENT_POLL_INTERVAL = float(os.getenv("STRIPE_EVENT_POLL_INTERVAL", "5.0"))  # seconds; catches other workers' events
+STRIPE_EVENT_MAX_ATTEMPTS = int(os.getenv("STRIPE_EVENT_MAX_ATTEMPTS", "5"))
+PREMIUM_PERIOD = timedelta(days=30)
+
+PENDING = "pending"
+PROCESSED = "processed"
+IGNORED = "ignored"
+FAILED = "failed"
+
+HANDLED_TYPES = ("checkout.session.completed", "invoice.payment_succeeded")
+
+# The Stripe SDK is blocking (requests under the hood); keep it off the event
+# loop and off the default executor other to_thread() callers share.
+_stripe_executor = ThreadPoolExecutor(max_workers=STRIPE_SDK_WORKERS, thread_name_prefix="stripe")
+
+
+async def run_stripe(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking Stripe SDK call on the Stripe thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_stripe_executor, partial(fn, *args, **kwargs))
+
+
+async def record_event(event_id: str, event_type: str, payload: str) -> bool:
+    """Store a verified webhook event; False if Stripe already delivered it."""
+    async with AsyncSessionLocal() as db:
+        db.add(models.StripeEvent(id=event_id, type=event_type, payload=payload, status=PENDING, attempts=0))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return False
+    return True
+
+
+def _premium_until(event: Dict[str, Any]) -> Optional[datetime]:
+    """
+    New premium expiry implied by an event, or None if it only grants
+    premium. Based on the event's own timestamp so a delayed or replayed
+    event lands on the same expiry.
+    """
+    created = datetime.fromtimestamp(event.get("created") or time.time(), tz=timezone.utc)
+    obj = event["data"]["object"]
+    if event["type"] == "checkout.session.completed":
+        return created + PREMIUM_PERIOD if obj.get("subscription") else None
+    return created + PREMIUM_PERIOD  # invoice.payment_succeeded (renewal)
+
+
+class StripeEventProcessor:
+    """
+    Applies queued webhook events in batches, off the request path.
+
+    The ``stripe_events`` table is the queue: the webhook inserts and acks,
+    then wakes this consumer. Each cycle claims up to a batch of pending rows
+    (``SKIP LOCKED`` where supported, so several API workers can consume),
+    folds them per customer, loads all affected users in one query and
+    commits the premium changes together with the event statuses.
+    """
+
+    def __init__(self):
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self):
+        self._wake.set()
+
+    async def process_batch(self, limit: int = STRIPE_EVENT_BATCH_SIZE) -> int:
+        """Apply one batch of pending events; returns how many were claimed."""
+        emails: List[str] = []
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(models.StripeEvent)
+                .where(models.StripeEvent.status == PENDING)
+                .order_by(models.StripeEvent.received_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            rows = result.scalars().all()
+            if not rows:
+                return 0
+
+            # customer_id → latest premium expiry (None: grant premium, keep expiry)
+            changes: Dict[str, Optional[datetime]] = {}
+            for row in rows:
+                row.attempts += 1
+                if row.type not in HANDLED_TYPES:
+                    row.status = IGNORED
+                    continue
+                event = json.loads(row.payload)
+                customer_id = event["data"]["object"].get("customer")
+                if not customer_id:
+                    row.status = IGNORED
+                    continue
+                until = _premium_until(event)
+                current = changes.get(customer_id)
+                changes[customer_id] = max(filter(None, (current, until)), default=None)
+
+            if changes:
+                users = await db.execute(
+                    select(models.User).where(models.User.stripe_customer_id.in_(list(changes)))
+                )
+                for user in users.scalars():
+                    until = changes[user.stripe_customer_id]
+                    user.is_premium = True
+                    if until is not None:
+                        expires = user.premium_expires_at
+                        if expires is not None and expires.tzinfo is None:
+                            expires = expires.replace(tzinfo=timezone.utc)  # SQLite drops the offset
+                        if expires is None or until > expires:
+                            user.premium_expires_at = until
+                    emails.append(user.email)
+
+            now = datetime.now(timezone.utc)
+            for row in rows:
+                if row.status == PENDING:
+                    row.status = PROCESSED
+                row.processed_at = now
+            await db.commit()
+
+        for email in emails:
+            await invalidate_principal(email)
+        return len(rows)
+
+    async def _record_failure(self, error: Exception, limit: int):
+        """Count a failed attempt against the oldest pending events; park repeat offenders."""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(models.StripeEvent.id)
+                .where(models.StripeEvent.status == PENDING)
+                .order_by(models.StripeEvent.received_at)
+                .limit(limit)
+            )
+            ids = result.scalars().all()
+            if not ids:
+                return
+            events = models.StripeEvent.__table__
+            await db.execute(
+                update(events).where(events.c.id.in_(ids)).values(attempts=events.c.attempts + 1, error=str(error))
+            )
+            await db.execute(
+                update(events)
+                .where(events.c.id.in_(ids), events.c.attempts >= STRIPE_EVENT_MAX_ATTEMPTS)
+                .values(status=FAILED)
+            )
+            await db.commit()
+
+    async def drain(self):
+        while await self.process_batch() >= STRIPE_EVENT_BATCH_SIZE:
+            pass
+
+    async def _isolate(self):
+        """
+        After a failed batch, go one event at a time so a single bad event
+        only delays (and is eventually parked as failed) instead of the batch.
+        """
+        for _ in range(STRIPE_EVENT_BATCH_SIZE):
+            try:
+                if not await self.process_batch(limit=1):
+                    return
+            except Exception as e:
+                logger.error(f"Stripe event failed: {e}")
+                await self._record_failure(e, limit=1)
+                return
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), STRIPE_EVENT_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.drain()
+            except Exception as e:
+                logger.error(f"Stripe event batch failed, retrying one by one: {e}")
+                try:
+                    await self._isolate()
+                except Exception as inner:
+                    logger.error(f"Could not record Stripe event failure: {inner}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+stripe_event_processor = StripeEventProcessor()
@@ -0,0 +1,318 @@
+# app/services/usage_events.py
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import func, insert, select
+
+from app.db import models
+from app.db.database import AsyncSessionLocal
+from app.services.chat_sessions import estimate_tokens
+
+load_dotenv()
+
+logger = logging.getLogger("usage_events")
+
+USAGE_EVENTS_ENABLED = os.getenv("USAGE_EVENTS_ENABLED", "true").lower() == "true"
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "2.0"))  # seconds
+USAGE_FLUSH_BATCH_SIZE = int(os.getenv("USAGE_FLUSH_BATCH_SIZE", "1000"))  # rows per INSERT; a full batch flushes early
+USAGE_BUFFER_MAX = int(os.getenv("USAGE_BUFFER_MAX", "50000"))  # oldest events are dropped beyond this while the DB is down
+USAGE_ROLLUP_INTERVAL = float(os.getenv("USAGE_ROLLUP_INTERVAL", "60"))  # seconds
+USAGE_ROLLUP_BATCH_SIZE = int(os.getenv("USAGE_ROLLUP_BATCH_SIZE", "20000"))  # events aggregated per transaction
+USAGE_UPSERT_CHUNK_SIZE = 1000  # rollup rows per statement, well under driver bind-parameter limits
+
+ROLLUP_NAME = "usage"
+ADDITIVE_COLUMNS = ("events", "errors", "cached", "prompt_tokens", "completion_tokens", "latency_ms_sum")
+
+
+def _utc(value: datetime) -> datetime:
+    # SQLite hands timestamps back naive; everything here is UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def hour_bucket(value: datetime) -> datetime:
+    return _utc(value).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(value: datetime) -> datetime:
+    return _utc(value).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def usage_status(result: Dict[str, Any]) -> str:
+    """Event status for a chat result dict."""
+    if "error" in result:
+        return "error"
+    return "cached" if result.get("cached") else "ok"
+
+
+def _upsert(dialect: str, model, rows: List[Dict[str, Any]]):
+    """Multi-row INSERT that adds onto existing buckets (Postgres and SQLite)."""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        greatest = func.greatest
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        greatest = func.max  # scalar max(a, b) in SQLite
+    else:
+        raise Exception(f"Usage rollups are not supported on {dialect}.")
+
+    table = model.__table__
+    stmt = dialect_insert(table).values(rows)
+    updates = {column: table.c[column] + stmt.excluded[column] for column in ADDITIVE_COLUMNS}
+    updates["latency_ms_max"] = greatest(table.c.latency_ms_max, stmt.excluded.latency_ms_max)
+    return stmt.on_conflict_do_update(index_elements=[c.name for c in table.primary_key.columns], set_=updates)
+
+
+class UsageRecorder:
+    """
+    Buffers usage events in memory and writes them with batched multi-row
+    INSERTs, by size or every USAGE_FLUSH_INTERVAL, so AI requests never wait
+    on the database. A second loop folds new events into the hourly and
+    daily rollup tables the usage endpoint reads from.
+    """
+
+    def __init__(self, enabled: bool = USAGE_EVENTS_ENABLED):
+        self.enabled = enabled
+        self._buffer: Deque[Dict[str, Any]] = deque()
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._tasks: List[asyncio.Task] = []
+        self._rollup_backlog = False
+        self.stats = {"recorded": 0, "written": 0, "dropped": 0, "flush_errors": 0, "rolled_up": 0}
+
+    # ----------------------------------
+    # Recording
+    # ----------------------------------
+    def record(
+        self,
+        user_id: int,
+        event_type: str,
+        started: float,
+        provider: Optional[str] = None,
+        prompt: str = "",
+        response: str = "",
+        status: str = "ok",
+    ):
+        """Queue one event; ``started`` is the call's ``time.perf_counter()`` start."""
+        if not self.enabled:
+            return
+        if len(self._buffer) >= USAGE_BUFFER_MAX:
+            self._buffer.popleft()
+            self.stats["dropped"] += 1
+        self._buffer.append({
+            "user_id": user_id,
+            "event_type": event_type,
+            "provider": provider or "",
+            "status": status,
+            "latency_ms": int((time.perf_counter() - started) * 1000),
+            "prompt_tokens": estimate_tokens(prompt) if prompt else 0,
+            "completion_tokens": estimate_tokens(response) if response else 0,
+            "created_at": datetime.now(timezone.utc),
+        })
+        self.stats["recorded"] += 1
+        if len(self._buffer) >= USAGE_FLUSH_BATCH_SIZE:
+            self._full.set()
+
+    async def flush(self) -> int:
+        """Write everything buffered so far; returns rows written."""
+        async with self._flush_lock:
+            written = 0
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(USAGE_FLUSH_BATCH_SIZE, len(self._buffer)))]
+                try:
+                    async with AsyncSessionLocal() as db:
+                        await db.execute(insert(models.UsageEvent.__table__), batch)
+                        await db.commit()
+                except Exception:
+                    # Back to the front for the next cycle (room permitting)
+                    room = max(USAGE_BUFFER_MAX - len(self._buffer), 0)
+                    self.stats["dropped"] += len(batch) - min(room, len(batch))
+                    self._buffer.extendleft(reversed(batch[:room]))
+                    raise
+                written += len(batch)
+                self.stats["written"] += len(batch)
+            return written
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), USAGE_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                self.stats["flush_errors"] += 1
+                logger.error(f"Usage event flush failed: {e}")
+                await asyncio.sleep(USAGE_FLUSH_INTERVAL)
+
+    # ----------------------------------
+    # Rollups
+    # ----------------------------------
+    async def rollup(self) -> int:
+        """
+        Aggregate events past the watermark into usage_hourly/usage_daily in
+        the same transaction that advances it; returns events rolled up.
+
+        Ids are drawn at insert time but become visible at commit, so a run
+        only goes up to the highest id the *previous* run saw: every insert
+        that drew a lower id has committed by then. The state row is locked
+        so workers running this concurrently take turns.
+        """
+        async with AsyncSessionLocal() as db:
+            state = (await db.execute(
+                select(models.UsageRollupState).where(models.UsageRollupState.name == ROLLUP_NAME).with_for_update()
+            )).scalar_one_or_none()
+            if state is None:
+                state = models.UsageRollupState(name=ROLLUP_NAME, last_event_id=0, pending_event_id=0)
+                db.add(state)
+
+            upper = min(state.pending_event_id, state.last_event_id + USAGE_ROLLUP_BATCH_SIZE)
+            events = []
+            if upper > state.last_event_id:
+                events = (await db.execute(
+                    select(
+                        models.UsageEvent.user_id,
+                        models.UsageEvent.event_type,
+                        models.UsageEvent.provider,
+                        models.UsageEvent.status,
+                        models.UsageEvent.latency_ms,
+                        models.UsageEvent.prompt_tokens,
+                        models.UsageEvent.completion_tokens,
+                        models.UsageEvent.created_at,
+                    )
+                    .where(models.UsageEvent.id > state.last_event_id, models.UsageEvent.id <= upper)
+                )).all()
+
+            if events:
+                dialect = db.bind.dialect.name
+                for model, bucket in ((models.UsageHourly, hour_bucket), (models.UsageDaily, day_bucket)):
+                    rows = list(self._aggregate(events, bucket).values())
+                    for i in range(0, len(rows), USAGE_UPSERT_CHUNK_SIZE):
+                        await db.execute(_upsert(dialect, model, rows[i:i + USAGE_UPSERT_CHUNK_SIZE]))
+                state.last_event_id = upper
+
+            backlog = upper < state.pending_event_id
+            if not backlog:
+                latest = (await db.execute(select(func.max(models.UsageEvent.id)))).scalar()
+                state.pending_event_id = max(latest or 0, state.last_event_id)
+            state.updated_at = datetime.now(timezone.utc)
+            await db.commit()
+
+        self._rollup_backlog = backlog
+        self.stats["rolled_up"] += len(events)
+        return len(events)
+
+    @staticmethod
+    def _aggregate(events, bucket) -> Dict[Tuple, Dict[str, Any]]:
+        groups: Dict[Tuple, Dict[str, Any]] = {}
+        for event in events:
+            start = bucket(event.created_at)
+            key = (event.user_id, start, event.event_type, event.provider)
+            row = groups.get(key)
+            if row is None:
+                row = groups[key] = {
+                    "user_id": event.user_id,
+                    "bucket_start": start,
+                    "event_type": event.event_type,
+                    "provider": event.provider,
+                    **{column: 0 for column in ADDITIVE_COLUMNS},
+                    "latency_ms_max": 0,
+                }
+            row["events"] += 1
+            row["errors"] += event.status == "error"
+            row["cached"] += event.status == "cached"
+            row["prompt_tokens"] += event.prompt_tokens
+            row["completion_tokens"] += event.completion_tokens
+            row["latency_ms_sum"] += event.latency_ms
+            row["latency_ms_max"] = max(row["latency_ms_max"], event.latency_ms)
+        return groups
+
+    async def _rollup_loop(self):
+        while True:
+            await asyncio.sleep(USAGE_ROLLUP_INTERVAL)
+            try:
+                # Work through a backlog (batch-capped runs) without waiting,
+                # but never past the ids the previous refresh saw
+                while await self.rollup() and self._rollup_backlog:
+                    pass
+            except Exception as e:
+                logger.error(f"Usage rollup failed: {e}")
+
+    # ----------------------------------
+    # Reading
+    # ----------------------------------
+    async def usage(self, user_id: int, granularity: str, since: datetime, until: datetime) -> Dict[str, Any]:
+        model = models.UsageHourly if granularity == "hour" else models.UsageDaily
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(model)
+                .where(model.user_id == user_id, model.bucket_start >= since, model.bucket_start < until)
+                .order_by(model.bucket_start, model.event_type, model.provider)
+            )).scalars().all()
+            as_of = (await db.execute(
+                select(models.UsageRollupState.updated_at).where(models.UsageRollupState.name == ROLLUP_NAME)
+            )).scalar()
+
+        totals = {column: 0 for column in ("events", "errors", "cached", "prompt_tokens", "completion_tokens")}
+        buckets = []
+        for row in rows:
+            for column in totals:
+                totals[column] += getattr(row, column)
+            buckets.append({
+                "start": _utc(row.bucket_start),
+                "event_type": row.event_type,
+                "provider": row.provider or None,
+                "events": row.events,
+                "errors": row.errors,
+                "cached": row.cached,
+                "prompt_tokens": row.prompt_tokens,
+                "completion_tokens": row.completion_tokens,
+                "avg_latency_ms": round(row.latency_ms_sum / row.events, 1) if row.events else 0.0,
+                "max_latency_ms": row.latency_ms_max,
+            })
+
+        return {
+            "user_id": user_id,
+            "granularity": granularity,
+            "since": since,
+            "until": until,
+            "as_of": _utc(as_of) if as_of else None,
+            "totals": totals,
+            "buckets": buckets,
+        }
+
+    # ----------------------------------
+    # Lifecycle
+    # ----------------------------------
+    def start(self):
+        if self.enabled and not self._tasks:
+            self._tasks = [asyncio.create_task(self._flush_loop()), asyncio.create_task(self._rollup_loop())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Final usage event flush failed: {e}")
+
+
+usage_recorder = UsageRecorder()
+
+
+def default_window(granularity: str) -> Tuple[datetime, datetime]:
+    """Last 48 hours by the hour, or the last 30 days by the day."""
+    now = datetime.now(timezone.utc)
+    if granularity == "hour":
+        return hour_bucket(now) - timedelta(hours=47), hour_bucket(now) + timedelta(hours=1)
+    return day_bucket(now) - timedelta(days=29), day_bucket(now) + timedelta(days=1)
@@ -0,0 +1,7 @@
+import json
+
+
+def sse_event(data: dict, event: str = None) -> str:
+    """Format a single Server-Sent Event frame."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data, default=str)}\n\n"
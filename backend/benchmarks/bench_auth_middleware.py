@@ -0,0 +1,126 @@
+"""
+Microbenchmark: BaseHTTPMiddleware auth vs the pure-ASGI AuthMiddleware.
+
+Runs entirely in-process (httpx ASGITransport, no sockets) with the principal
+lookup stubbed out, so the numbers isolate middleware overhead on top of
+routing. Usage (from backend/):
+
+    python -m benchmarks.bench_auth_middleware --requests 5000 --concurrency 50
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+from jose import jwt, JWTError
+
+from app.middleware import auth_middleware
+from app.middleware.auth_middleware import AuthMiddleware, SECRET_KEY, ALGORITHM
+from app.services.principal_cache import Principal
+
+PRINCIPAL = Principal(id=1, email="bench@example.com", is_premium=False, plan_id=1, premium_expires_at=None)
+
+
+async def _stub_get_principal(email: str):
+    return PRINCIPAL if email == PRINCIPAL.email else None
+
+
+# Route the middleware's lookup to the stub so no DB/Redis is involved
+auth_middleware.get_principal = _stub_get_principal
+
+
+class LegacyAuthMiddleware(BaseHTTPMiddleware):
+    """The previous BaseHTTPMiddleware implementation, kept for comparison."""
+
+    async def dispatch(self, request: Request, call_next):
+        path = request.url.path
+        if path.startswith("/auth"):
+            return await call_next(request)
+
+        if path.startswith(("/api", "/users", "/credits", "/payments")):
+            auth_header = request.headers.get("Authorization")
+            if not auth_header or not auth_header.startswith("Bearer "):
+                return JSONResponse({"detail": "Missing authorization token"}, status_code=401)
+            token = auth_header.split(" ")[1]
+            try:
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            except JWTError:
+                return JSONResponse({"detail": "Invalid or expired token"}, status_code=401)
+            user = await _stub_get_principal(payload.get("sub"))
+            if not user:
+                return JSONResponse({"detail": "User not found"}, status_code=404)
+            request.state.user = user
+
+        return await call_next(request)
+
+
+def build_app(middleware=None) -> FastAPI:
+    app = FastAPI()
+    if middleware is not None:
+        app.add_middleware(middleware)
+
+    @app.get("/api/ping")
+    async def ping(request: Request):
+        user = getattr(request.state, "user", None)
+        return {"user_id": user.id if user else None}
+
+    return app
+
+
+async def run(app: FastAPI, total: int, concurrency: int, headers: dict) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm-up so import/first-call costs don't skew the run
+        for _ in range(50):
+            await client.get("/api/ping", headers=headers)
+
+        remaining = total
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                response = await client.get("/api/ping", headers=headers)
+                assert response.status_code == 200, response.text
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {"requests": total, "seconds": round(elapsed, 4), "rps": round(total / elapsed, 1)}
+
+
+async def main(total: int, concurrency: int):
+    token = jwt.encode({"sub": PRINCIPAL.email}, SECRET_KEY, algorithm=ALGORITHM)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    results = {
+        "no_middleware": await run(build_app(), total, concurrency, headers),
+        "base_http_middleware": await run(build_app(LegacyAuthMiddleware), total, concurrency, headers),
+        "pure_asgi_middleware": await run(build_app(AuthMiddleware), total, concurrency, headers),
+    }
+    baseline = results["no_middleware"]["rps"]
+    for name, result in results.items():
+        result["relative_to_routing"] = round(result["rps"] / baseline, 3)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
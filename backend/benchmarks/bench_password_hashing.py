@@ -0,0 +1,80 @@
+"""
+Login throughput benchmark at several bcrypt cost factors.
+
+Simulates a burst of concurrent logins: each one verifies a password on the
+dedicated password pool (run_password_work), exactly as /auth/login does.
+Usage (from backend/):
+
+    python -m benchmarks.bench_password_hashing --rounds 8 10 12 --logins 200 --concurrency 50
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from app.services.auth_service import run_password_work, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+
+PASSWORD = "correct horse battery staple"
+
+
+async def bench_rounds(rounds: int, logins: int, concurrency: int) -> dict:
+    context = CryptContext(schemes=["bcrypt"], bcrypt__ident="2b", bcrypt__rounds=rounds)
+    hashed = context.hash(PASSWORD)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, rejected = [], 0
+
+    async def one_login():
+        nonlocal rejected
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                assert await run_password_work(context.verify, PASSWORD, hashed)
+            except HTTPException:
+                rejected += 1
+                return
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    pick = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2) if latencies else None
+    return {
+        "rounds": rounds,
+        "logins": logins,
+        "completed": len(latencies),
+        "rejected_503": rejected,
+        "seconds": round(elapsed, 3),
+        "logins_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+    }
+
+
+async def main(rounds_list, logins: int, concurrency: int):
+    results = [await bench_rounds(r, logins, concurrency) for r in rounds_list]
+    print(json.dumps({
+        "workers": PASSWORD_HASH_WORKERS,
+        "max_pending": PASSWORD_HASH_MAX_PENDING,
+        "concurrency": concurrency,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[8, 10, 12])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.rounds, args.logins, args.concurrency))
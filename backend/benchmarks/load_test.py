@@ -0,0 +1,301 @@
+"""
+End-to-end load test of app.main:app with no network access.
+
+Boots the real application (lifespan included) in-process on httpx's
+ASGITransport, backed by a throwaway SQLite database, fakeredis and the
+UpstreamStub standing in for Groq/ClipDrop. Each scenario is driven at every
+requested concurrency level; latency percentiles, throughput and status
+counts are printed as JSON. Usage (from backend/):
+
+    python -m benchmarks.load_test --requests 500 --concurrency 1 10 50
+    python -m benchmarks.load_test --scenarios chat chat_stream --latency 0.2 --error-rate 0.05
+    python -m benchmarks.load_test --output run.json --baseline last.json --max-regression 0.2
+
+Needs ``fakeredis`` (with ``lupa`` for the Lua scripts) unless --redis-url
+points at a real Redis. Free users hold 10 chat credits an hour, so the
+``credits`` scenario measures both successful deductions and 400 rejections.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import tempfile
+import itertools
+from typing import Awaitable, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCENARIOS = ("signup", "login", "credits", "chat", "chat_cached", "chat_stream", "chat_session", "image")
+PASSWORD = "correct horse battery staple"
+
+
+# --------------------------------------
+# ENVIRONMENT (must run before app imports)
+# --------------------------------------
+def configure_environment(args, workdir: str):
+    env = {
+        "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+        "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{workdir}/bench.db",
+        "SECRET_KEY": "bench-secret",
+        "GROQ_API_KEY": "bench",
+        "CLIPDROP_API_KEY": "bench",
+        # Blank, not unset, so a developer's .env can't route traffic elsewhere
+        "OPENAI_API_KEY": "",
+        "GEMINI_API_KEY": "",
+        "STRIPE_SECRET_KEY": "",
+        "STRIPE_WEBHOOK_SECRET": "",
+        "IMAGE_STORE_BACKEND": "local",
+        "IMAGE_STORE_DIR": os.path.join(workdir, "images"),
+        "IMAGE_VARIANT_DIR": os.path.join(workdir, "variants"),
+        "IMAGE_JOB_BACKEND": "memory",
+        "RATE_LIMIT_ENABLED": "true" if args.rate_limit else "false",
+        "PROFILING_ENABLED": "false",
+    }
+    if args.bcrypt_rounds:
+        env["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    if args.redis_url:
+        env["REDIS_URL"] = args.redis_url
+    else:
+        env["CACHE_BACKEND"] = "memory"  # the pooled cache layer gets its in-memory backend
+    os.environ.update(env)
+
+
+def load_app(args):
+    from app.db import redis_cache
+
+    if not args.redis_url:
+        try:
+            import fakeredis
+        except ImportError:
+            sys.exit("fakeredis is required (pip install 'fakeredis[lua]') unless --redis-url is given")
+        # Swap the clients before any service module binds them at import
+        server = fakeredis.FakeServer()
+        redis_cache.redis_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+        redis_cache.async_redis_client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+
+    from app.main import app
+    return app
+
+
+# --------------------------------------
+# MEASUREMENT
+# --------------------------------------
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def drive(request_fn: Callable[[int], Awaitable[int]], total: int, concurrency: int) -> dict:
+    """Issue ``total`` requests from ``concurrency`` workers; returns latency stats."""
+    counter = itertools.count()
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+
+    async def worker():
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            started = time.perf_counter()
+            try:
+                status = str(await request_fn(i))
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 4),
+        "rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+        "status_counts": statuses,
+    }
+
+
+# --------------------------------------
+# SCENARIOS
+# --------------------------------------
+class Harness:
+    def __init__(self, client, users: int):
+        self.client = client
+        self.user_count = users
+        self.users: List[dict] = []  # {"id", "email", "headers"}
+        self._signups = itertools.count()
+
+    async def signup(self, i: int) -> int:
+        n = next(self._signups)
+        response = await self.client.post("/auth/signup", json={
+            "username": f"load{n}", "email": f"load{n}@bench.example", "password": PASSWORD,
+        })
+        return response.status_code
+
+    async def seed_users(self):
+        """Create the pool of accounts the authenticated scenarios rotate through."""
+        for n in range(self.user_count):
+            email = f"pool{n}@bench.example"
+            signup = await self.client.post("/auth/signup", json={"username": f"pool{n}", "email": email, "password": PASSWORD})
+            signup.raise_for_status()
+            login = await self.client.post("/auth/login", json={"email": email, "password": PASSWORD})
+            login.raise_for_status()
+            self.users.append({
+                "id": signup.json()["id"],
+                "email": email,
+                "headers": {"Authorization": f"Bearer {login.json()['access_token']}"},
+            })
+
+    def user(self, i: int) -> dict:
+        return self.users[i % len(self.users)]
+
+    async def login(self, i: int) -> int:
+        response = await self.client.post("/auth/login", json={"email": self.user(i)["email"], "password": PASSWORD})
+        return response.status_code
+
+    async def credits(self, i: int) -> int:
+        user = self.user(i)
+        response = await self.client.post(f"/credits/deduct/{user['id']}/chat", headers=user["headers"])
+        return response.status_code
+
+    async def chat(self, i: int) -> int:
+        response = await self.client.post(
+            "/api/chat", headers=self.user(i)["headers"], json={"prompt": f"load test prompt {i}", "cache": False}
+        )
+        return response.status_code
+
+    async def chat_cached(self, i: int) -> int:
+        response = await self.client.post(
+            "/api/chat", headers=self.user(i)["headers"], json={"prompt": f"cached prompt {i % 10}"}
+        )
+        return response.status_code
+
+    async def chat_stream(self, i: int) -> int:
+        async with self.client.stream(
+            "POST", "/api/chat", headers=self.user(i)["headers"], json={"prompt": f"stream prompt {i}", "stream": True}
+        ) as response:
+            async for _ in response.aiter_lines():
+                pass
+            return response.status_code
+
+    async def chat_session(self, i: int) -> int:
+        user = self.user(i)
+        if "session_id" not in user:
+            created = await self.client.post("/api/chat/sessions", headers=user["headers"], json={})
+            created.raise_for_status()
+            user["session_id"] = created.json()["session_id"]
+        response = await self.client.post(
+            f"/api/chat/sessions/{user['session_id']}/messages",
+            headers=user["headers"],
+            json={"prompt": f"session turn {i}"},
+        )
+        return response.status_code
+
+    async def image(self, i: int) -> int:
+        response = await self.client.post("/api/image", headers=self.user(i)["headers"], json={"prompt": f"image prompt {i}"})
+        return response.status_code
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> List[str]:
+    """p95 regressions beyond ``max_regression`` (fraction) against a previous run."""
+    failures = []
+    for scenario, levels in results.items():
+        for level, stats in levels.items():
+            previous = baseline.get("results", {}).get(scenario, {}).get(level)
+            if not previous or not previous.get("p95_ms"):
+                continue
+            change = stats["p95_ms"] / previous["p95_ms"] - 1
+            if change > max_regression:
+                failures.append(f"{scenario}@c={level}: p95 {previous['p95_ms']}ms → {stats['p95_ms']}ms (+{change:.0%})")
+    return failures
+
+
+async def main(args):
+    import httpx
+    from benchmarks.upstream_stub import UpstreamStub
+
+    workdir = tempfile.mkdtemp(prefix="synapse-bench-")
+    configure_environment(args, workdir)
+    app = load_app(args)
+
+    stub = UpstreamStub(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        stream_chunks=args.stream_chunks,
+        chunk_delay=args.chunk_delay,
+        seed=args.seed,
+    )
+    app.state.upstream_transport = stub.transport()
+
+    results: Dict[str, Dict[str, dict]] = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            harness = Harness(client, args.users)
+            await harness.seed_users()
+
+            for scenario in args.scenarios:
+                request_fn = getattr(harness, scenario)
+                # Warm-up so first-call costs (imports, pool connects) don't skew the run
+                await drive(request_fn, min(args.warmup, args.requests), 1)
+                results[scenario] = {
+                    str(level): await drive(request_fn, args.requests, level) for level in args.concurrency
+                }
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "upstream_calls": stub.calls,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare(results, json.load(f), args.max_regression)
+        if failures:
+            print("\n".join(["p95 regressions:"] + failures), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--users", type=int, default=20, help="accounts the authenticated scenarios rotate through")
+    parser.add_argument("--latency", type=float, default=0.05, help="upstream base latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.02, help="extra uniform upstream latency (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls answered 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of upstream calls answered 429")
+    parser.add_argument("--stream-chunks", type=int, default=20)
+    parser.add_argument("--chunk-delay", type=float, default=0.005)
+    parser.add_argument("--bcrypt-rounds", type=int, default=None, help="override BCRYPT_ROUNDS for this run")
+    parser.add_argument("--rate-limit", action="store_true", help="keep per-user rate limiting on")
+    parser.add_argument("--redis-url", default=None, help="use a real Redis instead of fakeredis")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="also write the JSON report here")
+    parser.add_argument("--baseline", default=None, help="previous report to compare p95 against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 increase vs baseline")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,95 @@
+"""
+Local stand-ins for the Groq (OpenAI-compatible) and ClipDrop APIs.
+
+``UpstreamStub`` is an ``httpx.MockTransport`` handler: the app's upstream
+clients are built on it through ``app.state.upstream_transport``, so nothing
+leaves the process. Latency, jitter, injected 5xx errors and 429s are
+configurable to exercise the router, breakers and limiters.
+"""
+
+import json
+import zlib
+import random
+import struct
+import asyncio
+
+import httpx
+
+
+def tiny_png(width: int = 64, height: int = 64) -> bytes:
+    """A valid solid-colour RGB PNG, built without Pillow."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    row = b"\x00" + b"\x40\x80\xc0" * width
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(row * height))
+        + chunk(b"IEND", b"")
+    )
+
+
+class UpstreamStub:
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        stream_chunks: int = 20,
+        chunk_delay: float = 0.005,
+        image_size: int = 256,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.stream_chunks = stream_chunks
+        self.chunk_delay = chunk_delay
+        self.image = tiny_png(image_size, image_size)
+        self.random = random.Random(seed)
+        self.calls = {"chat": 0, "chat_stream": 0, "image": 0, "errors": 0, "throttled": 0, "other": 0}
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self)
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            self.calls["other"] += 1
+            return httpx.Response(200, json={"data": []})  # warm-up probes
+
+        await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+        roll = self.random.random()
+        if roll < self.error_rate:
+            self.calls["errors"] += 1
+            return httpx.Response(500, json={"error": "injected failure"})
+        if roll < self.error_rate + self.throttle_rate:
+            self.calls["throttled"] += 1
+            return httpx.Response(429, headers={"Retry-After": "0"}, json={"error": "injected rate limit"})
+
+        if "clipdrop" in request.url.host:
+            self.calls["image"] += 1
+            return httpx.Response(200, content=self.image, headers={"content-type": "image/png"})
+
+        if request.url.path.endswith("/chat/completions"):
+            body = json.loads(request.content)
+            if body.get("stream"):
+                self.calls["chat_stream"] += 1
+                return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=self._sse())
+            self.calls["chat"] += 1
+            reply = " ".join(f"token{i}" for i in range(self.stream_chunks))
+            return httpx.Response(200, json={"choices": [{"message": {"role": "assistant", "content": reply}}]})
+
+        self.calls["other"] += 1
+        return httpx.Response(404, json={"error": f"stub has no route for {request.url.path}"})
+
+    async def _sse(self):
+        for i in range(self.stream_chunks):
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            chunk = {"choices": [{"delta": {"content": f"token{i} "}}]}
+            yield f"data: {json.dumps(chunk)}\n\n".encode()
+        yield b"data: [DONE]\n\n"
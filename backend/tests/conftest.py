@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# Service modules bind their engines and clients at import; point them at a
+# throwaway SQLite file before any test module imports them
+_workdir = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_workdir}/test.db")
+os.environ.setdefault("SECRET_KEY", "test-secret")
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from app.services import chat_sessions as sessions_module
+from app.services.chat_sessions import ChatSessions, InMemorySessionStore, RedisSessionStore
+
+
+def memory_store():
+    return InMemorySessionStore()
+
+
+def redis_store():
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisSessionStore(fakeredis.FakeAsyncRedis(decode_responses=True))
+
+
+STORES = [memory_store, redis_store]
+
+
+class FakeProvider:
+    """Summarizes after ``release`` is set, so tests can line up concurrent refreshes."""
+
+    def __init__(self, summary="the user likes cats"):
+        self.summary = summary
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def complete_messages(self, messages):
+        self.calls += 1
+        await self.release.wait()
+        return {"response": self.summary}
+
+
+@pytest.fixture
+def small_budget(monkeypatch):
+    # 17 tokens per exchange below: a refresh starts on the fifth, and three
+    # are already enough to fold some turns away
+    monkeypatch.setattr(sessions_module, "CHAT_SESSION_CONTEXT_TOKENS", 100)
+    monkeypatch.setattr(sessions_module, "CHAT_SESSION_KEEP_RECENT_TURNS", 2)
+
+
+async def chat(sessions, session, exchanges, provider):
+    for i in range(exchanges):
+        await sessions.record_exchange(session, f"question number {i:02d}", f"answer number {i:02d}", provider)
+
+
+@pytest.mark.parametrize("make_store", STORES)
+def test_summary_save_is_compare_and_set(make_store):
+    store = make_store()
+
+    async def scenario():
+        sessions = ChatSessions(store)
+        session = await sessions.create(1)
+        assert await store.save_summary(session.id, "first", 4, expected_upto=0)
+        assert not await store.save_summary(session.id, "stale", 2, expected_upto=0)
+        return await sessions.get(session.id, 1)
+
+    session = asyncio.run(scenario())
+    assert (session.summary, session.summarized_upto) == ("first", 4)
+
+
+@pytest.mark.parametrize("make_store", STORES)
+def test_concurrent_refreshes_keep_a_single_summary(make_store, small_budget):
+    store = make_store()
+
+    async def scenario():
+        # Two API processes sharing one store, both summarizing the same snapshot
+        provider = FakeProvider()
+        first, second = ChatSessions(store), ChatSessions(store)
+        session = await first.create(1)
+        await chat(first, session, 3, provider)
+        provider.release.clear()
+        racing = [
+            asyncio.create_task(first._summarize(session.id, provider)),
+            asyncio.create_task(second._summarize(session.id, provider)),
+        ]
+        for _ in range(100):
+            if provider.calls == 2:
+                break
+            await asyncio.sleep(0)
+        assert provider.calls == 2
+        provider.release.set()
+        await asyncio.gather(*racing)
+        return first.stats["summaries"] + second.stats["summaries"]
+
+    assert asyncio.run(scenario()) == 1
+
+
+@pytest.mark.parametrize("make_store", STORES)
+def test_folded_turns_leave_the_window(make_store, small_budget):
+    store = make_store()
+
+    async def scenario():
+        provider = FakeProvider()
+        sessions = ChatSessions(store)
+        session = await sessions.create(1, system="be brief")
+        await chat(sessions, session, 6, provider)
+        await asyncio.gather(*list(sessions._summaries.values()))
+        session = await sessions.get(session.id, 1)
+        return session, sessions.build_messages(session, "and now?")
+
+    session, (messages, window) = asyncio.run(scenario())
+    assert session.summary == "the user likes cats"
+    assert messages[0] == {"role": "system", "content": "be brief"}
+    assert "the user likes cats" in messages[1]["content"]
+    assert messages[2]["role"] == "user"
+    assert messages[-1] == {"role": "user", "content": "and now?"}
+    assert window["summarized_turns"] == session.summarized_upto > 0
+    assert window["turns"] == session.turn_count - session.summarized_upto
+    assert window["estimated_tokens"] <= 100
+
+
+def test_sessions_belong_to_their_user():
+    async def scenario():
+        sessions = ChatSessions(InMemorySessionStore())
+        session = await sessions.create(1)
+        return await sessions.get(session.id, 2)
+
+    assert asyncio.run(scenario()) is None
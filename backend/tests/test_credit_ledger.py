@@ -0,0 +1,138 @@
+import asyncio
+import itertools
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.db import models
+from app.db.database import AsyncSessionLocal, async_engine, engine
+from app.services.credit_ledger import BALANCE_KEY, CreditLedger, CreditLedgerUnavailableError
+from app.services.credit_service import CHAT_CREDITS_DEFAULT, IMAGE_CREDITS_DEFAULT, get_user_credit
+
+models.Base.metadata.create_all(bind=engine)
+_user_ids = itertools.count(1000)
+
+
+def run(coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await async_engine.dispose()  # pooled connections are bound to this loop
+    return asyncio.run(main())
+
+
+def make_user(chat=CHAT_CREDITS_DEFAULT, image=IMAGE_CREDITS_DEFAULT, with_credits=True):
+    user_id = next(_user_ids)
+
+    async def create():
+        async with AsyncSessionLocal() as db:
+            db.add(models.User(id=user_id, username=f"u{user_id}", email=f"u{user_id}@test", password_hash="x"))
+            if with_credits:
+                now = datetime.now(timezone.utc)
+                db.add(models.Credit(
+                    user_id=user_id, chat_credits=chat, image_credits=image,
+                    last_reset=now, chat_window_start=now, image_window_start=now,
+                ))
+            await db.commit()
+
+    run(create())
+    return SimpleNamespace(id=user_id, is_premium=False)
+
+
+async def stored_credit(user_id):
+    async with AsyncSessionLocal() as db:
+        return await get_user_credit(db, user_id)
+
+
+def make_ledger():
+    server = fakeredis.FakeServer()
+    return CreditLedger(redis=fakeredis.FakeAsyncRedis(server=server, decode_responses=True)), server
+
+
+def test_deduct_refund_and_flush_round_trip():
+    user = make_user(chat=4)
+    ledger, _ = make_ledger()
+
+    async def scenario():
+        assert (await ledger.deduct(user, "chat"))["chat_credits"] == 3  # seeded from the row
+        assert (await ledger.deduct(user, "image", amount=2))["image_credits"] == IMAGE_CREDITS_DEFAULT - 2
+        assert (await stored_credit(user.id)).chat_credits == 4  # write-behind, not yet flushed
+
+        await ledger.refund(user, "chat", 1)
+        await ledger.refund(user, "image", 50)  # capped at the window default
+        assert await ledger.flush() == 1
+        credit = await stored_credit(user.id)
+        assert (credit.chat_credits, credit.image_credits) == (4, IMAGE_CREDITS_DEFAULT)
+        assert await ledger.flush() == 0  # nothing dirty any more
+
+    run(scenario())
+
+
+def test_concurrent_deducts_never_overspend():
+    user = make_user(chat=5)
+    ledger, _ = make_ledger()
+
+    async def scenario():
+        results = await asyncio.gather(*(ledger.deduct(user, "chat") for _ in range(12)), return_exceptions=True)
+        assert sum(not isinstance(r, Exception) for r in results) == 5
+        assert all(str(r) == "No chat credits left." for r in results if isinstance(r, Exception))
+        await ledger.flush()
+        assert (await stored_credit(user.id)).chat_credits == 0
+
+    run(scenario())
+
+
+def test_evicted_balance_is_rebuilt_from_the_row():
+    user = make_user(chat=6)
+    ledger, _ = make_ledger()
+
+    async def scenario():
+        await ledger.deduct(user, "chat")
+        await ledger.flush()
+        await ledger.redis.delete(BALANCE_KEY.format(user.id))
+        assert (await ledger.deduct(user, "chat"))["chat_credits"] == 4
+
+    run(scenario())
+
+
+def test_first_spend_creates_the_row_but_a_read_does_not():
+    user = make_user(with_credits=False)
+    ledger, _ = make_ledger()
+
+    async def scenario():
+        balance = await ledger.balance(user.id)
+        assert (balance["chat_credits"], balance["image_credits"]) == (CHAT_CREDITS_DEFAULT, IMAGE_CREDITS_DEFAULT)
+        assert await stored_credit(user.id) is None
+        assert not await ledger.redis.exists(BALANCE_KEY.format(user.id))
+
+        await ledger.deduct(user, "chat")
+        assert await stored_credit(user.id) is not None
+        assert (await ledger.balance(user.id))["chat_credits"] == CHAT_CREDITS_DEFAULT - 1
+
+    run(scenario())
+
+
+def test_redis_down_rejects_spends_and_reads_the_row():
+    user = make_user(chat=7)
+    ledger, server = make_ledger()
+
+    async def scenario():
+        await ledger.deduct(user, "chat")
+        await ledger.flush()
+
+        server.connected = False
+        with pytest.raises(CreditLedgerUnavailableError):
+            await ledger.deduct(user, "chat")
+        assert (await ledger.balance(user.id))["chat_credits"] == 6
+
+        # Nothing was spent behind the ledger's back, so recovery loses nothing
+        server.connected = True
+        assert (await ledger.deduct(user, "chat"))["chat_credits"] == 5
+        await ledger.flush()
+        assert (await stored_credit(user.id)).chat_credits == 5
+
+    run(scenario())
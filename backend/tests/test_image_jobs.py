@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from app.services import image_jobs
+from app.services.image_jobs import (
+    FAILED,
+    QUEUED,
+    RUNNING,
+    SUCCEEDED,
+    ImageJobQueue,
+    InMemoryJobStore,
+    JobQueueFullError,
+    RedisJobStore,
+)
+
+
+class FakeProvider:
+    def __init__(self, outcome=None):
+        self.outcome = outcome or {"success": True, "image": b"png", "content_type": "image/png"}
+        self.started = asyncio.Event()
+
+    async def generate_image(self, prompt):
+        self.started.set()
+        if self.outcome == "hang":
+            await asyncio.Event().wait()
+        if isinstance(self.outcome, BaseException):
+            raise self.outcome
+        return self.outcome
+
+
+async def wait_until_done(jobs, job_id):
+    for _ in range(200):
+        job = await jobs.get(job_id)
+        if job["status"] in (SUCCEEDED, FAILED):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job stuck in {job['status']}")
+
+
+def test_worker_runs_a_submitted_job_to_success():
+    async def scenario():
+        jobs = ImageJobQueue(InMemoryJobStore(), FakeProvider(), workers=2)
+        jobs.start()
+        try:
+            job = await jobs.submit(1, "a cat", response_format="base64")
+            assert job["status"] == QUEUED
+            done = await wait_until_done(jobs, job["id"])
+        finally:
+            await jobs.stop()
+        assert done["status"] == SUCCEEDED
+        assert done["result"]["image_base64"].startswith("data:image/png;base64,")
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("outcome, error", [
+    ({"success": False, "message": "blocked prompt"}, "blocked prompt"),
+    (RuntimeError("ClipDrop timed out"), "ClipDrop timed out"),
+])
+def test_failures_are_recorded_on_the_job(outcome, error):
+    async def scenario():
+        jobs = ImageJobQueue(InMemoryJobStore(), FakeProvider(outcome))
+        job = await jobs.submit(1, "a cat", response_format="base64")
+        await jobs._run(job["id"])
+        return await jobs.get(job["id"])
+
+    job = asyncio.run(scenario())
+    assert (job["status"], job["error"]) == (FAILED, error)
+
+
+def test_jobs_are_only_run_once():
+    async def scenario():
+        provider = FakeProvider()
+        jobs = ImageJobQueue(InMemoryJobStore(), provider)
+        job = await jobs.submit(1, "a cat", response_format="base64")
+        await jobs._run(job["id"])
+        provider.started.clear()
+        await jobs._run(job["id"])  # a duplicate delivery of a finished job
+        assert not provider.started.is_set()
+
+    asyncio.run(scenario())
+
+
+def test_rejected_submission_leaves_no_job_behind(monkeypatch):
+    monkeypatch.setattr(image_jobs, "IMAGE_JOB_MAX_QUEUED", 1)
+
+    async def scenario():
+        store = InMemoryJobStore()
+        jobs = ImageJobQueue(store, FakeProvider())
+        await jobs.submit(1, "first")
+        with pytest.raises(JobQueueFullError):
+            await jobs.submit(1, "second")
+        assert len(store._jobs) == 1
+
+    asyncio.run(scenario())
+
+
+async def interrupt_running_job(store):
+    provider = FakeProvider("hang")
+    jobs = ImageJobQueue(store, provider, workers=1)
+    job = await jobs.submit(1, "a cat")
+    jobs.start()
+    await asyncio.wait_for(provider.started.wait(), 5)
+    assert (await jobs.get(job["id"]))["status"] == RUNNING
+    await jobs.stop()
+    return await jobs.get(job["id"])
+
+
+def test_shutdown_fails_interrupted_jobs_on_the_memory_store():
+    job = asyncio.run(interrupt_running_job(InMemoryJobStore()))
+    assert (job["status"], job["error"]) == (FAILED, "Interrupted by server shutdown")
+
+
+def test_shutdown_requeues_interrupted_jobs_on_redis():
+    fakeredis = pytest.importorskip("fakeredis")
+    store = RedisJobStore(fakeredis.FakeAsyncRedis(decode_responses=True))
+
+    async def scenario():
+        job = await interrupt_running_job(store)
+        assert job["status"] == QUEUED
+        assert await store.dequeue(timeout=1) == job["id"]
+
+    asyncio.run(scenario())
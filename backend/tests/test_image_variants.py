@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from app.services.image_variants import VariantCache, negotiate_format
+
+
+@pytest.mark.parametrize("accept", [None, "", "*/*", "image/*", "image/png,image/webp"])
+def test_wildcards_and_source_first_get_the_original(accept):
+    assert negotiate_format(accept, "png") == "png"
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("image/webp,*/*", "webp"),
+    ("image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8", "webp"),
+    ("image/png;q=0.5,image/jpeg", "jpeg"),
+    ("image/jpeg;q=0.9,image/webp;q=0.8", "jpeg"),
+])
+def test_explicitly_preferred_format_is_transcoded(accept, expected):
+    assert negotiate_format(accept, "png") == expected
+
+
+def test_failed_variant_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    cache = VariantCache(root=str(tmp_path))
+    path = cache._path(("ab" * 32, "webp", None))
+
+    def fail_replace(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail_replace)
+    with pytest.raises(OSError):
+        cache._write(path, b"data", [])
+    assert os.listdir(os.path.dirname(path)) == []
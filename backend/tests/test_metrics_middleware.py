@@ -0,0 +1,55 @@
+import asyncio
+
+import httpx
+from fastapi import APIRouter, FastAPI
+
+from app.middleware.metrics_middleware import route_label
+
+
+def labels_for(*paths):
+    seen = {}
+
+    class Capture:
+        def __init__(self, app):
+            self.app = app
+
+        async def __call__(self, scope, receive, send):
+            await self.app(scope, receive, send)
+            if scope["type"] == "http":
+                seen[scope["path"]] = route_label(scope)
+
+    router = APIRouter()
+
+    @router.get("/chat/{session_id}")
+    async def session(session_id: str):
+        return {}
+
+    @router.get("/usage")
+    async def usage():
+        return {}
+
+    app = FastAPI()
+    app.add_middleware(Capture)
+    app.include_router(router, prefix="/api")
+
+    @app.get("/metrics")
+    async def metrics():
+        return {}
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            for path in paths:
+                await client.get(path)
+
+    asyncio.run(run())
+    return seen
+
+
+def test_route_label_keeps_router_prefix():
+    seen = labels_for("/api/usage", "/api/chat/abc", "/metrics", "/nope")
+    assert seen == {
+        "/api/usage": "/api/usage",
+        "/api/chat/abc": "/api/chat/{session_id}",
+        "/metrics": "/metrics",
+        "/nope": "unmatched",
+    }
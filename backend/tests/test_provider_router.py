@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from app.services.chat_backends import ChatBackend
+from app.services.circuit_breaker import CircuitOpenError, ProviderUnavailableError, get_breaker
+from app.services.concurrency_limiter import OverloadedError, RateLimitedError
+from app.services.provider_router import AllBackendsFailed, ProviderRouter
+
+
+class FakeBackend(ChatBackend):
+    def __init__(self, name: str, outcome):
+        self.name = name
+        self.display_name = name.title()
+        self.model = "fake"
+        self.outcome = outcome
+
+    async def complete(self, messages):
+        if isinstance(self.outcome, BaseException):
+            raise self.outcome
+        return self.outcome
+
+    async def stream(self, messages):
+        if isinstance(self.outcome, BaseException):
+            raise self.outcome
+        yield self.outcome
+
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def make_router(*backends):
+    for backend in backends:
+        get_breaker(backend.name).record_success()  # fresh, closed circuits
+    return ProviderRouter(list(backends))
+
+
+def test_complete_returns_first_success():
+    router = make_router(FakeBackend("t-fail", RuntimeError("boom")), FakeBackend("t-ok", "hello"))
+    backend, content = asyncio.run(router.complete(MESSAGES))
+    assert content == "hello"
+
+
+def test_all_failed_names_each_backend():
+    router = make_router(FakeBackend("t-a", RuntimeError("500 from a")), FakeBackend("t-b", ValueError("bad json")))
+    with pytest.raises(AllBackendsFailed) as excinfo:
+        asyncio.run(router.complete(MESSAGES))
+    message = str(excinfo.value)
+    assert "t-a: 500 from a" in message
+    assert "t-b: bad json" in message
+
+
+def test_all_circuits_open_is_provider_unavailable():
+    router = make_router(
+        FakeBackend("t-open-a", CircuitOpenError("t-open-a", 7.0)),
+        FakeBackend("t-open-b", CircuitOpenError("t-open-b", 3.0)),
+    )
+    with pytest.raises(ProviderUnavailableError) as excinfo:
+        asyncio.run(router.complete(MESSAGES))
+    assert not isinstance(excinfo.value, AllBackendsFailed)
+    assert excinfo.value.retry_after == 3.0
+
+
+def test_shed_and_throttled_backends_are_provider_unavailable():
+    router = make_router(
+        FakeBackend("t-shed", OverloadedError("t-shed", 1.0)),
+        FakeBackend("t-429", RateLimitedError("t-429", 4.0)),
+    )
+    with pytest.raises(ProviderUnavailableError) as excinfo:
+        asyncio.run(router.complete(MESSAGES))
+    assert not isinstance(excinfo.value, AllBackendsFailed)
+    assert excinfo.value.retry_after == 1.0
+
+
+def test_real_failure_beats_unavailable():
+    # One backend genuinely broke: not retryable, so no 503/Retry-After
+    router = make_router(FakeBackend("t-shed2", OverloadedError("t-shed2", 1.0)), FakeBackend("t-err", RuntimeError("502")))
+    with pytest.raises(AllBackendsFailed) as excinfo:
+        asyncio.run(router.complete(MESSAGES))
+    assert str(excinfo.value) == "t-err: 502"
+
+
+def test_stream_all_failed_names_each_backend():
+    router = make_router(FakeBackend("t-sa", RuntimeError("reset")), FakeBackend("t-sb", RuntimeError("timeout")))
+
+    async def drain():
+        async for _ in router.stream(MESSAGES):
+            pass
+
+    with pytest.raises(AllBackendsFailed) as excinfo:
+        asyncio.run(drain())
+    assert "t-sa: reset" in str(excinfo.value) and "t-sb: timeout" in str(excinfo.value)
+
+
+def test_stats_decay_back_towards_prior(monkeypatch):
+    from app.services import provider_router
+
+    now = [1000.0]
+    monkeypatch.setattr(provider_router.time, "monotonic", lambda: now[0])
+    stats = provider_router.BackendStats(alpha=0.5, half_life=10.0)
+    stats.record_success(9.0)
+    for _ in range(4):
+        stats.record_failure()
+    assert stats.error_rate >= provider_router.CHAT_ROUTER_MAX_ERROR_RATE
+
+    now[0] += 100.0  # ten half-lives without traffic
+    assert stats.error_rate < 0.01
+    assert abs(stats.latency - provider_router.CHAT_ROUTER_INITIAL_LATENCY) < 0.01
+
+
+def test_exploration_sends_traffic_to_a_non_primary_backend():
+    fast, slow = FakeBackend("t-fast", "a"), FakeBackend("t-slow", "b")
+    router = make_router(fast, slow)
+    router.stats["t-fast"].record_success(0.1)
+    router.stats["t-slow"].record_success(5.0)
+    assert router.ranked(explore_rate=0.0)[0] is fast
+    assert router.ranked(explore_rate=1.0)[0] is slow
+
+
+def test_stream_success_is_not_a_latency_sample():
+    router = make_router(FakeBackend("t-stream", "delta"))
+
+    async def drain():
+        return [delta async for _, delta in router.stream(MESSAGES)]
+
+    assert asyncio.run(drain()) == ["delta"]
+    assert router.stats["t-stream"].samples == 0
+
+
+def test_incomplete_backend_fails_at_construction():
+    class NoStream(ChatBackend):
+        async def complete(self, messages):
+            return ""
+
+    with pytest.raises(TypeError):
+        NoStream(client=None, model="fake")
@@ -0,0 +1,58 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.services.rate_limiter import RATE_LIMIT_DEFAULTS, RateLimit, RateLimiter, gcra
+
+CHAT_RATE, CHAT_BURST = RATE_LIMIT_DEFAULTS["chat"]
+USER = SimpleNamespace(id=1, is_premium=False, plan_id=None)
+
+
+def make_limiters(count=1):
+    server = fakeredis.FakeServer()
+    limiters = [RateLimiter(redis=fakeredis.FakeAsyncRedis(server=server, decode_responses=True)) for _ in range(count)]
+    return server, limiters
+
+
+async def allowed_count(limiters, calls):
+    decisions = [await limiters[i % len(limiters)].check(USER, "chat") for i in range(calls)]
+    return sum(d.allowed for d in decisions), decisions
+
+
+def test_gcra_admits_the_burst_then_says_when_to_retry():
+    limit = RateLimit(rate=60, burst=3)  # one token per second
+    tat = 0.0
+    for _ in range(3):
+        granted, _, _, _, tat = gcra(tat, 10_000, limit, 1, 1)
+        assert granted == 1
+    granted, remaining, retry_after, _, _ = gcra(tat, 10_000, limit, 1, 1)
+    assert (granted, remaining, retry_after) == (0, 0, 1000)
+    assert gcra(tat, 11_000, limit, 1, 1)[0] == 1
+
+
+def test_burst_is_shared_across_processes_despite_leasing():
+    _, limiters = make_limiters(2)
+    allowed, decisions = asyncio.run(allowed_count(limiters, CHAT_BURST + 10))
+    assert allowed == CHAT_BURST
+    denied = decisions[-1]
+    assert denied.retry_after > 0
+    assert "Retry-After" in denied.headers()
+
+
+def test_hot_users_are_served_from_the_local_lease():
+    _, (limiter,) = make_limiters()
+    allowed, _ = asyncio.run(allowed_count([limiter], CHAT_BURST))
+    assert allowed == CHAT_BURST
+    assert limiter.stats["local"] > 0
+    assert limiter.stats["remote"] < CHAT_BURST
+
+
+def test_redis_down_enforces_the_limit_per_process():
+    server, (limiter,) = make_limiters()
+    server.connected = False
+    allowed, _ = asyncio.run(allowed_count([limiter], CHAT_BURST + 5))
+    assert allowed == CHAT_BURST
+    assert limiter.stats["fallback"] > 0